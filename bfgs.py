@@ -83,9 +83,23 @@ This relies on an iterative solver, may be fragile:
     True
     >>> max(abs(h2.app(h2.inv(y1)) - y1)) < 1.e-15
     True
+
+Bofill  update, a  mixture of SR1  and PSB  which does not  enforce a
+positive definite hessian (for transition state searches):
+
+    >>> h4 = Bofill()
+
+    >>> h4.update(2 * s1, y1)
+    >>> h4.update(2 * s2, y2)
+
+    >>> h4.inv(y2)
+    array([ 0.002, -0.002])
+
+    >>> max(abs(h4.inv(h4.app(s1)) - s1)) < 1.e-10
+    True
 """
 
-__all__ = ["get_by_name", "SR1", "LBFGS", "BFGS", "Array", "isolve"]
+__all__ = ["get_by_name", "SR1", "LBFGS", "BFGS", "Bofill", "Array", "isolve"]
 
 from numpy import asarray, empty, zeros, dot
 from numpy import eye, outer
@@ -209,6 +223,45 @@ def _sr1(B, s, y, thresh=THRESH):
         print "SR1: WARNING, skipping update, denominator too small!"
 
 
+def _bofill(B, s, y):
+    """Bofill update scheme for the direct hessian, a mixture of the SR1
+    and the Powell symmetric Broyden (PSB) updates:
+
+        B    = B  +  phi * dB     +  (1 - phi) * dB
+         k+1    k            SR1                   PSB
+
+    with
+
+        dB    = z * z' / (z' * s)
+          SR1
+
+        dB    = (z * s' + s * z') / (s' * s) - (z' * s) * s * s' / (s' * s)**2
+          PSB
+
+        phi = (z' * s)**2 / ((z' * z) * (s' * s)),     z = y - B * s
+
+    where s is the step and y is the corresponding change in the gradient.
+
+    NOTE: modifies B in-place using +=
+    """
+
+    z = y - dot(B, s)
+
+    zs = dot(z, s)
+    zz = dot(z, z)
+    ss = dot(s, s)
+
+    if zz == 0.0 or ss == 0.0:
+        # model is exact already (or there is no step):
+        return
+
+    phi = zs**2 / (zz * ss)
+
+    if phi > 0.0:
+        B += phi * outer(z, z) / zs
+
+    B += (1.0 - phi) * ((outer(z, s) + outer(s, z)) / ss - zs * outer(s, s) / ss**2)
+
 # FIXME: we will use None as -infinity, because of this feature:
 assert None < -1.0
 
@@ -544,6 +597,54 @@ class SR1:
 
         return dot(self.B, s)
 
+class Bofill:
+    """Bofill update for the direct hessian,  see _bofill(). Does not keep
+    the  hessian positive definite,  thus suited  for  the search  of
+    transition states.
+    """
+
+    def __init__(self, B0=70.):
+        """
+        Parameters:
+
+        B0      Initial approximation of direct Hessian.
+                Note that this is never changed!
+        """
+
+        self.B0 = B0
+
+        # hessian matrix (dont know dimensions yet):
+        self.B = None
+
+    def update(self, s, y):
+
+        # initial hessian (in case update is called first):
+        if self.B is None:
+            self.B = eye(len(s)) * self.B0
+
+        _bofill(self.B, s, y)
+
+    def inv(self, y):
+        """Computes s = H * y by solving B * s = y.
+        """
+
+        # initial hessian (in case inv() is called first):
+        if self.B is None:
+            self.B = eye(len(y)) * self.B0
+
+        return solve(self.B, y)
+
+    def app(self, s):
+        """Computes y = B * s using internal representation
+        of the hessian B.
+        """
+
+        # initial hessian (in case app() is called first):
+        if self.B is None:
+            self.B = eye(len(s)) * self.B0
+
+        return dot(self.B, s)
+
 class Hughs_Hessian:
     """
     Removed BFGS/SR1 code from optimizer multiopt
@@ -632,7 +733,7 @@ class Array:
     def app(self, S):
         return asarray([ h.app(s) for h, s in zip(self.__H, S) ])
 
-_map_by_name = {"SR1": SR1, "BFGS": BFGS, "LBFGS": LBFGS}
+_map_by_name = {"SR1": SR1, "BFGS": BFGS, "LBFGS": LBFGS, "Bofill": Bofill}
 
 def get_by_name(name):
     return _map_by_name[name]
@@ -408,6 +408,22 @@ class ObjLog:
         print self._logs
         self._logs = ''
 
+    def __getstate__(self):
+        # files cannot be pickled, a log file is opened again:
+        state = dict(self.__dict__)
+        if self.logfile is sys.stdout:
+            state["logfile"] = "-"
+        else:
+            state["logfile"] = self.logfile.name
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.logfile == "-":
+            self.logfile = sys.stdout
+        else:
+            self.logfile = open(self.logfile, 'a')
+
 
 # Testing the examples in __doc__strings, execute
 # "python gxmatrix.py", eventualy with "-v" option appended:
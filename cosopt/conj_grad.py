@@ -1,8 +1,11 @@
 #!/usr/bin/env python
+from __future__ import with_statement
 from numpy import zeros, dot, sqrt
 import pts.metric as mt
+from pts.timing import timings
 from copy import deepcopy
 from sys import stderr
+from pts.linesearch import trial_steps, line_step
 
 VERBOSE = 0
 
@@ -27,10 +30,18 @@ class conj_grad_opt():
     The direction for the step can be reduced to the steepest decent case
     The length of the step is determined with a quadratic interpolation with one
     trial step in the direction
+
+    With line_trials > 1 that many trial steps (and with line_predict also
+    the length of the last step) are calculated at once, through the pmap
+    of the chain, and the slopes are interpolated cubically, see
+    linesearch.py
     """
+    # called after every step, e.g. to write a checkpoint:
+    checkpoint = None
+
     def __init__(self, reaction_pathway, maxstep = 0.1, respace = True,\
       trial_step = 0.01, backtrack_border = 0.9, dummy_backtracking = False,\
-      reduce_to_steepest_descent = False, **kwargs):
+      reduce_to_steepest_descent = False, line_trials = 1, line_predict = False, **kwargs):
         # Reaction_Pathway is an object that gives forces/tangents for
         # all beads:
         self.atoms = reaction_pathway
@@ -45,6 +56,8 @@ class conj_grad_opt():
         # Maximal and start step size
         self.ms = maxstep * self.size
         self.trial_step = trial_step #* self.size
+        self.line_trials = line_trials
+        self.line_predict = line_predict
 
         # Need to be there when used the first time
         self.nsteps = 0
@@ -142,7 +155,12 @@ class conj_grad_opt():
 
         if self.dummy_backtracking or not need_backtracking:
             # line search like algorithm
-            length = line_search(r, dir, g, self.atoms, self.trial_step, self.ms)
+            if self.line_predict and self.old_length > 0.0:
+                guess = self.old_length
+            else:
+                guess = None
+            length = line_search(r, dir, g, self.atoms, self.trial_step, self.ms,
+                                 trials = self.line_trials, guess = guess)
 
             # but do not forget step length restriction
             if length > self.ms:
@@ -155,7 +173,7 @@ class conj_grad_opt():
         # Remember the length in case the next step is a backtracking step.
         self.old_length = length
 
-        self.atoms.state_vec = (r + dir * length)
+        self.atoms.step_to(r + dir * length)
 
         if self.respace:
             # This is needed by the string method
@@ -169,16 +187,20 @@ class conj_grad_opt():
         #        only the step is really from here
         while self.nsteps < steps: # convergence will be checked by call_observers
                    # Test here only if maximum allowed steps are exceeded
-            f = self.atoms.obj_func_grad() # Like the gradients, but more specialized
-            # string methods will give only the perpendicular direction of all beads
-            # neb will already have added the spring forces
+            with timings("iteration"):
+                f = self.atoms.obj_func_grad() # Like the gradients, but more specialized
+                # string methods will give only the perpendicular direction of all beads
+                # neb will already have added the spring forces
 
-            self.call_observers()
-            # Check for convergence and such things
+                self.call_observers()
+                # Check for convergence and such things
 
-            self.step(f)
-            # Make the actual conjugate gradient step, be aware that the included line search
-            # needs also to use obj_func_grad
+                self.step(f)
+                # Make the actual conjugate gradient step, be aware that the included line search
+                # needs also to use obj_func_grad
+
+                if self.checkpoint is not None:
+                    self.checkpoint()
 
     def attach(self, function, interval=1, *args, **kwargs):
         """Attach callback function.
@@ -233,7 +255,7 @@ def backtrack( g, old_dir, old_g, length_old):
 
     return length
 
-def line_search(r, dir, g, atoms, trial_step, default_step):
+def line_search(r, dir, g, atoms, trial_step, default_step, trials = 1, guess = None):
     """
     Maybe better called interpolation step
     Do a test step in the direction dir and find out by
@@ -244,47 +266,53 @@ def line_search(r, dir, g, atoms, trial_step, default_step):
     for ever in the minimization direction. Then do not
     go to the maximum but rather use the default step, provided
     by the calling program
+
+    With more than one trial step (trials > 1 or a guess for the
+    step length) all of them are calculated at once, the step is
+    taken from the cubic model of the slopes, see line_step(). If
+    it is close to one of the trial steps that one is taken, its
+    results are in the cache of the chain already.
     """
-    atoms.state_vec = r + dir * trial_step
-    g2 = atoms.obj_func_grad()
-    c = dot(g2 - g, dir) / trial_step
-    g3 = dot(g2 + g, dir) / 2.
-
-   #atoms.state_vec = r + dir * trial_step / 2.
-   #g4 = atoms.obj_func_grad()
-   #c2 = dot(g4 -g, dir)/trial_step * 2.
-   #if abs(c2 - c)/c > 1e-4:
-   #    print "Different curvature", c, c2
-   #atoms.state_vec = r + dir * trial_step * 2.
-   #g4 = atoms.obj_func_grad()
-   #c2 = dot(g4 -g, dir)/trial_step / 2.
-   #if abs(c2 - c)/c > 1e-4:
-   #    print "Different curvature 2", c, c2
+    steps = trial_steps(trial_step, trials, guess)
+    states = [r + dir * s for s in steps]
+
+    if len(states) > 1 and hasattr(atoms, "prefetch"):
+        # one parallel calculation for the beads of all trial chains:
+        atoms.prefetch(states)
+
+    slopes = [dot(g, dir)]
+    for state in states:
+        if hasattr(atoms, "trial_grad"):
+            # not an iteration of the chain:
+            slopes.append(dot(atoms.trial_grad(state), dir))
+        else:
+            atoms.state_vec = state
+            slopes.append(dot(atoms.obj_func_grad(), dir))
+
     if dot(g, dir) > 0. :
         print >> stderr, "WARNING: positive gradient projection", dot(g, dir)
         if VERBOSE > 0:
             print "WARNING: positive gradient projection", dot(g, dir)
 
     if VERBOSE > 0:
-        print "CG: Curvature, interpolated force, force projections"
-        print c, g3, dot(g, dir), dot(g2, dir)
+        print "CG: trial steps, force projections"
+        print steps, slopes
 
-    if c > 0:
-        step_len = trial_step / 2. - g3 / c
-        if VERBOSE > 0:
-            print "CG: Step_length", step_len, trial_step
+    # curvature from the first trial step:
+    c = (slopes[1] - slopes[0]) / steps[0]
+    if c <= 0 and dot(g, dir) > 0:
+        print >> stderr, "WARNING: negative curvature and positive gradient projection", c, dot(g, dir)
+        print >> stderr, "WARNING: This should happen seldom and is not very well explored. Take care!"
+
+    if len(steps) > 1:
+        snap = 0.1
     else:
-        if VERBOSE > 0:
-            print "CG WARNING: Use DEFAULT step", default_step
+        snap = 0.0
 
-        if dot(g, dir) > 0:
-            print >> stderr, "WARNING: negative curvature and positive gradient projection", c, dot(g, dir)
-            print >> stderr, "WARNING: This should happen seldom and is not very well explored. Take care!"
-            if VERBOSE > 0:
-                print "WARNING: positive curvature and gradeint projection",c , dot(g, dir)
-            step_len = -default_step
-        else:
-            step_len = default_step
+    step_len = line_step([0.] + steps, slopes, default_step, snap = snap)
+
+    if VERBOSE > 0:
+        print "CG: Step_length", step_len, trial_step
 
     return step_len
 
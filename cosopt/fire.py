@@ -1,6 +1,8 @@
 #!/usr/bin/env python
+from __future__ import with_statement
 from numpy import zeros, dot, sqrt
 import pts.metric as mt
+from pts.timing import timings
 from copy import deepcopy
 
 class fire_opt():
@@ -21,6 +23,9 @@ class fire_opt():
      Another difference is the respacing for the beads at the end (if
      found necessary by the searcher routine)
     """
+    # called after every step, e.g. to write a checkpoint:
+    checkpoint = None
+
     def __init__(self, reaction_pathway, maxstep = 0.1, respace = True,\
       n_min = 5, f_inc = 1.1, f_dec = 0.5, alpha = 0.1, f_alpha = 0.99,\
       dt_max = 1.0, dt = 0.1, \
@@ -139,7 +144,7 @@ class fire_opt():
            dx = dx / norm_dx * self.ms
 
 
-        self.atoms.state_vec = x + dx
+        self.atoms.step_to(x + dx)
 
         if self.respace:
             # This is needed by the string method
@@ -153,18 +158,22 @@ class fire_opt():
         #        only the step is really from here
         while self.nsteps < steps: # convergence will be checked by call_observers
                    # Test here only if maximum allowed steps are exceeded
-            # it is okay to have a endless loop here, call_observers
-            # will terminate it at some time
-            f = self.atoms.obj_func_grad() # Like the gradients, but more specialized
-            # string methods will give only the perpendicular direction of all beads
-            # neb will already have added the spring forces
-
-            self.call_observers()
-            # Check for convergence and such things
-
-            self.step(f)
-            # Make the actual conjugate gradient step, be aware that the included line search
-            # needs also to use obj_func_grad
+            with timings("iteration"):
+                # it is okay to have a endless loop here, call_observers
+                # will terminate it at some time
+                f = self.atoms.obj_func_grad() # Like the gradients, but more specialized
+                # string methods will give only the perpendicular direction of all beads
+                # neb will already have added the spring forces
+
+                self.call_observers()
+                # Check for convergence and such things
+
+                self.step(f)
+                # Make the actual conjugate gradient step, be aware that the included line search
+                # needs also to use obj_func_grad
+
+                if self.checkpoint is not None:
+                    self.checkpoint()
 
     def attach(self, function, interval=1, *args, **kwargs):
         """Attach callback function.
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+from __future__ import with_statement
 import numpy as np
 from pts.common import ObjLog
+from pts.timing import timings
 import pts.metric as mt
 from pts.bfgs import Hughs_Hessian
 
@@ -196,12 +198,140 @@ def calc_step(dir, H, grad, interval):
 
     return s_min
 
-class MultiOpt(ObjLog):
-    """ Description
+def interpolate_hessians(Bs, old_ps, new_ps):
+    """
+    Hessian matrices for beads at the path positions new_ps, interpolated
+    linearly  between those of the beads  at old_ps.  None stands for a
+    bead without information yet, these are skipped:
+
+    >>> Bs = [np.eye(2), None, 3. * np.eye(2)]
+    >>> new = interpolate_hessians(Bs, [0., 0.5, 1.], [0., 0.75, 1.])
+    >>> new[1]
+    array([[ 2.5,  0. ],
+           [ 0. ,  2.5]])
+
+    Outside of the known positions the nearest one is taken:
+
+    >>> interpolate_hessians(Bs[:2], [0., 0.5], [0.2, 1.])[1]
+    array([[ 1.,  0.],
+           [ 0.,  1.]])
+
+    >>> interpolate_hessians([None, None], [0., 1.], [0., 1.])
+    [None, None]
+    """
+    known = [(p, B) for p, B in zip(old_ps, Bs) if B is not None]
+    if len(known) == 0:
+        return [None for p in new_ps]
+
+    ps = [p for p, B in known]
+    new = []
+    for p in new_ps:
+        i = np.searchsorted(ps, p)
+        if i == 0:
+            B = known[0][1].copy()
+        elif i == len(ps):
+            B = known[-1][1].copy()
+        else:
+            (p0, B0), (p1, B1) = known[i-1], known[i]
+            w = (p - p0) / (p1 - p0)
+            B = (1. - w) * B0 + w * B1
+        new.append(B)
+
+    return new
+
+def rotate_hessian(B, t0, t1):
+    """
+    Hessian B of a bead whose tangent turned from t0 to t1,  rotated by
+    the smallest rotation taking the one into the other (in the plane of
+    both), so that the curvature along and across the path is kept:
+
+    >>> B = np.diag([1., 4.])
+    >>> rotate_hessian(B, [1., 0.], [0., 2.]).round(12)
+    array([[ 4.,  0.],
+           [ 0.,  1.]])
+
+    A tangent which did not turn leaves B as it is:
+
+    >>> rotate_hessian(B, [1., 0.], [3., 0.]) is B
+    True
+    >>> rotate_hessian(B, [1., 0.], [0., 0.]) is B
+    True
+    """
+    a = np.asarray(t0, dtype=float)
+    b = np.asarray(t1, dtype=float)
+
+    # no direction known:
+    na, nb = np.linalg.norm(a), np.linalg.norm(b)
+    if na < 1e-12 or nb < 1e-12:
+        return B
+
+    a = a / na
+    b = b / nb
+
+    c = np.dot(a, b)
+    # no turn, or reversed (no unique smallest rotation):
+    if c > 1. - 1e-12 or c < -1. + 1e-12:
+        return B
+
+    K = np.outer(b, a) - np.outer(a, b)
+    R = np.eye(len(a)) + K + np.dot(K, K) / (1. + c)
+
+    return np.dot(R, np.dot(B, R.T))
+
+def chain_tangents(xs):
+    """
+    Directions of the chain at the beads xs, from their neighbours:
+
+    >>> chain_tangents([[0., 0.], [1., 0.], [1., 1.]])
+    array([[ 1.,  0.],
+           [ 1.,  1.],
+           [ 0.,  1.]])
+    """
+    xs = np.asarray(xs)
+    ts = np.empty_like(xs)
+    ts[1:-1] = xs[2:] - xs[:-2]
+    ts[0] = xs[1] - xs[0]
+    ts[-1] = xs[-1] - xs[-2]
+    return ts
 
+class MultiOpt(ObjLog):
+    """
+    Optimiser of  the chain with a quasi-Newton optimiser per bead, see
+    MiniBFGS.  A searching string on the  Mueller-Brown surface, which
+    keeps the bead optimisers as it grows (with the hessians turned along
+    the path when the respace moves the beads), the optimisers tell a lot
+    about their steps:
+
+    >>> import sys, os
+    >>> from numpy import array
+    >>> from pts.pes.mueller_brown import MB, CHAIN_OF_STATES
+    >>> from pts.path_searcher import find_path
+
+    >>> out, sys.stdout = sys.stdout, open(os.devnull, "w")
+    >>> try:
+    ...     conv, (xs, s, es, gs) = find_path(MB, array(CHAIN_OF_STATES), beads_count=7,
+    ...                                       method="searchingstring", opt_type="multiopt",
+    ...                                       continue_beads=True, ftol=0.1, maxit=200,
+    ...                                       workhere=0, output_level=0, pmap=map,
+    ...                                       name="/tmp/tEmP")
+    ... finally:
+    ...     sys.stdout = out
+
+    The beads stay in the valley between the two minima:
+
+    >>> conv
+    True
+    >>> print [round(e, 1) for e in es]
+    [-146.7, -84.0, -50.2, -46.0, -68.9, -80.4, -108.2]
+
+    >>> os.unlink("/tmp/tEmP.log")
     """
     string = False
-    def __init__(self, reaction_pathway, maxstep=0.05, alpha = 70., respace=True, **kwargs): # alpha was 70, memory was 100
+
+    # called after every step, e.g. to write a checkpoint:
+    checkpoint = None
+
+    def __init__(self, reaction_pathway, maxstep=0.05, alpha = 70., respace=True, hessians=None, bead_opts=None, **kwargs): # alpha was 70, memory was 100
         """
         THIS DESCRIPTION IS A BIT OUT OF DATE.
 
@@ -232,6 +362,19 @@ class MultiOpt(ObjLog):
             is  not quite  duck-compatible.   This objects  implements
             pathway state storage  and comminication between optimiter
             and PES-evaluator.
+
+        hessians: list
+
+            Hessian models  to start with, one  per bead,  e.g. from an
+            earlier run on a cheaper PES. Ignored  if the  number does
+            not fit. Beads with None start with the default.
+
+        bead_opts: list
+
+            Per-bead optimisers to continue with, one per bead, e.g.
+            those of the previous run before the string  has grown.
+            Beads with None (the new ones) start with the hessians of
+            their neighbours, interpolated.
         """
 
         ### Opt Code
@@ -252,6 +395,14 @@ class MultiOpt(ObjLog):
 
         # list of per-bead optimisers
         self.bead_opts = [MiniBFGS(d, B0=alpha, id=i) for i in range(self.bs)]
+
+        if hessians is not None and len(hessians) == self.bs:
+            for bead_opt, H in zip(self.bead_opts, hessians):
+                if H is not None:
+                    bead_opt.H = H
+
+        if bead_opts is not None and len(bead_opts) == self.bs:
+            self._continue(bead_opts)
         self.slog("Optimiser (MultiOpt): initial step scale factors", [m._step_scale for m in self.bead_opts], when='always')
 
 
@@ -271,7 +422,8 @@ class MultiOpt(ObjLog):
         g_raw.shape = (bs, -1)
 
         # get initial direction from per-bead optimisers
-        dr = np.array([self.bead_opts[i].step(e[i], g[i], g_raw[i], r[i], t=ts[i]) for i in range(bs)])
+        with timings("hessian"):
+            dr = np.array([self.bead_opts[i].step(e[i], g[i], g_raw[i], r[i], t=ts[i]) for i in range(bs)])
 
 
         self.slog("DR", dr.reshape((bs,-1)))
@@ -284,11 +436,92 @@ class MultiOpt(ObjLog):
        #NNNN: change norm description in output?
         self.slog("DB: Lengths of steps of each bead:", ['%.5f' % np.linalg.norm(dr_bead) for dr_bead in dr], when='always')
 
-        self.atoms.state_vec = (r + dr)
+        # the speculative calculations of the chain go where the bead
+        # optimisers would step next:
+        if getattr(self.atoms, "speculator", None) is not None:
+            self.atoms.speculator.predicted = self._predict(r + dr, dr, g, g_raw, ts)
+
+        self.atoms.step_to(r + dr)
 
         if self.respace:
             self.slog("Respacing Respacing Respacing Respacing Respacing ")
+            old = self.atoms.state_vec.reshape(bs, -1).copy()
             self.atoms.respace(mt.metric )
+            new = self.atoms.state_vec.reshape(bs, -1)
+            self._transport(old, new, ts, chain_tangents(new))
+
+    def _predict(self, xs, dr, g, g_raw, ts):
+        """
+        Positions after the next step, as predicted by the quadratic models
+        of the  beads.  The gradients at the  new positions xs are taken
+        from the models, the step scales stay as they are.  Beads without
+        forces (as the terminal ones) stay.
+        """
+        preds = []
+        for x, s, f, f_raw, t, b in zip(xs, dr, g, g_raw, ts, self.bead_opts):
+            if np.abs(f).max() == 0.0:
+                preds.append(x)
+                continue
+
+            # model gradient and its part perpendicular to the path:
+            f_raw = f_raw + b.H.app(s)
+            t = np.asarray(t)
+            f = f_raw - np.dot(f_raw, t) / np.dot(t, t) * t
+
+            dir = -np.asarray(mt.metric.raises(f, x))
+            norm = np.linalg.norm(dir)
+            if norm < 1e-8:
+                preds.append(x)
+                continue
+            dir = dir / norm
+
+            step_len = calc_step(dir, b.H, f_raw, [0., 2.])
+            if step_len == 0.:
+                step_len = 2.
+
+            step = dir * step_len * b._step_scale
+            longest = np.abs(step).max()
+            if longest > self.maxstep:
+                step *= self.maxstep / longest
+
+            preds.append(x + step)
+
+        return np.array(preds)
+
+    def _continue(self, bead_opts):
+        """
+        Takes over the per-bead optimisers (with all their history) where
+        given, new beads get the hessians of their neighbours.
+        """
+        new = [i for i, b in enumerate(bead_opts) if b is None]
+        old = [i for i, b in enumerate(bead_opts) if b is not None]
+
+        for i in old:
+            self.bead_opts[i] = bead_opts[i]
+            self.bead_opts[i].id = i
+
+        # interpolate by bead index, the new beads sit between the old ones:
+        Bs = interpolate_hessians([bead_opts[i].H.B for i in old], old, new)
+        for i, B in zip(new, Bs):
+            if B is not None:
+                self.bead_opts[i].H.B = B
+
+    def _transport(self, old, new, t_old, t_new):
+        """
+        Keeps the curvature  information of the beads a respace moved from
+        old to new: the hessian of each of them is its own,  turned with
+        the tangent  of the path from  t_old (where it was  updated) to
+        t_new.  Beads the respace left alone keep theirs untouched.  The
+        secant pairs of the next update are taken between actual positions
+        and stay valid.
+        """
+        for i in range(self.bs):
+            if mt.metric.norm_up(new[i] - old[i], new[i]) < 1e-10:
+                continue
+
+            H = self.bead_opts[i].H
+            if H.B is not None:
+                H.B = rotate_hessian(H.B, t_old[i], t_new[i])
 
     def _scale_step(self, dr, step_scales):
         """Determine step to take according to the given trust radius
@@ -322,11 +555,14 @@ class MultiOpt(ObjLog):
 
         while self.nsteps < steps: # convergence will be checked by call_observers
                    # Test here only if maximum allowed steps are exceeded
-            f = self.atoms.obj_func_grad()
-            self.slog(f) # ObjLog method
-            self.call_observers()
-            self.step(f)
-            self.nsteps += 1
+            with timings("iteration"):
+                f = self.atoms.obj_func_grad()
+                self.slog(f) # ObjLog method
+                self.call_observers()
+                self.step(f)
+                self.nsteps += 1
+                if self.checkpoint is not None:
+                    self.checkpoint()
 
     def call_observers(self):
         for function, interval, args, kwargs in self.observers:
@@ -89,6 +89,15 @@ Parameter       short description
  "max_sep_ratio" Only valid for string calculation, tells the string when to respace:
                  This is done if the maximal difference between real and wanted bead position
                  is larger than max_sep_ratio
+ "grow_batch"  only for searchingstring: number of beads added at once when
+               the string grows, all of them are calculated together. They go
+               next to the highest bead and into the intervals with the
+               highest (interpolated) energy
+ "continue_beads" only for multiopt with growingstring and searchingstring:
+               with True the old beads keep their hessians and step sizes
+               when the string has grown, new beads start with the
+               hessians of their neighbours. By default (False) the
+               optimizer starts anew after every growth
  "pre_calc_function"  function for precalculations, for gaussian ect.
  "output_level" the amount of output is decided here
                    0  minimal output, not recommended
@@ -111,6 +120,125 @@ Parameter       short description
  "output_geo_format"  ASE format, to write the outputgeometries of the
                       last iteration to is xyz as default, but can be changed
                       for example to gx or vasp (POSCAR)
+ "levels"      cheaper levels of theory to converge the path on first, best
+               given in the paramfile as a list of (calculator, parameters)
+               pairs, ordered from the cheapest to the most expensive. The
+               calculator is a calculator object or (as for --calculator) the
+               name of a calculator file. The parameters are a dictionary
+               with the parameters (like ftol, xtol, etol or maxit) to
+               overwrite for this level, for example:
+
+                 levels = [("default_lj", {"ftol" : 0.5, "maxit" : 100})]
+
+               The path, its abscissas and the hessians of the
+               optimizer converged on one level are the start of the next
+               one. The calculator of the calculation is the last level.
+ "surrogate"   relax the path on a Gaussian process model fitted to the
+               energies and gradients  calculated so far and calculate
+               only the beads of the relaxed path, where the model is
+               uncertain. True or a dictionary with the parameters of the
+               model, for example:
+
+                 surrogate = {"length" : 0.5, "uncertainty" : 0.05}
+
+               with length the length scale of the model (in the units of
+               the coordinates) and uncertainty the standard deviation of
+               the energies above which a bead is calculated. This
+               saves calculations only for a loose ftol. See
+               surrogate_path() in surrogate.py.
+ "bead_freezing" neither move nor recalculate beads which stay converged,
+               string and NEB methods only. True or a dictionary with the
+               parameters, for example:
+
+                 bead_freezing = {"k" : 3, "revalidate" : 10}
+
+               A bead is frozen after its perpendicular force and step
+               stayed below ftol and xtol for k iterations. It is thawed
+               when its force for the current tangent grows, when one
+               of its neighbours moves or after revalidate iterations.
+               See BeadFreezer in searcher.py.
+ "speculate"   calculate beads  at their predicted next positions when
+               fewer beads than slots are calculated in an iteration (for
+               example with bead_freezing). A dictionary with the
+               parameters, for example:
+
+                 speculate = {"slots" : 5, "tol" : 0.01}
+
+               slots is the number of calculations run at once (default:
+               the number of inner beads).  A bead stepping to within tol
+               of such a point is moved there and takes its results.  tol
+               has to be given, whether it saves iterations depends on
+               the PES and optimizer. See Speculator in searcher.py.
+ "restart"     start every calculation with the restart files (like
+               WAVECAR) of the geometrically nearest calculation done
+               before. True or a dictionary with the parameters, for
+               example:
+
+                 restart = {"dir" : "restart.d", "iterations" : "vasp"}
+
+               Restart files are kept in dir, with iterations set the
+               SCF iterations of warm and cold started calculations are
+               reported. See RestartStore in qfunc.py.
+ "line_search" only for opt_type conj_grad and steep_des: calculate several
+               trial steps of the line search at once (in parallel),
+               True or a dictionary with the parameters, for example:
+
+                 line_search = {"trials" : 3, "predict" : True}
+
+               with trials the number of trial steps (growing by a factor
+               of 4) and predict to add the length of the last step as
+               one more. The step is interpolated cubically from the
+               slopes along the line, see linesearch.py.
+ "remote"      run the single point calculations on several nodes, by
+               agents connecting to  this process.  True or a dictionary
+               with the parameters, for example:
+
+                 remote = {"port" : 5000, "beat" : 1.0, "timeout" : 10.0}
+
+               Only agents knowing the same secret key are accepted,
+               given as "authkey" or by the environment variable
+               PTS_REMOTE_KEY.  On every node NODE  (counted from 0 as in
+               cpu_architecture) an agent is started with
+
+                 PTS_REMOTE_KEY=... python -m pts.remote HOST PORT NODE
+
+               The calculations run in the working directory  of this
+               process,  which  the nodes need  to see under the same
+               name.  Agents silent for more than timeout  seconds are
+               given up,  their calculations are done on the other
+               nodes. See RemoteMap in remote.py.
+ "checkpoint"  save the state of the optimization (the chain, and for
+               multiopt the hessians of the beads)  after every iteration
+               and continue from it if the file exists already. True (the
+               file is <name>.checkpoint.pickle), a file name or a
+               dictionary with the parameters, for example:
+
+                 checkpoint = {"filename" : "run.pickle", "every" : 2}
+
+               Delete the file to start anew.  Results of the PES are not
+               in the file unless the output_level is 0, in the other
+               cases they are found in the ResultDict.pickle (or cache
+               given). With levels only the last one is saved, with
+               surrogate it is ignored (with a warning), with sopt it
+               is an error. See Checkpoint in optwrap.py.
+ "retry"       do calculations which failed (crashed or ran longer than
+               timeout seconds) again, the others are kept. True or a
+               dictionary with the parameters, for example:
+
+                 retry = {"retries" : 2, "backoff" : 10.0, "timeout" : 7200}
+
+               The first retry is after backoff seconds, every further
+               one waits twice as long. timeout is not used with remote.
+               If calculations still fail the program stops, those done
+               are in the cache and are not repeated on a restart. See
+               Retry in paramap.py.
+ "timing"      measure where the time goes: PES calculations (and how long
+               they waited for free CPUs), cache reads and writes, starting
+               of processes, tangents, respacing, hessian updates, output
+               and checkpoints, per iteration. True or the prefix of the
+               files <prefix>.timing.json and <prefix>.timing.csv with the
+               timeline (default: the name). A summary is printed at the
+               end. See timing.py.
 
 There are some more parameter which should normally not be changed as they
 affect only some details of the implementation and should only changed from
@@ -136,8 +264,6 @@ default parameters.
                  needs not to be the one where in the last iteration the same bead
                  has fallen.
 """
-from ase.calculators.vasp import Vasp
-from ase.calculators.lj import LennardJones
 import pts.config as config
 
 
@@ -168,7 +294,19 @@ ps_default_params = {
     "output_path" : "workplace",
     "max_sep_ratio"  : 0.01,
     "output_geo_format" : "xyz",
-    "cache" : None          # where the results of the single point calculations will be stored
+    "cache" : None,         # where the results of the single point calculations will be stored
+    "levels" : None,        # cheaper PES to pre-optimize the path on
+    "surrogate" : None,     # model of the PES to relax the path on
+    "bead_freezing" : None, # skip calculations of converged beads
+    "restart" : None,       # start calculations from the nearest one done
+    "line_search" : None,   # several trial steps at once (conj_grad)
+    "grow_batch" : 1,       # beads added at once by the searching string
+    "continue_beads" : False, # multiopt keeps the old beads after growth
+    "speculate" : None,     # calculate predicted beads on idle slots
+    "remote" : None,        # agents on several nodes do the calculations
+    "retry" : None,         # do failed calculations again
+    "checkpoint" : None,    # save the state of the optimization
+    "timing" : None         # summary and timeline of where the time goes
     }
 
 default_calcs = {
@@ -177,30 +315,44 @@ default_calcs = {
     }
 
 ps_are_floats = ["ftol", "xtol", "etol", "maxstep", "spring", "max_sep_ratio"]
-ps_are_ints = ["maxit", "beads_count", "output_level", "pmin", "pmax"]
-ps_are_complex = ["cpu_architecture"]
-
-default_lj  = LennardJones(
-  epsilon = 1.0,
-  sigma = 1.0
-  )
-
-default_vasp = Vasp( ismear = 1
-    , sigma  = 0.15
-    , xc     = 'PW91'
-    , isif   = 2
-    , gga    = 91
-#   , enmax  = 400 # FIXME: stock ASE does not know this kw
-    , ialgo  = 48
-    , enaug  =  650
-    , ediffg =  -0.02
-    , voskown= 1
-    , nelmin =  4
-    , lreal  =  False
-    , lcharg = False
-    , lwave  = False
-    , kpts   = (5,5,1)
-    )
+ps_are_ints = ["maxit", "beads_count", "output_level", "pmin", "pmax", "grow_batch"]
+ps_are_complex = ["cpu_architecture", "levels", "surrogate", "bead_freezing", "restart", "line_search", "speculate", "remote", "retry", "checkpoint", "timing", "continue_beads"]
+
+def default_calculator(name):
+    """
+    Returns the default calculator name, one of default_calcs.  The ASE
+    calculators are imported only here, most uses of this module do not
+    need them.
+    """
+    if name == "default_lj":
+        from ase.calculators.lj import LennardJones
+
+        return LennardJones(
+          epsilon = 1.0,
+          sigma = 1.0
+          )
+
+    if name == "default_vasp":
+        from ase.calculators.vasp import Vasp
+
+        return Vasp( ismear = 1
+            , sigma  = 0.15
+            , xc     = 'PW91'
+            , isif   = 2
+            , gga    = 91
+        #   , enmax  = 400 # FIXME: stock ASE does not know this kw
+            , ialgo  = 48
+            , enaug  =  650
+            , ediffg =  -0.02
+            , voskown= 1
+            , nelmin =  4
+            , lreal  =  False
+            , lcharg = False
+            , lwave  = False
+            , kpts   = (5,5,1)
+            )
+
+    raise KeyError("no default calculator %s" % name)
 
 dimer_info = """
 The metods dimer and lanczos share the same interface, therefore they have
@@ -235,6 +387,9 @@ Parameter          short description
 ------------------------------------------------
 trans_method       conj_grad for dimer translation steps with conjugate gradient
                    lbfgs for the modified step algorithm with usage of BFGS hessian
+                   prfo for partitioned rational function steps inside a trust radius
+                   (at most max_step), with a Bofill hessian which gets the curvature
+                   along the mode from the rotation
 max_translation    maximal number of translation steps
 max_rotations      maximal number of rotation steps per translation step
                    For lanczos method it is illegal to have here a parameter larger
@@ -245,6 +400,16 @@ max_rotations      maximal number of rotation steps per translation step
 max_gradients      maximal number of gradient calls, checked at translation level only,
                    thus max_gradients n means that at most n + max_rotations steps are
                    performed
+block_size         lanczos only: number of directions whose gradients are calculated at
+                   once (in parallel, by pmap) in every rotation step. With 1 (default)
+                   there is one gradient per rotation step. The parallel calculations
+                   run in the directories rot00, rot01, ...
+line_trials        conj_grad and steep_dec translation only: number of trial steps of the
+                   line search, calculated at once (in parallel, by pmap) in the
+                   directories trans00, trans01, ... With more than one (default 1)
+                   the step is interpolated cubically from the slopes along the line
+line_predict       with True the length of the last translation step is one more trial
+                   step, if the new step ends there its gradient is not calculated again
 
 trans_converged    If the maximum of abs gradient values is below this value the
                    calculation is supposed to be converged
@@ -268,6 +433,9 @@ trajectory         defines how much of the geometries/modes will be given as out
                              geometries will be given in all_geos just put after one
                              another (allows for example jmol to understand this file)
                              modes are given as "Mode of iteration <n>" in all_modes
+timing             True or prefix of the files <prefix>.timing.json and <prefix>.timing.csv
+                   (default: dimer) with the timeline of the gradient calculations, rotation
+                   and translation steps and output. A summary is printed at the end
 
 The dimer/lanczos methods contain some additional parameters, which are not directly
 accessible for usage. They are mainly about details of the implementation. To access
@@ -289,10 +457,13 @@ di_default_params = {
     "trans_method" : "conj_grad", # How the translation method is done
     "trajectory" :  "newest", # Update method
     "max_step"   : 0.1, # maximal allowed step lenght (translation)
+    "line_trials" : 1, # Number of trial steps calculated at once in a line search
+    "line_predict" : False, # Last step length as an additional trial step
     "max_rotations" : 10, # Maximal number of rotation steps per translation step
     "phi_tol"  : 0.1, # Rotation stops if rotation angle would be smaller
     "logfile"  : None, # Where the output of dimer should go (None goes to standard output)
     "dimer_distance" : 0.01, #Distance between dimer end and middle point
+    "timing"   : None, # Summary and timeline of where the time goes
     "cache"    : None # Making results of calculator reusable
 }
 
@@ -304,15 +475,20 @@ ln_default_params = {
     "trans_method" : "lbfgs", # How the translation method is done
     "trajectory" :  "newest", # Update method
     "max_step"   : 0.1, # maximal allowed step lenght (translation)
+    "line_trials" : 1, # Number of trial steps calculated at once in a line search
+    "line_predict" : False, # Last step length as an additional trial step
     "max_rotations" : 8, # Maximal number of rotation steps per translation step
+    "block_size" : 1, # Number of gradients calculated at once in a rotation step
     "phi_tol"  : 0.1, # Rotation stops if rotation angle would be smaller
     "logfile"  : None, # Where the output of dimer should go (None goes to standard output)
     "dimer_distance" : 0.01, #Distance between dimer end and middle point
+    "timing"   : None, # Summary and timeline of where the time goes
     "cache"    : None # Making results of calculator reusable
 }
 
 di_default_params_rot = {
     "max_rotations" : 100, # Maximal number of rotation steps per translation step
+    "block_size" : 1, # Number of gradients calculated at once in a rotation step (lanczos)
     "phi_tol"  : 0.0001, # Rotation stops if rotation angle would be smaller
     "dimer_distance" : 0.01, #Distance between dimer end and middle point
     "cache"    : None # Making results of calculator reusable
@@ -352,8 +528,16 @@ converged        convergence criteria, convergence is reached if the maximal abs
 max_step         maximal allowed step_size
 update_method    Hessian update method. There is SR1 to go to the next extremum (hopefully
                  transition state or minima) and BFGS and LBFGS for going to a minima (they
-                 keep the matrix positive definite)
-
+                 keep the matrix positive definite), Bofill is a mixture of SR1 and PSB
+                 often better suited for transition states
+step_method      newton (default) for plain quasi Newton steps, restricted to max_step
+                 prfo for partitioned rational function steps: uphill along the lowest
+                 mode of the hessian, downhill along all others. The step is restricted
+                 by a trust radius starting at max_step which adapts to the quality of
+                 the energy change predicted by the hessian
+initial_hessian  None (default) for the start hessian of the update method or
+                 numerical for a start hessian from finite differences of the gradients
+                 (costs two gradient calculations per coordinate)
 logfile          If anything else than None (default) or "-" it will use the value
                  for the file in which to write statistics about the iterations
                  The result will still go to standard output
@@ -377,10 +561,13 @@ qn_default_params = {
    "max_step" : 0.1, # maximal allowed step lenght (translation)
     "logfile"  : None, # Where the output of dimer should go (None goes to standard output)
     "trajectory" :  "newest", # Update method
-   "update_method" : "SR1" # Hessian update method, choose SR1 for transition state seach
+   "update_method" : "SR1", # Hessian update method, choose SR1 for transition state seach
+   "step_method" : "newton", # newton or prfo
+   "initial_hessian" : None # None or numerical
 }
 
-are_strings = ["trajectory", "trans_method", "rot_method", "cache"]
+are_strings = ["trajectory", "trans_method", "rot_method", "cache", "update_method", \
+               "step_method", "initial_hessian"]
 
 
 def info_qn_params():
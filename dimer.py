@@ -1,12 +1,17 @@
 #!/usr/bin/python
-from numpy import dot, sqrt, pi
+from __future__ import with_statement
+from numpy import dot, sqrt, pi, outer
 from copy import deepcopy
-from pts.bfgs import BFGS #, LBFGS, SR1
+from pts.bfgs import BFGS, Bofill #, LBFGS, SR1
+from pts.prfo import prfo_step, model_change, hessian_matrix, TrustRadius
 from pts.metric import Default
-from pts.dimer_rotate import rotate_dimer, rotate_dimer_mem
+from pts.dimer_rotate import rotate_dimer, rotate_dimer_mem, rotate_dimer_block
+from pts.memoize import Elemental_memoize
 from numpy import arccos
 from sys import stdout
 from pts.trajectories import empty_traj
+from pts.linesearch import trial_steps, line_step
+from pts.timing import timings
 """
 Dimer method:
 
@@ -18,7 +23,7 @@ G. Henkelman, H. J\{o'}nsson; J. Chem. Phys. 111 (1999), 7010
 """
 
 class translate_cg():
-    def __init__(self, metric, trial_step):
+    def __init__(self, metric, trial_step, trials = 1, predict = False, pmap = map, workhere = 1):
         """
         Use conjugate  gradient to determine in which  direction to do
         the next step conjugate  gradient update as Polak Ribiere with
@@ -47,14 +52,48 @@ class translate_cg():
         >>> step, info = trans(MB, start, MB.fprime(start), mode, -1., {})
         >>> print step
         [-0.00316205 -0.31033489]
+
+        With several trial steps, calculated at once through pmap, the
+        slopes along the line are interpolated cubically. The same
+        direction, but a shorter step:
+
+        >>> trans = translate_cg(met, 0.5, trials = 3, workhere = 0)
+        >>> step, info = trans(MB, start, MB.fprime(start), mode, -1., {"max_step" : 0.5})
+        >>> print step
+        [-0.00300843 -0.29525818]
+        >>> info["trans_gradient_calculations"]
+        3
+
+        Had the step ended at one of the  trial steps, its results would
+        be in info["trans_result"], for the next iteration:
+
+        >>> info["trans_result"] is None
+        True
         """
         self.metric = metric
         self.old_force = None
         self.old_step = None
         self.trial_step = trial_step
         self.old_geo = None
+        self.trials = trials
+        self.predict = predict
+        self.pmap = pmap
+        self.workhere = workhere
+        self.last_length = None
 
-    def __call__(self, pes, start_geo, geo_grad, mode_vector, curv, unused):
+    def line_params(self, info):
+        """
+        Parameters of line_search() for the trial steps.
+        """
+        if self.predict:
+            guess = self.last_length
+        else:
+            guess = None
+
+        return dict(trials = self.trials, guess = guess, default_step = info.get("max_step"),
+                    pmap = self.pmap, workhere = self.workhere)
+
+    def __call__(self, pes, start_geo, geo_grad, mode_vector, curv, info):
         """
         the actual step
         """
@@ -97,6 +136,7 @@ class translate_cg():
 
         step /= self.metric.norm_up(step, start_geo)
 
+        known = None
         if curv > 0.0:
             # We  are  (supposely)  in  complete wrong  region.   Take
             # maximal step out of here
@@ -104,47 +144,81 @@ class translate_cg():
             grad_calc = 0
         else:
             # find how far to go line search, first trial
-            trial_step, grad_calc = line_search(start_geo, step, self.trial_step, pes, self.metric, mode_vector, force)
+            trial_step, grad_calc, known = line_search(start_geo, step, self.trial_step, pes, self.metric, mode_vector, force,
+                                                       **self.line_params(info))
+            self.last_length = trial_step
 
         step = trial_step * step
 
 
         info = {"trans_abs_force" : self.metric.norm_down(force, start_geo),
-                "trans_gradient_calculations": grad_calc}
+                "trans_gradient_calculations": grad_calc,
+                "trans_result": known}
 
         step.shape = shape
 
         return step, info
 
-def line_search(start_geo, direction, trial_step, pes, metric, mode_vector, force):
+def line_search(start_geo, direction, trial_step, pes, metric, mode_vector, force, \
+                trials = 1, guess = None, default_step = None, pmap = map, workhere = 1):
         """
         Find the  minimum in direction from strat_geo  on, uses second
         point makes quadratic approximation with the "forces" of these
         two points
+
+        With more trial steps  (trials > 1 or a guess  for the step) they
+        are calculated at once through  pmap, each (with workhere = 1) in
+        its own directory transNN, and the step is found by line_step().
+        The  results at  the  accepted point,  if it  is one  of the trial
+        steps, are given back as (geo, energy, gradient), otherwise None.
         """
         assert abs(metric.norm_up(direction, start_geo) - 1.0) < 1e-7
 
-        grad_calc = 0
-        force_l = deepcopy(force)
+        mode_vec_down = metric.lower(mode_vector, start_geo).flatten()
 
-        t_s = deepcopy(trial_step)
+        if trials == 1 and guess is None:
+            grad_calc = 0
+            force_l = deepcopy(force)
 
-        geo = start_geo + direction * t_s
-        mode_vec_down = metric.lower(mode_vector, start_geo).flatten()
-        grad_calc += 1
-        force_r = trans_force( -pes.fprime(geo), mode_vector, mode_vec_down)
+            t_s = deepcopy(trial_step)
+
+            geo = start_geo + direction * t_s
+            grad_calc += 1
+            force_r = trans_force( -pes.fprime(geo), mode_vector, mode_vec_down)
+
+            # interpolate force in middle between two steps
+            f_mid = dot(force_r + force_l, direction) /2.
+
+            # estimate curvature in middle between two steps
+            cr = dot(force_r - force_l, direction) / t_s
+
+            # search  0 = f_mid  + t_s1  * cr  (t_s1 starting  from middle
+            # between two points)
+            t_s = (- f_mid / cr + t_s/ 2.0)
 
-        # interpolate force in middle between two steps
-        f_mid = dot(force_r + force_l, direction) /2.
+            return t_s, grad_calc, None
 
-        # estimate curvature in middle between two steps
-        cr = dot(force_r - force_l, direction) / t_s
+        steps = trial_steps(trial_step, trials, guess)
+        geos = [start_geo + direction * s for s in steps]
 
-        # search  0 = f_mid  + t_s1  * cr  (t_s1 starting  from middle
-        # between two points)
-        t_s = (- f_mid / cr + t_s/ 2.0)
+        trial_pes = Elemental_memoize(pes, pmap = pmap, workhere = workhere, format = "trans%02d")
+        es, gs = trial_pes.taylor(geos)
 
-        return t_s, grad_calc
+        # slopes along the line, for the translation "force":
+        forces = [force] + [trans_force(-g, mode_vector, mode_vec_down) for g in gs]
+        slopes = [-dot(f, direction) for f in forces]
+
+        if default_step is None:
+            default_step = trial_step
+
+        t_s = line_step([0.] + steps, slopes, default_step, snap = 0.1)
+
+        known = None
+        for s, geo, e, g in zip(steps, geos, es, gs):
+            if s == t_s:
+                known = (geo, e, g)
+
+        return t_s, len(steps), known
 
 def trans_force(force_raw_trial, mode_vector, mode_vector_down):
     """
@@ -326,8 +400,8 @@ class translate_lbfgs():
 
         return step, info_out
 
-class translate_sd():
-    def __init__(self, metric, trial_step):
+class translate_sd(translate_cg):
+    def __init__(self, metric, trial_step, trials = 1, predict = False, pmap = map, workhere = 1):
         """
         Use steepest decent to determine  in which direction to do the
         next step.
@@ -355,8 +429,13 @@ class translate_sd():
         """
         self.metric = metric
         self.trial_step = trial_step
+        self.trials = trials
+        self.predict = predict
+        self.pmap = pmap
+        self.workhere = workhere
+        self.last_length = None
 
-    def __call__(self, pes, start_geo, geo_grad, mode_vector, curv, unused):
+    def __call__(self, pes, start_geo, geo_grad, mode_vector, curv, info):
         """
         the actual step
         """
@@ -375,6 +454,7 @@ class translate_sd():
         step = self.metric.raises(force, start_geo)
         step /= sqrt(dot(step, force))
 
+        known = None
         if curv > 0.0:
             # We  are  (supposely)  in  complete wrong  region.   Take
             # maximal step out of here
@@ -382,30 +462,135 @@ class translate_sd():
             grad_calc = 0
         else:
             # find how far to go.  line search, first trial
-            trial_step, grad_calc = line_search(start_geo, step, self.trial_step, pes, self.metric, mode_vector, force)
+            trial_step, grad_calc, known = line_search(start_geo, step, self.trial_step, pes, self.metric, mode_vector, force,
+                                                       **self.line_params(info))
+            self.last_length = trial_step
         step = trial_step * step
 
         step.shape = shape
 
         info = {"trans_abs_force" : self.metric.norm_down(force, start_geo),
-                "trans_gradient_calculations": grad_calc}
+                "trans_gradient_calculations": grad_calc,
+                "trans_result": known}
         return step, info
 
 
+class translate_prfo():
+    def __init__(self, metric, unused):
+        """
+        The parameter  unused is there  for consistence, as  the other
+        translation steps needs a parameter more.
+
+        Partitioned  rational  function  (P-RFO)  step  inside  a  trust
+        radius, see prfo.py.  The hessian is  a Bofill update (which
+        allows  negative  eigenvalues) fed  with the  gradient changes
+        of the steps  and of the Lanczos  rotation.  Along the dimer mode
+        the curvature found by the rotation is set before the step, the
+        P-RFO step then goes uphill along this mode and downhill in all
+        the others.
+
+        The  trust radius starts  at and never grows  beyond max_step,
+        it shrinks if the  energy change of the last  step was badly
+        predicted by the quadratic model.
+
+        >>> from numpy import array
+        >>> from pts.pes.mueller_brown import MB
+
+        >>> met = Default(None)
+        >>> trans = translate_prfo(met, None)
+
+        >>> start = array([-0.75, 0.6])
+        >>> mode = array([-0.8, 0.6])
+
+        >>> step, info = trans(MB, start, MB.fprime(start), mode, -1000., {"max_step" : 0.1})
+        >>> print round(met.norm_up(step, start), 6)
+        0.1
+        >>> info["trans_gradient_calculations"]
+        0
+        """
+        self.hess = Bofill()
+        self.metric = metric
+        self.trust = None
+
+        # the last step, for hessian update and trust radius:
+        self.old_geo = None
+        self.old_grad = None
+        self.old_energy = None
+        self.old_B = None
+
+    def __call__(self, pes, start_geo, geo_grad, mode_vector, curv, info):
+        """
+        the actual step
+        """
+        if self.trust is None:
+            self.trust = TrustRadius(info["max_step"], max_radius = info["max_step"])
+
+        shape = geo_grad.shape
+        grad = geo_grad.flatten()
+        mode = mode_vector.flatten()
+        mode_down = self.metric.lower(mode_vector, start_geo).flatten()
+
+        if "rot_updates" in info:
+            # Gradient differences of the Lanczos rotation:
+            for dr, dg in info["rot_updates"]:
+                self.hess.update(dr.flatten(), dg.flatten())
+
+        energy = info.get("energy")
+        if self.old_grad is not None:
+            dr = (start_geo - self.old_geo).flatten()
+            self.hess.update(dr, grad - self.old_grad)
+
+            if energy is not None and self.old_energy is not None:
+                # Compare with the step actually taken, it might have
+                # been scaled after leaving here:
+                predicted = model_change(self.old_B, self.old_grad, dr)
+                self.trust.update(energy - self.old_energy, predicted, \
+                                  self.metric.norm_up(dr, start_geo))
+
+        B = hessian_matrix(self.hess, len(grad))
+
+        # The rotation knows the curvature along the mode best:
+        B = B + (curv - dot(mode, dot(B, mode))) * outer(mode_down, mode_down)
+
+        step = prfo_step(B, grad, mode = mode)
+
+        step_len = self.metric.norm_up(step, start_geo.flatten())
+        if step_len > self.trust.radius:
+            step *= self.trust.radius / step_len
+
+        self.old_geo = start_geo
+        self.old_grad = grad
+        self.old_energy = energy
+        self.old_B = B
+
+        force_para = - dot(grad, mode) * mode_down
+
+        info_out = {"trans_perp_force" : self.metric.norm_down(- grad - force_para, start_geo),
+                "trans_para_force": self.metric.norm_down(force_para, start_geo),
+                "trans_trust_radius" : self.trust.radius,
+                "trans_gradient_calculations": 0}
+
+        step.shape = shape
+
+        return step, info_out
+
 trans_dict = {
                "conj_grad" : translate_cg,
                "lbfgs"     : translate_lbfgs,
-               "steep_dec" : translate_sd
+               "steep_dec" : translate_sd,
+               "prfo"      : translate_prfo
              }
 
 rot_dict = {
            "dimer" : rotate_dimer,
-           "lanczos" : rotate_dimer_mem
+           "lanczos" : rotate_dimer_mem,
+           "block" : rotate_dimer_block
            }
 
 def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_gradients = None, \
        trans_converged = 0.00016, trans_method = "conj_grad", start_step_length = 0.001, \
-       rot_method = "dimer", trajectory = empty_traj, logfile = None, **params):
+       rot_method = "dimer", trajectory = empty_traj, logfile = None, line_trials = 1, \
+       line_predict = False, timing = None, **params):
     """
     The complete dimer algorithm.
 
@@ -431,10 +616,41 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
 
             might affect everything,  as defines distances and angles,
             from pts.metric module
+
+    With timing (True or the prefix of the files, default "dimer") the
+    time spent  in gradient calculations, rotation, translation and
+    output is measured, see timing.py.
     """
+    if timing:
+        # the same once more, timed. Summary and timeline at the end:
+        if timing is True:
+            timing = "dimer"
+
+        timings.reset()
+        timings.enable()
+        try:
+            with timings("dimer"):
+                return dimer(pes, start_geo, start_mode, metric, max_translation = max_translation,
+                             max_gradients = max_gradients, trans_converged = trans_converged,
+                             trans_method = trans_method, start_step_length = start_step_length,
+                             rot_method = rot_method, trajectory = trajectory, logfile = logfile,
+                             line_trials = line_trials, line_predict = line_predict, **params)
+        finally:
+            timings.report(timing)
+
     # for translation
 
-    trans = trans_dict[trans_method](metric, start_step_length)
+    if trans_method in ("conj_grad", "steep_dec"):
+        # these do a line search, maybe with several trial steps at once:
+        trans = trans_dict[trans_method](metric, start_step_length, trials = line_trials,
+                                         predict = line_predict, pmap = params.get("pmap", map),
+                                         workhere = params.get("workhere", 1))
+    else:
+        trans = trans_dict[trans_method](metric, start_step_length)
+
+    # lanczos with more than one direction per rotation step:
+    if rot_method == "lanczos" and params.get("block_size", 1) > 1:
+        rot_method = "block"
     rot = rot_dict[rot_method]
 
     # do not change them
@@ -465,6 +681,9 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
     # actual logic error:
     res = None                  # will be set to a dict later
 
+    # results at the new geometry, if the line search has them:
+    known = None
+
     i = 0
     # main loop:
     while i < max_translation:
@@ -475,8 +694,13 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
          #            only checked for only maximum number of gradient
          #            calls  if max_translation  >  maximum number  of
          #            gradient calls
-         energy, grad = pes.taylor(geo)
-         grad_calc += 1
+         if known is not None and (known[0].flatten() == geo.flatten()).all():
+             # calculated already as a trial step of the line search:
+             energy, grad = known[1], known[2]
+         else:
+             with timings("pes"):
+                 energy, grad = pes.taylor(geo)
+             grad_calc += 1
 
          # Test for convergence, converged if saddle point is reached
          abs_force = metric.norm_down(grad, geo)
@@ -492,7 +716,8 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
               conv = True
               traj_content1 = [( grad, "grads", "Gradients"),(mode, "modes", "Mode")]
               traj_content2 = [([energy], None, "Energy"), (res["curvature"], None, "Curvature") ]
-              trajectory(geo, i, traj_content1, traj_content2 )
+              with timings("output"):
+                  trajectory(geo, i, traj_content1, traj_content2 )
               selflogfile.write("Trans. Infos:   %12.5f       %12.5f       %12.5f\n" % \
                (energy, abs_force, error))
               selflogfile.write("Calculation is converged with max(abs(force)) %8.5f < %8.5f \n" % \
@@ -501,8 +726,9 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
 
          # calculate  one  step  of   the  dimer,  also  update  dimer
          # direction res is dictionary with additional results
-         step, mode, res = _dimer_step(pes, geo, grad, mode, trans, rot, metric, **params)
+         step, mode, res = _dimer_step(pes, geo, grad, mode, trans, rot, metric, energy = energy, **params)
          grad_calc += res["rot_gradient_calculations"] + res["trans_gradient_calculations"]
+         known = res.get("trans_result")
          #print "iteration", i, error, metric.norm_down(step, geo)
 
          #collect things for output
@@ -530,7 +756,8 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
          selflogfile.flush()
          traj_content1 = [( grad, "grads", "Gradients"),(mode, "modes", "Mode")]
          traj_content2 = [([energy], None, "Energy"), (res["curvature"], None, "Curvature") ]
-         trajectory(geo, i, traj_content1, traj_content2 )
+         with timings("output"):
+             trajectory(geo, i, traj_content1, traj_content2 )
 
          mode_old = mode
          geo = geo + step
@@ -553,6 +780,7 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
     try:
         del res["rot_gradient_calculations"]
         del res["trans_gradient_calculations"]
+        res.pop("trans_result", None)
     except UnboundLocalError:
         # Convergence criteria was fulfilled from the start.
         res = {}
@@ -568,17 +796,21 @@ def dimer(pes, start_geo, start_mode, metric, max_translation = 100000000, max_g
 
     return geo, res
 
-def _dimer_step(pes, start_geo, geo_grad, start_mode, trans, rot, metric, max_step = 0.1, scale_step = 1.0, **params):
+def _dimer_step(pes, start_geo, geo_grad, start_mode, trans, rot, metric, max_step = 0.1, scale_step = 1.0, \
+                energy = None, **params):
     """
     Calculates  the step the  dimer should  take.  First  improves the
     mode start_mode  to mode_vec to identify the  dimer direction Than
     calculates the  step for  the modified force  Scales the  step (if
     required)
     """
-    curv, mode_vec, info = rot(pes, start_geo, geo_grad, start_mode, metric, **params)
+    with timings("rotation"):
+        curv, mode_vec, info = rot(pes, start_geo, geo_grad, start_mode, metric, **params)
 
     info["max_step"] = max_step
-    step_raw, info_t = trans(pes, start_geo, geo_grad, mode_vec, curv, info)
+    info["energy"] = energy
+    with timings("translation"):
+        step_raw, info_t = trans(pes, start_geo, geo_grad, mode_vec, curv, info)
 
     info.update(info_t)
 
@@ -611,6 +843,12 @@ def main(args):
     else:
             params["trajectory"] = traj_last(atoms, funcart)
 
+    if (params.get("block_size", 1) > 1 or params.get("line_trials", 1) > 1) and "pmap" not in params:
+        # the directions of a rotation block or the trial steps of a
+        # line search are calculated in parallel:
+        from pts.paramap import pmap
+        params["pmap"] = pmap
+
     start_mode = start_mode / metric.norm_up(start_mode, start_geo)
     geo, res = dimer(pes, start_geo, start_mode, metric, **params)
 
@@ -1,10 +1,11 @@
 #!/usr/bin/python
 from numpy import dot, array, arctan, sin, cos, pi, zeros
-from numpy import sqrt, arccos
+from numpy import sqrt, arccos, eye
 from copy import deepcopy
 from scipy.linalg import eigh
 from pts.func import NumDiff
 from pts.metric import Default
+from pts.memoize import Elemental_memoize
 
 VERBOSE = 0
 
@@ -333,6 +334,175 @@ def need_restart(restart, i):
        res = (i % restart == 0)
     return res
 
+def rotate_dimer_block(pes, mid_point, grad_mp, start_mode_vec, met, dimer_distance = 0.01, \
+    max_rotations = 10, phi_tol = 0.1, block_size = 4, pmap = map, workhere = 1, **params):
+    """
+    Block  variant of rotate_dimer_mem.  Instead  of one  new direction
+    per rotation step  the gradients for |block_size| orthogonal dimer
+    orientations are  requested at once, through |pmap|  and each (with
+    workhere = 1)  in its own  working directory rotNN.  The smallest
+    eigenvalue  of the  finite  difference Hessian  projected  onto all
+    directions so  far gives  the mode and  the curvature,  the residuals
+    of the lowest  |block_size| eigenpairs are the directions  of the next
+    block (as in block Davidson).
+
+    >>> from pts.pes.mueller_brown import MB
+    >>> met = Default(None)
+
+    >>> start = array([-0.5, 0.5])
+    >>> mode = array([ 0., 1.])
+    >>> d = 0.000001
+
+    With two  dimensions a block  of two spans everything,  one rotation
+    step is enough:
+
+    >>> curv, n_mode, info = rotate_dimer_block(MB, start, MB.fprime(start), mode, met, dimer_distance = d,
+    ...                       phi_tol = 1e-7, block_size = 2, workhere = 0)
+    >>> info["rot_convergence"], info["rot_iteration"], info["rot_gradient_calculations"]
+    (True, 1, 2)
+
+    Compare with the Hessian from central differences:
+
+    >>> h = array([(MB.fprime(start + 1e-5 * e) - MB.fprime(start - 1e-5 * e)) / 2e-5 for e in eye(2)])
+    >>> a, V = eigh(h)
+    >>> abs(min(a) - info["curvature"]) < 0.1
+    True
+
+    >>> dot(V[:, 0] + n_mode, V[:, 0] + n_mode) < 1e-7 or dot(V[:, 0] - n_mode, V[:, 0] - n_mode) < 1e-7
+    True
+
+    A bigger example using Ar4:
+
+    >>> from ase import Atoms
+    >>> from pts.qfunc import QFunc
+    >>> from pts.cfunc import Cartesian
+    >>> from pts.func import compose
+    >>> pes = compose(QFunc(Atoms("Ar4")), Cartesian())
+
+    >>> w=0.39685026
+    >>> C = array([[-w,  w,  w],
+    ...            [ w, -w,  w],
+    ...            [ w, -w, -w],
+    ...            [-w,  w, -w]])
+    >>> start = C.flatten()
+    >>> mode = zeros(12)
+    >>> mode[1] = 1
+
+    >>> curv, n_mode, info = rotate_dimer_block(pes, start, pes.fprime(start), mode, met,
+    ...                       dimer_distance = d, phi_tol = 1e-7, block_size = 4,
+    ...                       workhere = 0)
+    >>> info["rot_convergence"]
+    True
+
+    The rotation steps are done with one gradient per direction:
+
+    >>> info["rot_gradient_calculations"] <= 4 * info["rot_iteration"]
+    True
+
+    The curvature  is the smallest eigenvalue  of the Hessian:
+
+    >>> h = array([(pes.fprime(start + 1e-5 * e) - pes.fprime(start - 1e-5 * e)) / 2e-5 for e in eye(12)])
+    >>> a, V = eigh(h)
+    >>> abs(min(a) - curv) < 0.01
+    True
+    """
+    shape = start_mode_vec.shape
+    # don't change start values, but use flat modes for easier handling
+    mode = deepcopy(start_mode_vec)
+    mode = mode.flatten()
+    mode = mode / met.norm_up(mode, mid_point)
+
+    g0 = deepcopy(grad_mp)
+
+    # evaluates the gradients of a whole block of orientations at once:
+    block_pes = Elemental_memoize(pes, pmap = pmap, workhere = workhere, format = "rot%02d")
+
+    def grads(vms):
+        __, gs = block_pes.taylor([mid_point + dimer_distance * vm for vm in vms])
+        return [g - g0 for g in gs]
+
+    # first block: the start mode and whatever else there is:
+    candidates = [mode, met.raises(g0, mid_point)] + list(eye(len(mode)))
+    block = extend_basis([], candidates, block_size, met, mid_point)
+
+    # keep all the basis vectors and their forces
+    m_basis = []
+    g_for_mb = []
+
+    new_mode = mode
+    conv = False
+    grad_calc = 0
+
+    # ensure that the start value will not pass the test
+    old_mode = zeros(mode.shape)
+
+    i = 0
+    while i < max_rotations and len(block) > 0:
+        i = i + 1
+
+        g_for_mb.extend(grads(block))
+        m_basis.extend(block)
+        grad_calc = grad_calc + len(block)
+
+        M = array(m_basis)
+        G = array(g_for_mb)
+
+        # Hessian (times dimer_distance)  in the basis, it is symmetric,
+        # or should be, enforce it here:
+        H = dot(M, G.T)
+        H = (H + H.T) / 2.
+
+        a, V = eigh(H)
+
+        # eigenvectors as rows and their gradients, as linear
+        # combinations of m_basis and g_for_mb:
+        modes = dot(V.T, M)
+        gs = dot(V.T, G)
+
+        if i > 1:
+            old_mode = new_mode
+        mode_len = met.norm_up(modes[0], mid_point)
+        new_mode = modes[0] / mode_len
+        new_g = gs[0] / mode_len
+        min_curv = a[0] / dimer_distance
+
+        if VERBOSE > 0:
+            print ""
+            print "For block rotation", i, "with", len(m_basis), "directions"
+            print "Eigenvalues:"
+            print a / dimer_distance
+
+        conv = test_lanczos_convergence(new_mode, new_g, old_mode, phi_tol, met, mid_point)
+        if conv:
+            break
+
+        # residuals of the lowest eigenpairs give the next block:
+        residuals = [met.raises(g, mid_point) - c * m for c, m, g in zip(a, modes, gs)[:block_size]]
+        block = extend_basis(m_basis, residuals, block_size, met, mid_point)
+
+        if len(block) == 0:
+            # the directions span an invariant subspace, the result is
+            # as good as it gets:
+            conv = True
+
+    mode = new_mode
+    # this was the shape of the starting mode vector
+    mode.shape = shape
+
+    # rotation force from the interpolated gradient, no extra calculation:
+    fr = rot_force(zeros(new_g.shape), new_g, new_mode.flatten(), met, mid_point)
+
+    # Have them in the right norm
+    m_basis = [ m_bas * dimer_distance for m_bas in m_basis]
+
+    res = { "rot_convergence" : conv, "rot_iteration" : i,
+            "curvature" : min_curv,"rot_abs_forces" : met.norm_down(fr,mid_point),
+            "all_curvs" : a / dimer_distance,
+            "rot_updates" : zip(m_basis, g_for_mb),
+            "rot_gradient_calculations": grad_calc}
+
+    return min_curv, mode, res
+
 def rotate_dimer(pes, mid_point, grad_mp, start_mode_vec, metric, \
     dimer_distance = 0.0001, max_rotations = 10, phi_tol = 0.1, rot_conj_gradient = True, **params):
     """
@@ -665,13 +835,49 @@ def orthogonalize(v_new, vs, met, geo):
     s = s / met.norm_up(s, geo)
     return s
 
+def extend_basis(vs, candidates, k, met, geo, tol = 1e-8):
+    """
+    Returns up to k vectors (upper indice) made from candidates, which
+    are  normed and orthogonal  to each  other and  to the  (normed and
+    orthogonal) vectors vs.  Candidates which are (nearly) in the span
+    of the others are skipped.
+
+    >>> met = Default(None)
+    >>> extend_basis([array([1., 0., 0.])], [array([2., 0., 0.]), array([1., 3., 0.]), array([0., 1., 1.])], 2, met, None)
+    [array([ 0.,  1.,  0.]), array([ 0.,  0.,  1.])]
+    """
+    basis = list(vs)
+    new = []
+    for c in candidates:
+        if len(new) == k:
+            break
+        s = c
+        # second sweep for numerical stability:
+        for sweep in range(2):
+            s_down = met.lower(s, geo)
+            for v in basis:
+                s = s - dot(v, s_down) * v
+        s_len = met.norm_up(s, geo)
+        if s_len <= tol * met.norm_up(c, geo):
+            continue
+        s = s / s_len
+        basis.append(s)
+        new.append(s)
+    return new
+
 def main(args):
     from pts.ui.read_inp_dimer import read_dimer_input
     pes, start_geo, start_mode, params, atoms, funcart = read_dimer_input(args[1:], args[0] )
     metric = Default()
 
+    if params.get("block_size", 1) > 1 and "pmap" not in params:
+        from pts.paramap import pmap
+        params["pmap"] = pmap
+
     start_mode = start_mode / metric.norm_up(start_mode, start_geo)
-    if params["rot_method"] == "lanczos":
+    if params["rot_method"] == "lanczos" and params.get("block_size", 1) > 1:
+        min_curv, mode, res = rotate_dimer_block(pes, start_geo, pes.fprime(start_geo), start_mode, metric, **params)
+    elif params["rot_method"] == "lanczos":
         min_curv, mode, res = rotate_dimer_mem(pes, start_geo, pes.fprime(start_geo), start_mode, metric, **params) 
     else:
         min_curv, mode, res = rotate_dimer(pes, start_geo, pes.fprime(start_geo), start_mode, metric, **params) 
@@ -225,9 +225,6 @@ from numpy import array, dot, hstack, linalg, atleast_1d, abs, column_stack, one
 from numpy import empty, asarray, searchsorted
 from numpy import shape
 from npz import matmul
-from scipy.interpolate import splrep, splev # interp1d
-from scipy.integrate import quad
-from scipy.optimize import newton
 from ridders import dfridr
 
 class Func(object):
@@ -620,12 +617,17 @@ class CubicFunc(Func):
 
 class SplineFunc(Func):
     def __init__(self, xs, ys):
+        # scipy is imported here, not at module level, importing it
+        # costs more than most command line tools need to run:
+        from scipy.interpolate import splrep
         self.spline_data = splrep(xs, ys, s=0)
 
     def f(self, x):
+        from scipy.interpolate import splev
         return splev(x, self.spline_data, der=0)
 
     def fprime(self, x):
+        from scipy.interpolate import splev
         return splev(x, self.spline_data, der=1)
 
 def casteljau(t, ps):
@@ -855,6 +857,7 @@ class Integral(Func):
             x0 = xs[0]
 
         # f(x0) is cached, compute the integral from x0 to x:
+        from scipy.integrate import quad
         (s, err) = quad(self.fprime, x0, x, **self.kwargs)
         if abs(err) > abs(s) * 1.0e-3:
             from warnings import warn
@@ -898,6 +901,7 @@ class Inverse(Func):
         # solve equation sdiff(x) = 0, starting with trial x = 0:
         # FIXME: maybe approximate interpolation for initial x?
         # THIS DOES NOT WORK: (x, kws, err, msg) = scipy.optimize.fsolve(f, 0.0, fprime=sprime)
+        from scipy.optimize import newton
         x = newton(s0, 0.0, fprime=self.s.fprime)
 
         assert abs(s0(x)) <= 1.0e7
@@ -5,7 +5,7 @@ import numpy as np
 class Record():
     """A single record in the history of a Chain of State.
     
-    >>> r = Record([1,2], [[1,2],[2,3]], [[0,0],[0.01,0]], [[1,2],[3,4]], None)
+    >>> r = Record([1,2], [[1,2],[2,3]], [[0,0],[0.01,0]], [[1,2],[3,4]])
 
     >>> r.maxix
     1
@@ -19,12 +19,34 @@ class Record():
     """
     def __init__(self, es, state, perp_forces, para_forces):
 
+        self.es = None
+        self.state = None
+        self.perp_forces = None
+        self.para_forces = None
+
+        self.update(es, state, perp_forces, para_forces)
+
+    def update(self, es, state, perp_forces, para_forces):
+        """
+        Overwrites the record with new data. The arrays of the record are
+        reused if  shape and type fit, thus  references to them  held by
+        others will see the new values.
+
+        >>> r = Record([1,2], [[1,2],[2,3]], [[0,0],[0.01,0]], [[1,2],[3,4]])
+        >>> state = r.state
+        >>> r.update([3,2], [[5,6],[7,8]], [[0,0],[0,0]], [[0,0],[0,0]])
+        >>> state is r.state
+        True
+        >>> r.max
+        array([5, 6])
+        """
+
         assert len(es) == len(state) == len(perp_forces) == len(para_forces)
 
-        self.es = np.array(es)
-        self.state = np.array(state)
-        self.perp_forces = np.array(perp_forces)
-        self.para_forces = np.array(para_forces)
+        self.es = _fill(self.es, es)
+        self.state = _fill(self.state, state)
+        self.perp_forces = _fill(self.perp_forces, perp_forces)
+        self.para_forces = _fill(self.para_forces, para_forces)
         self.bead_count = len(self.es)
 
         self.maxix = self.es.argmax()
@@ -45,11 +67,21 @@ class Record():
         return "bc: %d %s" % (self.bead_count, self.es)
         
 
+def _fill(buf, a):
+    """
+    Copies a into buf if possible, otherwise returns a fresh copy of a.
+    """
+    a = np.asarray(a)
+    if buf is None or buf.shape != a.shape or buf.dtype != a.dtype:
+        return np.array(a)
+    buf[...] = a
+    return buf
+
 class History():
     """The history of a Chain of State.
     
-    >>> r1 = Record([1,4], [[0,1,2],[0,2,3]], [[0,0,0.1],[0.01,0,0]], [[1,2,1],[3,4,1]], None)
-    >>> r2 = Record([2,4], [[1,2,2],[0,2,3]], [[0,0,0],[0.0,0,0]], [[1,2,1],[3,4,1]], None)
+    >>> r1 = Record([1,4], [[0,1,2],[0,2,3]], [[0,0,0.1],[0.01,0,0]], [[1,2,1],[3,4,1]])
+    >>> r2 = Record([2,4], [[1,2,2],[0,2,3]], [[0,0,0],[0.0,0,0]], [[1,2,1],[3,4,1]])
 
     >>> h = History()
     >>> h.rec(r1)
@@ -69,9 +101,37 @@ class History():
     >>> h.e(2)
     [5, 6]
 
+    With maxlen only the last  maxlen records are kept. The arrays of the
+    oldest record are then reused for the new one:
+
+    >>> h = History(maxlen=2)
+    >>> h.rec(([1,4], [[0,1,2],[0,2,3]], [[0,0,0],[0,0,0]], [[0,0,0],[0,0,0]]))
+    >>> h.rec(([2,4], [[1,2,2],[0,2,3]], [[0,0,0],[0,0,0]], [[0,0,0],[0,0,0]]))
+    >>> oldest = h.list[0]
+    >>> h.rec(([3,5], [[2,2,2],[0,2,3]], [[0,0,0],[0,0,0]], [[0,0,0],[0,0,0]]))
+
+    >>> len(h)
+    2
+
+    >>> h.list[-1] is oldest
+    True
+
+    >>> h.e(3)
+    [6, 8]
+
+    >>> h.step(2,2)
+    array([[1, 0, 0],
+           [0, 0, 0]])
+
+    The history is part of the checkpoints of the chain:
+
+    >>> from pickle import loads, dumps
+    >>> loads(dumps(h)).e(3)
+    [6, 8]
     """
-    def __init__(self):
+    def __init__(self, maxlen=None):
         self.list = []
+        self.maxlen = maxlen
     
     def __str__(self):
         return ', '.join([str(i) for i in self.list])
@@ -79,9 +139,18 @@ class History():
     def rec(self, r):
         """Records a snapshot."""
         if r.__class__.__name__ != 'Record':
-            r = Record(*r)
+            if self.maxlen is not None and len(self.list) >= self.maxlen:
+                # recycle the buffers of the oldest record:
+                old = self.list.pop(0)
+                old.update(*r)
+                r = old
+            else:
+                r = Record(*r)
         assert r.__class__.__name__ == 'Record'
 
+        if self.maxlen is not None:
+            del self.list[:len(self.list) + 1 - self.maxlen]
+
         self.list.append(r)
 
     def __len__(self):
@@ -93,6 +162,10 @@ class History():
         e.g. history.bead_count(n) where |n| specifies to return the last n
         values in the history.
         """
+        # special methods, as those of pickle, are not records:
+        if name.startswith("__"):
+            raise AttributeError(name)
+
         if len(self.list) == 0:
             return lambda n: []
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Step lengths  for the  line searches  of the conjugate  gradient (chain
+of states) and dimer translation optimizers.
+
+Instead of one trial step  followed by a quadratic interpolation, several
+trial steps can be  calculated at once (in parallel, by the  pmap of the
+caller). Their lengths are  the trial step, growing by a factor, and, if
+given, a guess for the final step (e.g. the last accepted one):
+
+    >>> trial_steps(0.01, 3)
+    [0.01, 0.04, 0.16]
+    >>> trial_steps(0.01, 2, guess=0.3)
+    [0.01, 0.04, 0.3]
+
+The slopes (projections of the  gradient on the search direction) at the
+start and at the trial steps give the step length. A quadratic function
+along the line is found with only one trial step:
+
+    >>> slope = lambda s: 2. * (s - 0.35)
+    >>> steps = [0., 0.01]
+    >>> print round(line_step(steps, map(slope, steps), 0.1), 8)
+    0.35
+
+With more  of them the minimum is  searched between the trial steps with
+the slopes changing sign, for a cubic function the interpolation of the
+slopes is exact:
+
+    >>> slope = lambda s: (s - 0.1) * (s + 0.4)
+    >>> steps = [0., 0.01, 0.04, 0.16]
+    >>> print round(line_step(steps, map(slope, steps), 0.1), 8)
+    0.1
+
+If the  result is close to one  of the trial steps this  one might be
+taken instead, its gradients are known already. Here with a (slightly
+wrong) guess among the trial steps:
+
+    >>> steps = [0., 0.01, 0.04, 0.12]
+    >>> print line_step(steps, map(slope, steps), 0.1, snap=0.25)
+    0.12
+    >>> print round(line_step(steps, map(slope, steps), 0.1, snap=0.1), 8)
+    0.1
+
+Without positive curvature the default step is taken:
+
+    >>> slope = lambda s: - 1. - s
+    >>> line_step(steps, map(slope, steps), 0.1)
+    0.1
+"""
+
+__all__ = ["trial_steps", "line_step"]
+
+from numpy import asarray, argsort, nonzero, polyfit, roots, isreal
+
+# the trial steps grow by this factor:
+SPREAD = 4.0
+
+def trial_steps(trial_step, trials=1, guess=None):
+    """
+    Lengths  of the trial  steps, |trials| of  them growing  from trial_step
+    by SPREAD, and guess (if given and not among them already).
+    """
+    steps = [trial_step * SPREAD**i for i in range(trials)]
+
+    if guess is not None and guess > 0.0 and guess not in steps:
+        steps.append(guess)
+
+    return sorted(steps)
+
+def line_step(steps, slopes, default_step, snap=0.0):
+    """
+    Step length of the minimum along a line, given the slopes (derivatives
+    along the line) at the  step lengths steps, the first of them 0.
+    Between two steps with a  change of sign of the slope, the slopes are
+    interpolated  quadratically  (that is  the  function cubically) if  there
+    is a third step  to use.  Otherwise the step is extrapolated linearly
+    from the last two slopes. If the slopes do not grow default_step is
+    taken, backwards if the line goes uphill.
+
+    If the step is within snap  times the length of a trial step from it,
+    the trial step is returned instead.
+    """
+    s = asarray(steps, dtype=float)
+    d = asarray(slopes, dtype=float)
+
+    order = argsort(s)
+    s = s[order]
+    d = d[order]
+    assert s[0] == 0.0
+
+    up = nonzero(d[1:] >= 0.0)[0]
+
+    if d[0] > 0.0 or len(s) == 2 or len(up) == 0:
+        # the two  points nearest  to the  minimum, as far  as known, the
+        # first two if going uphill from the start:
+        if d[0] > 0.0:
+            i, j = 0, 1
+        else:
+            i, j = len(s) - 2, len(s) - 1
+
+        c = (d[j] - d[i]) / (s[j] - s[i])
+        if c > 0.0:
+            step = s[i] - d[i] / c
+        elif d[0] > 0.0:
+            step = - default_step
+        else:
+            step = default_step
+    else:
+        # minimum bracketed by s[j - 1] and s[j]:
+        j = up[0] + 1
+        step = s[j-1] - d[j-1] * (s[j] - s[j-1]) / (d[j] - d[j-1])
+
+        # third point for the interpolation:
+        if j + 1 < len(s):
+            k = j + 1
+        else:
+            k = j - 2
+
+        if k >= 0:
+            ix = [j - 1, j, k]
+            for x in roots(polyfit(s[ix], d[ix], 2)):
+                if isreal(x) and s[j-1] <= x.real <= s[j]:
+                    step = x.real
+                    break
+
+    if snap > 0.0:
+        x = s[1:][abs(s[1:] - step).argmin()]
+        if abs(step - x) <= snap * x:
+            step = x
+
+    return step
+
+# python linesearch.py [-v]:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
@@ -81,12 +81,19 @@ Delete the object and recreate from file:
 from __future__ import with_statement
 from copy import copy
 from func import Func
+from paramap import Failure
+from pts.timing import timings
 import os # mkdir, chdir, getcwd, unlink, path, ...
-import sys # only stderr
+import sys # stderr, exc_info
 from pickle import dump, load
 from pickle import dumps, loads
-from numpy import dot
+from numpy import asarray, ndarray, float64, sqrt, newaxis
+from collections import OrderedDict
+from threading import Thread, Lock, Event
+from Queue import Queue, Empty
+import atexit
 import hashlib
+from traceback import format_exc
 
 VERBOSE = 0
 
@@ -254,6 +261,42 @@ def tup(a):
     # convert iterables to (hashable) tuples:
     return tuple( tup(b) for b in a )
 
+def fastkey(x):
+    """Hashable key made of the raw bytes of the float64 representation
+    of x. For arrays this is much cheaper than tup(x). Tuples are taken
+    as containers, as in the (args, order) keys of Memoize:
+
+        >>> from numpy import array
+
+        >>> fastkey([1., 2.]) == fastkey(array([1., 2.]))
+        True
+
+        >>> fastkey(array([1., 2.])) == fastkey(array([[1., 2.]]))
+        False
+
+        >>> fastkey(((array([1., 2.]),), 0)) == fastkey((([1., 2.],), 0))
+        True
+
+        >>> fastkey(1.)
+        1.0
+    """
+    if type(x) is tuple:
+        return tuple(fastkey(y) for y in x)
+
+    if isinstance(x, ndarray) and x.dtype == float64:
+        a = x
+    else:
+        try:
+            a = asarray(x, dtype=float)
+        except (TypeError, ValueError):
+            # not numbers, the slow way:
+            return tup(x)
+
+    if a.ndim == 0:
+        return a.item()
+
+    return (a.shape, a.tostring())
+
 class MemStore(object):
     """Minimalistic dictionary. Accepts mutable arrays/lists as keys.
     The real keys are (nested) tuple representation of arrays/lists
@@ -347,11 +390,17 @@ class FileStore(MemStore):
 
     def __setitem__(self, key, val):
         """Needs to update on-disk state."""
-        MemStore.__setitem__(self, key, val)
+        self.update([(key, val)])
+
+    def update(self, items):
+        """Sets all (key, val) pairs, writes the file only once."""
+        for key, val in items:
+            MemStore.__setitem__(self, key, val)
 
         # dump the whole dictionary into file, FIXME: better solution?
-        with open(self.filename,'w') as f:
-            dump(self._d, f, protocol=2) # pickle.dump
+        with timings("cache.write"):
+            with open(self.filename,'w') as f:
+                dump(self._d, f, protocol=2) # pickle.dump
 
 def hexhash(sdata, salt=""):
     """
@@ -499,10 +548,11 @@ class DirStore(object):
             # FIXME: race condition here:
             maybe_mkdir(os.path.join(self.filename, sh))
 
-        with open(os.path.join(self.filename, sh, ex), 'w') as f:
-            dump((key, val), f, protocol=2) # pickle.dump
-            if VERBOSE:
-                print >> sys.stderr, "WARNING: DirStore:", sh+ex, "written"
+        with timings("cache.write"):
+            with open(os.path.join(self.filename, sh, ex), 'w') as f:
+                dump((key, val), f, protocol=2) # pickle.dump
+                if VERBOSE:
+                    print >> sys.stderr, "WARNING: DirStore:", sh+ex, "written"
 
     def __getitem__(self, key):
         """Slurps the data from the file"""
@@ -516,11 +566,12 @@ class DirStore(object):
         try:
             if VERBOSE:
                 print >> sys.stderr, "WARNING: DirStore:", sh+ex, "trying"
-            with open(os.path.join(self.filename, sh, ex), 'r') as f:
-                key1, val = load(f) # pickle.load
-                assert serialize(key) == serialize(key1) # FIXME: collision?
-                if VERBOSE:
-                    print >> sys.stderr, "WARNING: DirStore:", sh+ex, "loaded"
+            with timings("cache.read"):
+                with open(os.path.join(self.filename, sh, ex), 'r') as f:
+                    key1, val = load(f) # pickle.load
+            assert serialize(key) == serialize(key1) # FIXME: collision?
+            if VERBOSE:
+                print >> sys.stderr, "WARNING: DirStore:", sh+ex, "loaded"
         except IOError:
             raise KeyError
 
@@ -554,6 +605,252 @@ class DirStore(object):
                 with open(os.path.join(root, name)) as f:
                     yield load(f) # pickle.load
 
+class LRUStore(object):
+    """
+    Two tier dictionary. A bounded in-memory tier keyed by fastkey(key)
+    forgets the  least recently used  entries.  Behind it  an optional
+    persistent store (FileStore, DirStore, ...)  keeps everything. New
+    entries are written to  the store in the background, reading from
+    the store happens only on misses in memory.
+
+        >>> d = LRUStore(maxsize=2)
+        >>> d[[1., 2.]] = 10.
+        >>> d[[3., 4.]] = 20.
+        >>> d[[1., 2.]]
+        10.0
+        >>> d[[5., 6.]] = 30.
+
+    The least recently used entry is gone:
+
+        >>> [3., 4.] in d
+        False
+        >>> [1., 2.] in d
+        True
+        >>> sorted(d.stats["memory"].items())
+        [('evictions', 1), ('hits', 2), ('misses', 1)]
+
+    With a persistent store, entries evicted from memory are still there:
+
+        >>> fn = "/tmp/tEmP.lru.d"
+        >>> d = LRUStore(DirStore(fn), maxsize=1)
+        >>> d[0.5] = 1.
+        >>> d[1.5] = 2.
+        >>> d.flush()
+        >>> d[0.5]
+        1.0
+        >>> sorted(d.stats["store"].items())
+        [('hits', 1), ('misses', 0), ('writes', 2)]
+
+    A new object finds them on disk:
+
+        >>> e = LRUStore(DirStore(fn))
+        >>> e[1.5]
+        2.0
+
+        >>> import shutil
+        >>> shutil.rmtree(fn)
+
+    Errors of the background writer show up at the next flush():
+
+        >>> class Broken(object):
+        ...     def __setitem__(self, key, val):
+        ...         raise IOError("disk full")
+
+        >>> d = LRUStore(Broken())
+        >>> d[0.5] = 1.
+        >>> d.flush()
+        Traceback (most recent call last):
+        ...
+        IOError: disk full
+
+    The entry is still there, from memory, and the error is reported
+    only once:
+
+        >>> d[0.5]
+        1.0
+        >>> d.flush()
+        >>> d.close()
+
+    In a forked process (as with  the workers of paramap) the background
+    writer is not available, there the store is written at once.
+    """
+    def __init__(self, store=None, maxsize=10000, background=True):
+        self.store = store
+        self.maxsize = maxsize
+        self.background = background
+
+        # fastkey(key) -> val, in order of use:
+        self._d = OrderedDict()
+
+        self.stats = {"memory": {"hits": 0, "misses": 0, "evictions": 0},
+                      "store": {"hits": 0, "misses": 0, "writes": 0}}
+
+        # started with the first write:
+        self._writer = None
+        self._pid = os.getpid()
+
+    def _remember(self, k, val):
+        self._d[k] = val
+        if self.maxsize is not None and len(self._d) > self.maxsize:
+            self._d.popitem(last=False)
+            self.stats["memory"]["evictions"] += 1
+
+    def __getitem__(self, key):
+        k = fastkey(key)
+        d = self._d
+
+        if k in d:
+            self.stats["memory"]["hits"] += 1
+            # move to the end, as most recently used:
+            val = d.pop(k)
+            d[k] = val
+            return val
+
+        self.stats["memory"]["misses"] += 1
+
+        if self.store is None:
+            raise KeyError(key)
+
+        # may still wait to be written:
+        if self._writer is not None:
+            item = self._writer.pending.get(k)
+            if item is not None:
+                val = item[1]
+                self._remember(k, val)
+                return val
+
+        try:
+            val = self.store[key]
+        except KeyError:
+            self.stats["store"]["misses"] += 1
+            raise
+
+        self.stats["store"]["hits"] += 1
+        self._remember(k, val)
+        return val
+
+    def __setitem__(self, key, val):
+        k = fastkey(key)
+        self._d.pop(k, None)
+        self._remember(k, val)
+
+        if self.store is None:
+            return
+
+        self.stats["store"]["writes"] += 1
+
+        if not self.background or os.getpid() != self._pid:
+            # no threads in a forked process:
+            self.store[key] = val
+            return
+
+        if self._writer is None:
+            self._writer = _WriteBehind(self.store)
+            self._writer.start()
+            atexit.register(self.close)
+
+        self._writer.put(k, key, val)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def flush(self):
+        """Waits until everything is in the persistent store."""
+        if self._writer is not None and os.getpid() == self._pid:
+            self._writer.flush()
+
+    def close(self):
+        """Writes what is left and stops the background writer."""
+        if self._writer is not None and os.getpid() == self._pid:
+            self._writer.close()
+            self._writer = None
+
+class _WriteBehind(Thread):
+    """
+    Writes entries into a store in the background.  Entries waiting
+    in the queue are written at once, by store.update() if the store has
+    it.  An exception of a write is raised again by the next flush() or
+    close(), the entries stay pending.
+    """
+    def __init__(self, store):
+        Thread.__init__(self)
+        self.daemon = True
+        self.store = store
+        self.queue = Queue()
+        self.lock = Lock()
+
+        # fastkey -> (key, val) of entries not yet written:
+        self.pending = {}
+
+        # sys.exc_info() of a failed write, for flush():
+        self.error = None
+
+    def put(self, k, key, val):
+        with self.lock:
+            self.pending[k] = (key, val)
+        self.queue.put(("write", k))
+
+    def run(self):
+        done = False
+        while not done:
+            jobs = [self.queue.get()]
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            # flush requests are events to be set:
+            events = [x for kind, x in jobs if kind == "flush"]
+            done = ("close", None) in jobs
+
+            with self.lock:
+                items = dict((k, self.pending[k]) for kind, k in jobs \
+                             if kind == "write" and k in self.pending)
+
+            try:
+                update = getattr(self.store, "update", None)
+                if update is not None:
+                    update(items.values())
+                else:
+                    for key, val in items.itervalues():
+                        self.store[key] = val
+            except Exception:
+                # the thread would die silently, leave it to flush():
+                self.error = sys.exc_info()
+            else:
+                with self.lock:
+                    for k, item in items.iteritems():
+                        # unless there is a newer value:
+                        if self.pending.get(k) is item:
+                            del self.pending[k]
+
+            for event in events:
+                event.set()
+
+    def flush(self):
+        if self.is_alive():
+            event = Event()
+            self.queue.put(("flush", event))
+            event.wait()
+        self._reraise()
+
+    def close(self):
+        if self.is_alive():
+            self.queue.put(("close", None))
+            self.join()
+        self._reraise()
+
+    def _reraise(self):
+        if self.error is not None:
+            typ, val, tb = self.error
+            self.error = None
+            raise typ, val, tb
+
 class Memoize(Func):
     """Memoize the .f and .fprime methods
 
@@ -598,6 +895,22 @@ class Memoize(Func):
         >>> s1.fprime(0.), s1.fprime(0.), s1.fprime(0.)
         co( 0.0 )
         (1.0, 1.0, 1.0)
+
+    If the value is not yet known, it is kept as well:
+
+        >>> s1.fprime(0.3), s1(0.3)
+        si( 0.3 )
+        co( 0.3 )
+        (0.955336489125606, 0.29552020666133955)
+
+    Values are stored  separately from the derivatives.  A value alone
+    is computed by f only, asking  for the derivative later computes
+    the derivative:
+
+        >>> s1.taylor(pi/2.0)
+        si( 1.57079632679 )
+        co( 1.57079632679 )
+        (1.0, 6.123233995736766e-17)
     """
     def __init__(self, func, store=None):
         self.__f = func
@@ -616,9 +929,9 @@ class Memoize(Func):
     def f(self, *args):
         # key for the value:
         key = (args, 0)
-        if key in self.__d:
+        try:
             return self.__d[key]
-        else:
+        except KeyError:
             f = self.__f(*args)
             self.__d[key] = f
             return f
@@ -626,20 +939,28 @@ class Memoize(Func):
     def fprime(self, *args):
         # key for the derivative:
         key = (args, 1)
-        if key in self.__d:
+        try:
             return self.__d[key]
-        else:
+        except KeyError:
+            pass
+
+        if (args, 0) in self.__d:
             fprime = self.__f.fprime(*args)
-            self.__d[key] = fprime
-            return fprime
+        else:
+            # for most functions the value comes with the derivative
+            # for free, keep both:
+            f, fprime = self.__f.taylor(*args)
+            self.__d[(args, 0)] = f
+        self.__d[key] = fprime
+        return fprime
 
     def taylor(self, *args):
         # keys for the value and derivative:
         key0 = (args, 0)
         key1 = (args, 1)
-        if key0 in self.__d and key1 in self.__d:
+        try:
             return self.__d[key0], self.__d[key1]
-        else:
+        except KeyError:
             f, fprime = self.__f.taylor(*args)
             self.__d[key0] = f
             self.__d[key1] = fprime
@@ -696,22 +1017,28 @@ class Empty_contex(object):
        pass
 
    def __exit__(self, exc_type, exc_val, exc_tb):
-       assert (exc_type == None)
        #print "End Calculation with id", self.wd
-       return True
+       # exceptions are passed on:
+       return False
 
 def global_distribution(xs, xlast_i ):
     """
     find out which of the new values to calculate fits
-    to the ones from the last calculation
+    to the ones from the last calculation. The assignment minimizes
+    the total distance between new and old values (Hungarian method),
+    new values left over get new places.
 
     >>> xl = [0,3,4,23,5]
     >>> xs = [0, 3.5, 22, 8]
     >>> global_distribution(xs, xl)
     [0, 1, 3, 4]
+
+    Here 3.5 and 3.1 both would like to have 3, overall it is better to
+    give 4 to 3.5 than to give 3.1 a new place:
+
     >>> xs = [-5, 15, 3.5, 3.1, 6]
     >>> global_distribution(xs, xl)
-    [0, 3, 1, 5, 4]
+    [0, 3, 2, 1, 4]
 
     Normally we expect the x to be vectors:
     >>> from numpy import array
@@ -721,27 +1048,39 @@ def global_distribution(xs, xlast_i ):
     >>> global_distribution(xs, xl)
     [1, 0, 2, 3]
     >>> global_distribution(xl, xs)
-    [0, 4]
+    [1, 0]
     """
-    occupied = []
-    new = len(xlast_i)
-    if len(xlast_i) > 0:
-        for x in xs:
-            # find to wich of the last values this one is
-            # the nearest
-            dis = [dot(x-xl, x-xl) for xl in xlast_i]
-            j = dis.index(min(dis))
-
-            # if this one is already used, create a new one
-            # else take it
-            if j in occupied:
-                occupied.append(new)
-                new = new + 1
-            else:
-                occupied.append(j)
-    else:
+    from scipy.optimize import linear_sum_assignment
+
+    if len(xlast_i) == 0:
         # if there a not yet any old values
-        occupied = range(len(xs))
+        return range(len(xs))
+
+    if len(xs) == 0:
+        return []
+
+    X = asarray(xs, dtype=float).reshape(len(xs), -1)
+    Y = asarray(xlast_i, dtype=float).reshape(len(xlast_i), -1)
+
+    # all distances between new and old values at once:
+    D = sqrt(((X[:, newaxis, :] - Y[newaxis, :, :])**2).sum(axis=2))
+
+    # assignment with the smallest total displacement, if there are
+    # more new values than old ones some stay unassigned:
+    rows, cols = linear_sum_assignment(D)
+
+    occupied = [None] * len(xs)
+    for i, j in zip(rows, cols):
+        occupied[i] = j
+
+    # the remaining ones get new places, in order:
+    new = len(xlast_i)
+    for i in range(len(xs)):
+        if occupied[i] is None:
+            occupied[i] = new
+            new = new + 1
+        else:
+            occupied[i] = int(occupied[i])
 
     return occupied
 
@@ -781,10 +1120,65 @@ class Single_contex(object):
         print "Starting Calculation in", self.__wd
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        assert (exc_type == None)
+        # back in any case, exceptions are passed on:
         os.chdir(self.__cwd)
-        print "Finished Calculation in", self.__wd
-        return True
+        if exc_type is None:
+            print "Finished Calculation in", self.__wd
+        else:
+            print "Failed Calculation in", self.__wd
+        return False
+
+class Bead_call(object):
+    """
+    Calls the method  of f (e.g. "taylor") for x of z = (x, i) in the
+    context for  the number i, as the pmap of Elemental_memoize needs
+    it.  Unlike a closure it can be pickled (if f can) and thus be sent
+    to other nodes, see remote.py.  Exceptions are returned as Failure,
+    as the parallel maps do it for jobs which crash:
+
+    >>> from pickle import loads, dumps
+    >>> from pts.pes.mueller_brown import MB
+    >>> g = loads(dumps(Bead_call(MB, "f", Empty_contex)))
+    >>> print round(g(([-0.558, 1.442], 0)), 2)
+    -146.7
+    >>> g((None, 0))                            # doctest: +ELLIPSIS
+    Failure('IndexError: ...')
+    """
+    def __init__(self, f, method, contex, format = "%02d"):
+        self.f = f
+        self.method = method
+        self.contex = contex
+        self.format = format
+
+    def __call__(self, z):
+        # actual caclculation is only on x,
+        # i is given also so that pmap can
+        # steal it
+        x, i = z
+        try:
+            contex = self.contex(i, format = self.format)
+            with contex:
+                return getattr(self.f, self.method)(x)
+        except Exception:
+            return Failure(format_exc())
+
+def _apply(job):
+    """
+    Pmap of  Elemental_memoize calling different functions,  jobs are
+    pairs (f, z), like (Bead_call, (x, i)).
+    """
+    f, z = job
+    return f(z)
+
+class BeadError(Exception):
+    """
+    Raised by Elemental_memoize if some of the calculations failed, the
+    failures are pairs of geometry and Failure.
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        Exception.__init__(self, "%d calculations failed: %s" % \
+                           (len(failures), ", ".join([repr(y) for x, y in failures])))
 
 class Elemental_memoize(Func):
     """
@@ -809,7 +1203,7 @@ class Elemental_memoize(Func):
 
     First evaluation:
 
-        >>> s1([0., 0.3 , pi/2.0])
+        >>> s1.taylor([0., 0.3 , pi/2.0])[0]
         si( 0.0 )
         co( 0.0 )
         si( 0.3 )
@@ -820,27 +1214,71 @@ class Elemental_memoize(Func):
 
     Second evaluation:
 
-        >>> s1([ 0., pi/2.0])
+        >>> s1.taylor([ 0., pi/2.0])[0]
         [0.0, 1.0]
 
-        >>> s1([0., pi/8., 0.3])
+        >>> s1.taylor([0., pi/8., 0.3])[0]
         si( 0.392699081699 )
         co( 0.392699081699 )
         [0.0, 0.3826834323650898, 0.29552020666133955]
 
-        >>> s1([0.0, 0.1, pi/8.+ 0.0001, pi/8., 0.3, 0.4])
-        si( 0.1 )
-        co( 0.1 )
-        si( 0.392799081699 )
-        co( 0.392799081699 )
-        si( 0.4 )
-        co( 0.4 )
-        [0.0, 0.09983341664682815, 0.38277581840476976, 0.3826834323650898, 0.29552020666133955, 0.3894183423086505]
-
     Same for derivative:
 
         >>> s1.fprime([0., 0.3, pi/8.])
         [1.0, 0.955336489125606, 0.9238795325112867]
+
+    The values alone (f or calling  s1) are computed without derivatives,
+    the cache keeps these partial results:
+
+        >>> s1([0.0, 0.1, pi/8., 0.4])
+        si( 0.1 )
+        si( 0.4 )
+        [0.0, 0.09983341664682815, 0.3826834323650898, 0.3894183423086505]
+
+        >>> s1.known(0.1), s1.known(0.1, grad = False)
+        (False, True)
+
+    Asking for derivatives  later upgrades them,  the values are computed
+    anew as f.taylor() provides them together:
+
+        >>> s1.fprime([0.1, 0.3])
+        si( 0.1 )
+        co( 0.1 )
+        [0.9950041652780258, 0.955336489125606]
+
+        >>> s1([0.1, 0.4])
+        [0.09983341664682815, 0.3894183423086505]
+
+    If some of the calculations fail, the others are kept in the cache
+    before BeadError reports the failures. The failed ones are calculated
+    again when asked for the next time (e.g. after fixing the cause,
+    or when the program is restarted with a persistent cache):
+
+        >>> from math import sqrt as root
+        >>> sq = Func(root, lambda x: 0.5 / root(x))
+        >>> r = Elemental_memoize(sq, workhere = 0)
+
+        >>> r([4.0, -1.0, 9.0])
+        Traceback (most recent call last):
+        ...
+        BeadError: 1 calculations failed: Failure('ValueError: math domain error')
+
+        >>> r.known(4.0, grad = False), r.known(-1.0, grad = False)
+        (True, False)
+
+    To let failures of single calculations pass use a parallel map which
+    tries again, see Retry in paramap.py.
+
+    Points of another  memoize, e.g. one  sharing the cache but with
+    other  directories,  may be calculated  by the same pmap call,  as
+    spare.  Their failures are not reported:
+
+        >>> r2 = Elemental_memoize(sq, cache = r.cache, workhere = 0)
+        >>> r.taylor([16.0], spare = (r2, [25.0, -4.0]))
+        ([4.0], [0.125])
+
+        >>> r.known(25.0), r.known(-4.0)
+        (True, False)
     """
     def __init__(self, f, pmap = map, cache=None, workhere = 1, format = "%02d" ):
         # for each call to memoize, create a new cache
@@ -862,37 +1300,47 @@ class Elemental_memoize(Func):
 
         self.last_xs_is = []
 
-        def f_t_rem_i(z):
-            # actual caclculation is only on x,
-            # i is given also so that pmap can
-            # steal it
-            x, i = z
-            contex = self.contex(i, format = self.format)
-            with contex:
-                return f.taylor(x)
-
-        self.memfun = f_t_rem_i
+        self.memfun = Bead_call(f, "taylor", self.contex, self.format)
+        self.memfun_f = Bead_call(f, "f", self.contex, self.format)
         self.pmap = pmap
 
-    def taylor(self, xs):
-        # collect those to be computed:
+    def known(self, x, grad = True):
+        """
+        True if the  result for x is  in the cache, with the derivatives
+        unless grad is false.  Entries  computed by f() alone are stored
+        as (f, None).
+        """
+        if x not in self.cache:
+            return False
+
+        return not grad or self.cache[x][1] is not None
+
+    def _pending(self, xs, grad):
+        """
+        Those of xs not known yet, and the numbers of the contexts to
+        calculate them in.
+        """
         xs1 = []
         wds = []
         for i, x in enumerate(xs):
-            if x not in self.cache:
+            if not self.known(x, grad):
                 xs1.append(x)
                 wds.append(i)
 
         if self.workhere == 1:
             wds = global_distribution(xs1, self.last_xs_is)
 
-        # compute missing results:
-        ys1 = self.pmap(self.memfun, zip(xs1, wds))
+        timings.count("beads.cached", len(xs) - len(xs1))
+        timings.count("beads.computed", len(xs1))
 
-        # store new results:
-        for x, i, y in zip(xs1, wds, ys1):
-            # store only with value of x
-            self.cache[x] = y
+        return xs1, wds
+
+    def _store(self, xs1, wds, ys1, grad):
+        """
+        Stores the results ys1 of xs1, calculated in the contexts wds, as
+        (f, None) unless grad is true. Returns the failures.
+        """
+        for x, i in zip(xs1, wds):
             # store last values if global distribution should be used
             if self.workhere == 1:
                 if i < len(self.last_xs_is):
@@ -900,8 +1348,65 @@ class Elemental_memoize(Func):
                 elif i == len(self.last_xs_is):
                     self.last_xs_is.append(x)
                 else:
-                    print >> sys.stderr, "ERROR: invalid number to calculate in"
-                    exit()
+                    raise ValueError("invalid number to calculate in: %d" % i)
+
+        failures = []
+        for x, y in zip(xs1, ys1):
+            if isinstance(y, Failure):
+                failures.append((x, y))
+            elif grad:
+                # (also) those known only by their value are replaced:
+                self.cache[x] = y
+            else:
+                # only with value of x, without derivatives:
+                self.cache[x] = (y, None)
+
+        return failures
+
+    def _compute(self, xs, memfun, grad, spare = None):
+        """
+        Computes memfun for those xs not known yet and stores the results,
+        as (f, None) unless grad is true. Raises BeadError if some of them
+        fail, after storing the others.
+
+        spare = (other, ys) are points of another Elemental_memoize to be
+        calculated by  the same  pmap  call, in the  contexts  of other.
+        Their failures are not reported, they are just not stored.
+        """
+        # collect those to be computed:
+        xs1, wds = self._pending(xs, grad)
+
+        if spare is None:
+            # compute missing results:
+            with timings("pes"):
+                ys1 = self.pmap(memfun, zip(xs1, wds))
+        else:
+            other, ys = spare
+            ys2, wds2 = other._pending(ys, grad)
+
+            jobs = [(memfun, z) for z in zip(xs1, wds)]
+            if grad:
+                jobs += [(other.memfun, z) for z in zip(ys2, wds2)]
+            else:
+                jobs += [(other.memfun_f, z) for z in zip(ys2, wds2)]
+
+            with timings("pes"):
+                res = self.pmap(_apply, jobs)
+
+            ys1 = res[:len(xs1)]
+            other._store(ys2, wds2, res[len(xs1):], grad)
+
+        failures = self._store(xs1, wds, ys1, grad)
+        if failures:
+            raise BeadError(failures)
+
+    def f(self, xs):
+        self._compute(xs, self.memfun_f, False)
+
+        return [self.cache[x][0] for x in xs]
+
+    def taylor(self, xs, spare = None):
+        self._compute(xs, self.memfun, True, spare)
 
         #
         # Return copies from the dictionary:
@@ -97,6 +97,12 @@ class Default:
 
         >>> all(dX == met.raises(dx, None))
         True
+
+    Many vectors, each at its own position, are lowered at once:
+
+        >>> met.lower_many([dX, 2 * dX], [None, None])
+        array([[ 0.0002,  0.001 ,  0.001 ],
+               [ 0.0004,  0.002 ,  0.002 ]])
     """
     def __init__(self, fun = None):
         """
@@ -111,6 +117,13 @@ class Default:
     def raises(self, dx, X):
         return copy(dx)
 
+    def lower_many(self, dXs, Xs):
+        """
+        Lowers dXs[i]  at Xs[i] for all  i, e.g. the  tangents of all
+        beads of a chain. Here this is a single copy.
+        """
+        return array(dXs, dtype=float)
+
     def norm_up(self, dX, X):
 
         dx = self.lower(dX, X)
@@ -263,6 +276,18 @@ class Metric(Default):
         # return original view:
         return dx
 
+    def lower_many(self, dXs, Xs):
+        """
+        Lowers dXs[i]  at Xs[i] for all  i. The derivatives  of the
+        transformation differ from position to position, thus one call
+        to self.lower() per vector.
+        """
+        dXs = asarray(dXs)
+        dxs = empty(dXs.shape)
+        for i, (dX, X) in enumerate(zip(dXs, Xs)):
+            dxs[i] = self.lower(dX, X)
+        return dxs
+
     def raises(self, dx, X):
         """
         Transform   covariant  coordiantes   dx   into  contravariant
@@ -1,5 +1,6 @@
 """Provides a uniform interface to a variety of optimisers."""
 
+from __future__ import with_statement
 import os
 import pickle
 
@@ -10,6 +11,7 @@ import ase
 import pts
 from pts import MustRegenerate, Converged
 from pts.common import important
+from pts.timing import timings
 
 names = ['scipy_lbfgsb', 'ase_lbfgs', 'ase_fire', 'ase_scipy_cg', 'ase_scipy_lbfgsb', 'ase_lbfgs_line', 'multiopt', 'ase_bfgs', 'conj_grad', 'steep_des', 'fire']
 
@@ -20,17 +22,105 @@ def record_event(cos, s):
         pickle.dump('Event: ' + s, cos.arc_record, protocol=2)
 
 
+class Checkpoint(object):
+    """
+    File with the state of  a chain-of-states optimisation, written every
+    |every| iterations and read by runopt() to continue after a restart.
+    A new file replaces the old one only when it is complete.
+    """
+    def __init__(self, filename, every=1):
+        self.filename = filename
+        self.every = every
+        self.count = 0
+
+    def save(self, state, force=False):
+        self.count += 1
+        if not force and self.count % self.every != 0:
+            return
+
+        tmp = self.filename + ".tmp"
+        f = open(tmp, "wb")
+        pickle.dump(state, f, protocol=2)
+        f.close()
+        os.rename(tmp, self.filename)
+
+    def load(self):
+        """
+        The state saved last, None if there is none.
+        """
+        if not os.path.exists(self.filename):
+            return None
+
+        f = open(self.filename, "rb")
+        state = pickle.load(f)
+        f.close()
+        return state
+
 def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
                             , callback=None
                             , clean_after_grow=False
+                            , hessians=None
+                            , checkpoint=None
+                            , continue_beads=False
                             , **kwargs):
+    """
+    If hessians is a  list, multiopt starts  with the  per-bead hessian
+    models in  it (if there  is one for  every bead) and  the list is
+    filled with the final ones.  With continue_beads the old beads keep
+    their optimisers after  the string has grown, see MultiOpt, by
+    default multiopt starts anew.
+
+    With a Checkpoint the state of the chain and of the optimiser is
+    saved after every iteration.  If the checkpoint file exists already,
+    the optimisation continues from the state in it, for multiopt,
+    conj_grad,  steep_des and fire exactly as if it had not been
+    interrupted.  The other optimisers start anew from the saved chain.
+    """
     assert name in names, names
 
     global opt
     opt = None
+    bead_opts = None
     CoS.maxit = maxit
     max_it = copy(maxit)
 
+    # state of the optimiser in the checkpoint, if any:
+    opt_state = None
+
+    state = None
+    if checkpoint is not None:
+        state = checkpoint.load()
+
+    if state is not None:
+        CoS.restore(state["cos"])
+        bead_opts = state["bead_opts"]
+        opt_state = state["opt"]
+        max_it = state["max_it"]
+        record_event(CoS, "Optimisation CONTINUED (from %s)" % checkpoint.filename)
+
+    def save(bead_opts, opt_state, force=False):
+        if checkpoint is None:
+            return
+
+        with timings("checkpoint"):
+            checkpoint.save(dict(cos=CoS.checkpoint(), bead_opts=bead_opts,
+                                 opt=opt_state, max_it=max_it), force)
+
+    def attach_checkpoint(opt, opt_state):
+        """
+        Continues with the  state of the optimiser opt_state, if given,
+        and saves the state of opt after every step.
+        """
+        if opt_state is not None:
+            opt.__dict__.update(opt_state)
+
+        def checkpoint():
+            # without the chain, callbacks and files:
+            skip = ("atoms", "observers", "checkpoint", "logfile")
+            save(None, dict((k, v) for k, v in opt.__dict__.iteritems() if k not in skip))
+
+        opt.checkpoint = checkpoint
+
     # FIXME: we need an interface design for callbacks:
     def cb(x):
         if callback is not None:
@@ -38,9 +128,13 @@ def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
         else:
             y = None
         CoS.test_convergence(etol, ftol, xtol)
+
+        # these save after their steps, the others before them:
+        if name not in ('multiopt', 'conj_grad', 'steep_des', 'fire'):
+            save(None, None)
         return y
 
-    def runopt_inner(name, CoS, ftol, maxit, callback, maxstep=0.2, **kwargs):
+    def runopt_inner(name, CoS, ftol, maxit, callback, maxstep=0.2, opt_state=None, **kwargs):
 
         global opt
 
@@ -76,26 +170,30 @@ def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
 
         elif name == 'multiopt':
             from pts.cosopt.multiopt import MultiOpt
-            opt = MultiOpt(CoS, maxstep=maxstep, **kwargs)
+            opt = MultiOpt(CoS, maxstep=maxstep, hessians=hessians, bead_opts=bead_opts, **kwargs)
             opt.string = CoS.string
+            attach_checkpoint(opt, opt_state)
             opt.attach(lambda: callback(None), interval=1)
             opt.run(steps = max_it) # convergence handled by callback
             return None
         elif name == 'conj_grad':
             from pts.cosopt.conj_grad import conj_grad_opt
             opt = conj_grad_opt(CoS, maxstep=maxstep, **kwargs)
+            attach_checkpoint(opt, opt_state)
             opt.attach(lambda: callback(None), interval=1)
             opt.run(steps = max_it) # convergence handled by callback
             return None
         elif name == 'steep_des':
             from pts.cosopt.conj_grad import conj_grad_opt
             opt = conj_grad_opt(CoS, maxstep=maxstep, reduce_to_steepest_descent = True, **kwargs)
+            attach_checkpoint(opt, opt_state)
             opt.attach(lambda: callback(None), interval=1)
             opt.run() # convergence handled by callback
             return None
         elif name == 'fire':
             from pts.cosopt.fire import fire_opt
             opt = fire_opt(CoS, maxstep=maxstep, **kwargs)
+            attach_checkpoint(opt, opt_state)
             opt.attach(lambda: callback(None), interval=1)
             opt.run(steps = maxit) # convergence handled by callback
             return None
@@ -132,11 +230,17 @@ def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
 
     while True:
         is_converged = False
+
+        # the state the optimiser starts from, also after respacing or
+        # growing the string:
+        save(bead_opts, opt_state, force=True)
+        o, opt_state = opt_state, None
+
         try:
             # tol and maxit are scaled so that they are never reached.
             # Convergence is tested via the callback function.
             # Exceeding maxit is tested during an energy/gradient call.
-            runopt_inner(name, CoS, ftol*0.01, max_it, cb, maxstep=maxstep, **kwargs)
+            runopt_inner(name, CoS, ftol*0.01, max_it, cb, maxstep=maxstep, opt_state=o, **kwargs)
             record_event(CoS, "Optimisation STOPPED (optimizer reached maximum iterations)")
             it = opt.get_number_of_steps()
             max_it = max_it - it - 1
@@ -158,6 +262,13 @@ def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
             max_it = max_it - it - 1
 
         if CoS.grow_string():
+            # the old beads continue with their optimisers, the new ones
+            # start from their neighbours:
+            if continue_beads and hasattr(opt, "bead_opts"):
+                bead_opts = list(opt.bead_opts)
+                for i in CoS.new_beads:
+                    bead_opts.insert(i, None)
+
             if clean_after_grow:
                 os.system('rm -r beadjob??') # FIXME: ugly hack
 
@@ -167,6 +278,9 @@ def runopt(name, CoS, ftol=0.1, xtol=0.03, etol=0.03, maxit=35, maxstep=0.2
         else:
             break
 
+    if hessians is not None and hasattr(opt, "bead_opts"):
+        hessians[:] = [bead_opt.H for bead_opt in opt.bead_opts]
+
     return is_converged
 
 
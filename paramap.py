@@ -110,6 +110,68 @@
        >>> pmap_2(g3, x2)
        [[40, 16, 5], [16, 4, 2], [140, 25, 7], [0, 0, 0], [0, 1, 0]]
 
+  A job which fails does not take the  others with it, its result is a
+  Failure object, the reason being the last line of the traceback:
+
+       >>> def g7(x):
+       ...     if x < 0:
+       ...         raise ValueError("negative")
+       ...     if x > 9:
+       ...         sleep(100)
+       ...     return x
+
+       >>> pmap(g7, [1, -1, 2])
+       [1, Failure('ValueError: negative'), 2]
+
+  Jobs running for longer than timeout  seconds are terminated, others
+  waiting for their CPUs may run then:
+
+       >>> pmap_t = PMap3(strat = Strategy([2], 1, 1), timeout = 0.5)
+       >>> pmap_t(g7, [1, 10, 3, 4])
+       [1, Failure('timeout after 0.5 s'), 3, 4]
+
+  as well as workers which die without result:
+
+       >>> from os import _exit
+       >>> def g8(x):
+       ...     _exit(x)
+
+       >>> pmap(g8, [3])
+       [Failure('worker died with exit code 3')]
+
+  Retry runs the failed jobs  again, after waiting backoff seconds (and
+  twice as long before each further attempt). escalate(attempt), if given,
+  is called before every attempt, and with 0 after the last, e.g. to make
+  the settings of the calculator more robust for the retries (compare
+  the aggression of the Gaussian calculator):
+
+       >>> level = [0]
+       >>> def escalate(attempt):
+       ...     level[0] = attempt
+
+       >>> def g9(x):
+       ...     if level[0] < x:
+       ...         raise RuntimeError("SCF did not converge")
+       ...     return x
+
+       >>> rmap = Retry(tmap, retries = 2, backoff = 0.01, escalate = escalate)
+       >>> rmap(g9, [0, 1, 2])
+       Retry: 2 of 3 jobs failed, attempt 1 in 0.01 s
+       Retry: 1 of 3 jobs failed, attempt 2 in 0.02 s
+       [0, 1, 2]
+       >>> level
+       [0]
+
+  Whatever still fails is returned as Failure:
+
+       >>> rmap(g9, [3])
+       Retry: 1 of 1 jobs failed, attempt 1 in 0.01 s
+       Retry: 1 of 1 jobs failed, attempt 2 in 0.02 s
+       [Failure('RuntimeError: SCF did not converge')]
+
+  Callers which need all the results check them by no_failures(),
+  which raises JobError otherwise.
+
   Here testing togehter with the derivatef function from the vib module,
   which is the first application for it, here it is testted for severak
   of the functions given above.
@@ -141,32 +203,159 @@
        [[ 4.  0.  0.]
         [ 2.  4.  0.]
         [ 4.  0.  1.]]
+
+ failed calculations are reported, not taken for results:
+       >>> def g10(x):
+       ...     raise RuntimeError("SCF did not converge")
+       >>> derivatef(g10, [1.0], pmap = tmap)
+       Traceback (most recent call last):
+       ...
+       JobError: 2 jobs failed: 0: Failure('RuntimeError: SCF did not converge'), 1: Failure('RuntimeError: SCF did not converge')
 """
 
-__all__ = ["pmap"]
+from __future__ import with_statement
+
+__all__ = ["pmap", "Failure", "JobError", "no_failures", "Retry"]
 
+import sys
 from threading import Thread
-from Queue import Queue as TQueue
+from Queue import Queue as TQueue, Empty
 from os import environ
 from sched import Strategy
-from time import sleep
+from time import sleep, time
+from traceback import format_exc
 from multiprocessing import Process
 from multiprocessing import Queue as PQueue
 from multiprocessing import Pool, Manager, Event, RLock
+from pts.timing import timings
+
+class Failure(object):
+    """
+    Result of a job which failed, reason is the traceback or what else
+    is known about it.
+    """
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __repr__(self):
+        return "Failure(%r)" % self.reason.strip().split("\n")[-1]
+
+class JobError(Exception):
+    """
+    Raised by no_failures() for the jobs of a parallel map which failed,
+    given as pairs of their numbers and Failures.
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        Exception.__init__(self, "%d jobs failed: %s" % \
+                           (len(failures), ", ".join(["%d: %r" % (i, fx) for i, fx in failures])))
+
+def no_failures(fxs):
+    """
+    The results fxs of a parallel map, for callers which cannot go on
+    with some of them missing. Raises JobError if there are Failures:
+
+        >>> no_failures([1, 2])
+        [1, 2]
+        >>> no_failures([1, Failure("ValueError: negative"), 2])
+        Traceback (most recent call last):
+        ...
+        JobError: 1 jobs failed: 1: Failure('ValueError: negative')
+    """
+    failures = [(i, fx) for i, fx in enumerate(fxs) if isinstance(fx, Failure)]
+    if failures:
+        raise JobError(failures)
+
+    return fxs
+
+def call(func, args=(), kwds={}):
+    """
+    func(*args, **kwds), or a Failure if it raises an exception.
+    """
+    try:
+        return func(*args, **kwds)
+    except Exception:
+        return Failure(format_exc())
 
 def job(jid, queue, func, args=(), kwds={}):
     """Each process should do its job and
     store the result in the queue.
     """
-    queue.put((jid, func(*args, **kwds)))
+    queue.put((jid, "start", None))
+    queue.put((jid, "done", call(func, args, kwds)))
+
+def collect(workers, queue, timeout = None, kill = None, poll = 0.1):
+    """
+    Results of the  jobs  run by workers, which put (jid, "start", None)
+    into the queue when they start and (jid, "done", result) when they
+    finish.  A job running longer than timeout or whose worker dies
+    without result gives a Failure.  kill(jid), if given, is called for
+    jobs given up.  The times the jobs waited and ran are reported to
+    the timings.
+    """
+    queued = time()
+    fxs = [None for w in workers]
+    missing = set(range(len(workers)))
+    started = {}
+    gone = set()
+    stuck = set()
+
+    while missing:
+        try:
+            jid, kind, fx = queue.get(True, poll)
+        except Empty:
+            now = time()
+            for jid in sorted(missing):
+                w = workers[jid]
+                reason = None
+                if not w.is_alive():
+                    # the result of a job just finished may still be
+                    # on its way, give it one more poll:
+                    if jid in gone:
+                        reason = "worker died with exit code %s" % getattr(w, "exitcode", None)
+                    gone.add(jid)
+                elif timeout is not None and jid in started \
+                     and now - started[jid] > timeout:
+                    reason = "timeout after %s s" % timeout
+                    if hasattr(w, "terminate"):
+                        w.terminate()
+                    else:
+                        # threads cannot be stopped:
+                        stuck.add(jid)
+
+                if reason is not None:
+                    print >> sys.stderr, "WARNING: job %d failed: %s" % (jid, reason)
+                    fxs[jid] = Failure(reason)
+                    missing.remove(jid)
+                    if kill is not None:
+                        kill(jid)
+            continue
+
+        # late results of jobs given up are ignored:
+        if jid not in missing:
+            continue
+
+        if kind == "start":
+            started[jid] = time()
+        else:
+            fxs[jid] = fx
+            missing.remove(jid)
+            timings.job("pmap", jid, queued, started.get(jid, queued), time())
+
+    for jid, w in enumerate(workers):
+        if jid not in stuck:
+            w.join()
+
+    return fxs
 
 class PMap(object):
     """A "classy" implementation of parallel map.
     """
 
-    def __init__(self, Worker=Process, Queue=PQueue):
+    def __init__(self, Worker=Process, Queue=PQueue, timeout=None):
         self.__Worker = Worker
         self.__Queue = Queue
+        self.timeout = timeout
 
     def __call__(self, f, xs, processes = None):
         # processes just given for consistency (not needed anywhere
@@ -180,28 +369,22 @@ class PMap(object):
         # enumerate() or generator objects:
         xs = [x for x in xs]
 
-        # prepare placeholder for the return values
-        fxs = [None for x in xs]
-
         # here I can put the results and get them back
         queue = Queue()
 
         # Initialize the porcesses that should be used
         workers = [ Worker(target=job, args=(jid, queue, f, (x,))) for jid, x in enumerate(xs) ]
 
-        # start all processes
-        for w in workers:
-            w.start()
-
-        for w in workers:
-            # put the results in the return value
-            # so far I'm not sure if they would be in the correct oder
-            # by themselves
-            w.join()
-            jid, fx = queue.get()
-            fxs[jid] = fx
+        # start all processes, threads cannot be stopped on timeout,
+        # they should not keep the program alive:
+        with timings("pmap.spawn"):
+            for w in workers:
+                if isinstance(w, Thread):
+                    w.daemon = True
+                w.start()
 
-        return fxs
+        # the results, in the order of xs:
+        return collect(workers, queue, self.timeout)
 
 pmap = PMap(Process, PQueue)
 tmap = PMap(Thread, TQueue)
@@ -262,10 +445,11 @@ class PMap3(object):
        function by setting some environment variables (for the specific process).
     """
 
-    def __init__(self, Worker=Process, Queue=PQueue, strat = Strategy()):
+    def __init__(self, Worker=Process, Queue=PQueue, strat = Strategy(), timeout = None):
         self.__Worker = Worker
         self.__Queue = Queue
         self.strat = strat
+        self.timeout = timeout
 
     def __call__(self, f, xs, processes = None):
         # processes just given for consistency (not needed anywhere
@@ -341,12 +525,13 @@ class PMap3(object):
                 # now the other proccesses can try occupied
                 lock.release()
 
+                # the timeout counts from here:
+                outq.put((jid, "start", None))
+
                 # the function needs also the information on the node and cpus
                 xplus = (x, (node, cpus))
-                # the calculation
-                result = (jid, fun(xplus))
-                # this queue should hold the results
-                outq.put(result)
+                # the calculation, this queue should hold the results
+                outq.put((jid, "done", call(fun, (xplus,))))
                 # release the cpus
                 # this needn't be made locked, as only one proccess
                 # wants to release this special cpu at this time
@@ -364,30 +549,26 @@ class PMap3(object):
         # this is the input per job, stored in input for all of them
         input = [(jid, ffun, x, sched[jid]) for jid, x in enumerate(xs)]
 
-        # prepare placeholder for the return values
-        fxs = [None for x in xs]
-
         # define a worker for each job
         workers = [ Worker(target=worker, args=(inp, queue)) for inp in input]
 
         # start all processes, so all jobs start at the same time
         # but some will wait, before the actual QM-calculation starts,
         # as for each cpu ony one job should run at once
-        for w in workers:
-            w.daemon = True
-            w.start()
-
-        #print "All started"
-        for w in workers:
-            # put the results in the return value
-            # so far I'm not sure if they would be in the correct oder
-            # by themselves
-            w.join()
-            jid, fx = queue.get()
-            fxs[jid] = fx
-        #print "All ended"
+        with timings("pmap.spawn"):
+            for w in workers:
+                w.daemon = True
+                w.start()
+
+        def kill(jid):
+            # the CPUs of a job given up are free again:
+            for cpu in sched[jid][0]:
+                if occupied.get(cpu) == jid:
+                    del occupied[cpu]
+            event.set()
 
-        return fxs
+        # the results, in the order of xs:
+        return collect(workers, queue, self.timeout, kill)
 
 class PMap2():
     """
@@ -443,6 +624,50 @@ class PMap2():
 pmap2 = PMap2()
 pmap3 = PMap3()
 
+class Retry(object):
+    """
+    Parallel map running the jobs of pmap which fail again, up to retries
+    times.  Before the first retry  it waits backoff seconds, twice as
+    long before every  further one.  escalate(attempt) is called before
+    each  retry and escalate(0) after them.  Jobs still failing are
+    returned as Failure.
+    """
+    def __init__(self, pmap = pmap, retries = 2, backoff = 10.0, escalate = None):
+        self.pmap = pmap
+        self.retries = retries
+        self.backoff = backoff
+        self.escalate = escalate
+
+    def __call__(self, f, xs):
+        # force evaluation of arguments, some callers may pass
+        # enumerate() or generator objects:
+        xs = [x for x in xs]
+
+        fxs = self.pmap(f, xs)
+
+        attempt = 0
+        while attempt < self.retries:
+            todo = [i for i, fx in enumerate(fxs) if isinstance(fx, Failure)]
+            if not todo:
+                break
+
+            attempt += 1
+            timings.count("retry.jobs", len(todo))
+            wait = self.backoff * 2**(attempt - 1)
+            print "Retry: %d of %d jobs failed, attempt %d in %s s" % (len(todo), len(xs), attempt, wait)
+            sleep(wait)
+
+            if self.escalate is not None:
+                self.escalate(attempt)
+
+            for i, fx in zip(todo, self.pmap(f, [xs[i] for i in todo])):
+                fxs[i] = fx
+
+        if attempt > 0 and self.escalate is not None:
+            self.escalate(0)
+
+        return fxs
+
 from os import getenv # system
 def test(x, num = None):
   # system("echo $PTS_SCHED_JOB_HOST")
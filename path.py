@@ -193,8 +193,6 @@ Make sure we dont leak the modified abscissas:
 
 __all__ = ["Path", "MetricPath"]
 
-from scipy.optimize import brentq as root
-
 from numpy import array, arange
 from numpy import asarray, empty, zeros, linspace
 
@@ -483,6 +481,10 @@ def scatter(rho, weights):
     # integral:
     weights = asarray(weights) * weight(1.0)
 
+    # scipy.optimize is slow to import, most users of this module do
+    # not need it:
+    from scipy.optimize import brentq as root
+
     arcs = empty(len(weights))
 
     for i, w in enumerate(weights):
@@ -7,19 +7,21 @@ GEOMETRY
 Geometries have to be given in internal coordinates (the ones the function accepts)
 
 """
+from __future__ import with_statement
 from ase.io import write
 from sys import argv
 from os import path, mkdir, remove
 from numpy import savetxt, array
 from warnings import warn
-from pts.qfunc import QFunc, qmap
+from pts.qfunc import QFunc, RestartStore, qmap
 from pts.func import compose
-from pts.paramap import PMap, PMap3
+from pts.paramap import PMap, PMap3, Retry
 from pts.sched import Strategy
-from pts.memoize import Memoize, DirStore, FileStore
-from pts.searcher import GrowingString, NEB, ts_estims
+from pts.memoize import Memoize, DirStore, FileStore, LRUStore
+from pts.searcher import GrowingString, NEB, BeadFreezer, Speculator, ts_estims
 from pts.cfunc import Pass_through
-from pts.optwrap import runopt
+from pts.optwrap import runopt, Checkpoint
+from pts.timing import timings
 from pts.sopt import soptimize
 from pts.tools.pathtools import pickle_path
 from pts.ui.read_inputs import interprete_input, create_params_dict
@@ -98,16 +100,17 @@ def pathsearcher(atoms, init_path, trafo, **kwargs):
     # PES to be used for  energy, forces. FIXME: maybe adapt QFunc not
     # to default to LJ, but rather keep atoms as is?
     #
-    pes = QFunc(atoms, atoms.get_calculator())
+    pes = QFunc(atoms, atoms.get_calculator(), restart=restart_store(para_dict.pop("restart", None)))
 
     #
     # Memoize early, PES as a function of cartesian coordiantes is the
     # lowest  denominator.  The  cache  store used  here should  allow
     # concurrent writes  and reads from  multiple processes eventually
     # running on different nodes  --- DirStore() keeps everything in a
-    # dedicated directory on disk or on an NFS share:
+    # dedicated directory on disk or on an NFS share. Recently used
+    # results are kept in memory in front of it:
     #
-    pes = Memoize(pes, DirStore("cache.d"))
+    pes = Memoize(pes, LRUStore(DirStore("cache.d")))
 
     #
     # PES as  a funciton of  optimization variables, such  as internal
@@ -115,14 +118,19 @@ def pathsearcher(atoms, init_path, trafo, **kwargs):
     #
     pes = compose(pes, trafo)
 
+    if para_dict.get("levels"):
+        para_dict["levels"] = level_pes(para_dict["levels"], atoms, trafo)
+
     # This parallel mapping function puts every single point calculation in
     # its own subfolder
     strat = Strategy(para_dict["cpu_architecture"], para_dict["pmin"], para_dict["pmax"])
     del para_dict["cpu_architecture"]
     del para_dict["pmin"]
     del para_dict["pmax"]
+    remote = para_dict.pop("remote", None)
+    retry = para_dict.pop("retry", None)
     if "pmap" not in para_dict:
-        para_dict["pmap"] = PMap3(strat=strat)
+        para_dict["pmap"] = parallel_map(strat, remote, retry)
 
     para_dict["trafo"] = trafo
     para_dict["symbols"] = atoms.get_chemical_symbols()
@@ -149,11 +157,66 @@ def find_path(pes, init_path
                             , pmap = PMap()
                             , workhere = 1
                             , max_sep_ratio = 0.1
+                            , levels = None         # cheaper PES to start with, see find_path_levels()
+                            , weights = None        # only for string: initial bead distribution
+                            , hessians = None       # only for multiopt: per-bead hessians, in/out
+                            , surrogate = None      # True or parameters for surrogate_path()
+                            , bead_freezing = None  # True or parameters for BeadFreezer
+                            , line_search = None    # only conj_grad/steep_des: True or parameters of the trial steps
+                            , grow_batch = 1        # only for searchingstring: beads added at once
+                            , speculate = None      # True or parameters for Speculator
+                            , checkpoint = None     # True, file name or parameters for Checkpoint
+                            , timing = None         # True or prefix of the files with the timings
                             , **kwargs):
     """This one does the real work ...
 
     """
 
+    if checkpoint and method.lower() == "sopt":
+        # soptimize() keeps its hessians to itself, a restart from a
+        # checkpoint would lose them:
+        raise ValueError("checkpoint is not supported with method sopt")
+
+    if levels or surrogate or timing:
+        kw = dict(kwargs)
+        kw.update(beads_count=beads_count, name=name, method=method,
+                  opt_type=opt_type, spring=spring, output_level=output_level,
+                  output_path=output_path, trafo=trafo, symbols=symbols,
+                  cache=cache, pmap=pmap, workhere=workhere,
+                  max_sep_ratio=max_sep_ratio, weights=weights,
+                  hessians=hessians, bead_freezing=bead_freezing,
+                  line_search=line_search, grow_batch=grow_batch,
+                  speculate=speculate)
+
+    if timing:
+        # The same once more, timed. Summary and timeline at the end:
+        kw.update(levels=levels, surrogate=surrogate, checkpoint=checkpoint)
+        if timing is True:
+            timing = name
+
+        timings.reset()
+        timings.enable()
+        try:
+            with timings("find_path"):
+                return find_path(pes, init_path, **kw)
+        finally:
+            timings.report(timing)
+
+    if levels:
+        # Converge first on the cheaper levels, this PES is the last one:
+        kw["surrogate"] = surrogate
+        kw["checkpoint"] = checkpoint
+        return find_path_levels(list(levels) + [(pes, {})], init_path, **kw)
+
+    if surrogate:
+        # Relax the path on a model of the PES, fitted to the results:
+        from pts.surrogate import surrogate_path
+        if checkpoint:
+            warn("WARNING: checkpoint is not supported with surrogate, ignored")
+        if surrogate is not True:
+            kw.update(surrogate)
+        return surrogate_path(pes, init_path, **kw)
+
     if beads_count is None:
         beads_count = len(init_path)
 
@@ -174,7 +237,9 @@ def find_path(pes, init_path
                 pass
         else:
              cache_name = cache
-        disk_result_cache = FileStore(cache_name)
+        # FileStore rewrites  the whole file  for every new  entry, let
+        # this happen in the background:
+        disk_result_cache = LRUStore(FileStore(cache_name))
 
     # decide which method is actually to be used
     method = method.lower()
@@ -185,6 +250,26 @@ def find_path(pes, init_path
         climb_image = True
 
     mt.setup_metric(trafo)
+
+    # skip calculations for beads which stay converged:
+    freezer = None
+    if bead_freezing:
+        params = dict(ftol=kwargs.get("ftol", 0.1), xtol=kwargs.get("xtol", 0.03))
+        if bead_freezing is not True:
+            params.update(bead_freezing)
+        freezer = BeadFreezer(**params)
+
+    # calculate beads of the next step on idle slots:
+    speculator = None
+    if speculate:
+        params = dict(slots=beads_count - 2)
+        if speculate is not True:
+            params.update(speculate)
+        if "tol" not in params:
+            # no value helps in general, it depends on the PES and optimizer:
+            raise ValueError("speculate needs tol, e.g. speculate = {\"tol\" : 0.03}")
+        speculator = Speculator(**params)
+
     #
     # NOTE: most of the parameters to optimizers might be passed
     # via **kwargs. This may require changes in the interface of
@@ -206,6 +291,9 @@ def find_path(pes, init_path
                output_path=output_path,
                climb_image = climb_image,
                pmap = pmap,
+               weights = weights,
+               freezer = freezer,
+               speculator = speculator,
                max_sep_ratio = max_sep_ratio)
     elif method == 'growingstring':
         CoS = GrowingString(init_path,
@@ -222,6 +310,8 @@ def find_path(pes, init_path
                output_path=output_path,
                output_level=output_level,
                climb_image = climb_image,
+               freezer = freezer,
+               speculator = speculator,
                max_sep_ratio = max_sep_ratio)
     elif method == 'searchingstring':
         CoS = GrowingString(init_path,
@@ -238,8 +328,11 @@ def find_path(pes, init_path
                max_sep_ratio = max_sep_ratio,
                freeze_beads=True,
                climb_image = climb_image,
+               freezer = freezer,
+               speculator = speculator,
                head_size=None, # has no meaning for searching string
-               growth_mode='search')
+               growth_mode='search',
+               grow_batch = grow_batch)
     elif method == 'neb':
         CoS = NEB(init_path,
                pes,
@@ -252,6 +345,8 @@ def find_path(pes, init_path
                output_path=output_path,
                output_level=output_level,
                climb_image = climb_image,
+               freezer = freezer,
+               speculator = speculator,
                reporting=logfile)
     elif method == 'sopt':
         CoS = None
@@ -299,7 +394,8 @@ def find_path(pes, init_path
             tangents = CoS.update_tangents()
             abscissas = CoS.pathpos()
 
-            cb1(geometries, energies, gradients, tangents, abscissas)
+            with timings("output"):
+                cb1(geometries, energies, gradients, tangents, abscissas)
 
         # print out initial path, if output_level alows it
         if output_level > 1:
@@ -328,8 +424,35 @@ def find_path(pes, init_path
         #
         # Main optimisation loop:
         #
+        if opt_type == "multiopt":
+            kwargs["hessians"] = hessians
+
+        # several trial steps of the line search at once:
+        if line_search and opt_type in ("conj_grad", "steep_des"):
+            params = dict(trials=3, predict=True)
+            if line_search is not True:
+                params.update(line_search)
+            kwargs["line_trials"] = params["trials"]
+            kwargs["line_predict"] = params["predict"]
+
+        # state of the optimization, to continue from after a restart:
+        if checkpoint:
+            params = dict(filename="%s.checkpoint.pickle" % name)
+            if type(checkpoint) == str:
+                params["filename"] = checkpoint
+            elif checkpoint is not True:
+                params.update(checkpoint)
+            kwargs["checkpoint"] = Checkpoint(**params)
+
         converged = runopt(opt_type, CoS, callback=cb, **kwargs)
         abscissa  = CoS.pathpos()
+
+        if freezer is not None:
+            print "find_path: bead freezing saved %d bead calculations, %d were done" \
+                % (freezer.saved, CoS.bead_eg_calls)
+        if speculator is not None:
+            print "find_path: %d of %d speculative bead calculations were used, %d wasted" \
+                % (speculator.hits, speculator.evaluated, speculator.wasted)
         geometries, energies, gradients = CoS.state_vec, CoS.bead_pes_energies, CoS.bead_pes_gradients
 
         #
@@ -371,6 +494,70 @@ def find_path(pes, init_path
     # gradients of last iteration:
     return converged, (geometries, abscissa, energies, gradients)
 
+def find_path_levels(levels, init_path, name="find-path", method="string",
+                     beads_count=None, **kwargs):
+    """
+    Hierarchical  version of find_path(): levels  is a list of (pes,
+    params) pairs, ordered from the cheapest to the most expensive PES.
+    The path is converged on  every level in turn, params overwrite the
+    keyword arguments (like ftol or maxit) for that level.
+
+    The next level starts from the  converged path of the previous one,
+    with its beads  at the  same  relative abscissas and  (for multiopt)
+    with the per-bead hessians of the previous optimizer.  A growing or
+    searching string  is grown on the  first level  only, later levels
+    refine the full string.  A checkpoint is kept for the last level
+    only.
+
+    Returns the result of the last level.
+    """
+
+    hessians = kwargs.pop("hessians", None)
+    if hessians is None:
+        hessians = []
+
+    checkpoint = kwargs.pop("checkpoint", None)
+
+    for i, (pes, params) in enumerate(levels):
+        last = (i == len(levels) - 1)
+
+        kw = dict(kwargs)
+        kw.update(params)
+
+        if last:
+            kw["name"] = name
+            kw["checkpoint"] = checkpoint
+        else:
+            kw["name"] = "%s.level%d" % (name, i)
+
+            # results of a user given cache belong to the final PES:
+            kw["cache"] = None
+
+        kw["method"] = method
+        if i > 0:
+            # the string is already grown:
+            kw["method"] = method.lower().replace("growingstring", "string").replace("searchingstring", "string")
+
+        print "find_path: level %d of %d, %s" % (i + 1, len(levels), kw["name"])
+
+        converged, (geometries, abscissa, energies, gradients) = \
+            find_path(pes, init_path, beads_count=beads_count, hessians=hessians, **kw)
+
+        print "find_path: level %d of %d converged: %s" % (i + 1, len(levels), converged)
+
+        if last:
+            break
+
+        # start of the next level:
+        n = beads_count or len(init_path)
+        init_path = array(geometries).reshape(n, -1)
+
+        if abscissa is not None and kw["method"].lower().endswith("string"):
+            abscissa = array(abscissa)
+            kwargs["weights"] = ((abscissa - abscissa[0]) / (abscissa[-1] - abscissa[0])).tolist()
+
+    return converged, (geometries, abscissa, energies, gradients)
+
 def do_what_i_mean(nodes, count):
     """
     FIXME: this "if"  is ugly. Either assume number  of nodes is equal
@@ -461,6 +648,72 @@ def output(optimized_path, cartesian, output_level, format, atoms):
         if output_level > 1:
              savetxt("ts_internals%d" % i, v)
 
+def restart_store(restart):
+    """
+    RestartStore for the value of the restart parameter, None if it is
+    not set.
+    """
+    if not restart:
+        return None
+
+    if restart is True:
+        return RestartStore()
+
+    return RestartStore(**restart)
+
+def parallel_map(strat, remote, retry):
+    """
+    Parallel map for  the scheduling strategy strat, over several nodes
+    if the remote parameter is set, trying failed calculations again if
+    the retry parameter is set.
+    """
+    if retry is True:
+        retry = {}
+    elif retry:
+        retry = dict(retry)
+
+    timeout = None
+    if retry is not None:
+        timeout = retry.pop("timeout", None)
+
+    if remote:
+        from pts.remote import RemoteMap
+
+        if remote is True:
+            remote = {}
+
+        pmap = RemoteMap(strat, **remote)
+        print "Agents for the nodes should connect to port", pmap.address[1]
+    else:
+        pmap = PMap3(strat=strat, timeout=timeout)
+
+    if retry is None:
+        return pmap
+
+    return Retry(pmap, **retry)
+
+def level_pes(levels, atoms, trafo):
+    """
+    Turns the  levels parameter, a list  of (calculator, params) pairs,
+    into a  list of (pes, params) pairs  as expected by find_path().  A
+    calculator may be given as in --calculator by name of a file or of a
+    default calculator.  Every level has its own cache directory.
+    """
+    from pts.ui.cmdline import get_calculator
+
+    result = []
+    for i, (calc, params) in enumerate(levels):
+        if type(calc) == str:
+            calc = get_calculator(calc)
+
+        pes = QFunc(atoms, calc)
+        pes = Memoize(pes, LRUStore(DirStore("cache.level%d.d" % i)))
+        pes = compose(pes, trafo)
+
+        result.append((pes, params))
+
+    return result
+
 def tell_params(params):
     """
     Show the actual params
@@ -539,16 +792,18 @@ def call_with_pes(method, args):
     # PES to be used for  energy, forces. FIXME: maybe adapt QFunc not
     # to default to LJ, but rather keep atoms as is?
     #
-    pes = QFunc(atoms, atoms.get_calculator())
+    restart = restart_store(kw.pop("restart", None))
+    pes = QFunc(atoms, atoms.get_calculator(), restart=restart)
 
     #
     # Memoize early, PES as a function of cartesian coordiantes is the
     # lowest  denominator.  The  cache  store used  here should  allow
     # concurrent writes  and reads from  multiple processes eventually
     # running on different nodes  --- DirStore() keeps everything in a
-    # dedicated directory on disk or on an NFS share:
+    # dedicated directory on disk or on an NFS share. Recently used
+    # results are kept in memory in front of it:
     #
-    pes = Memoize(pes, DirStore("cache.d"))
+    pes = Memoize(pes, LRUStore(DirStore("cache.d")))
 
     #
     # PES as  a funciton of  optimization variables, such  as internal
@@ -556,11 +811,17 @@ def call_with_pes(method, args):
     #
     pes = compose(pes, trafo)
 
+    # cheaper levels of theory to start with, if any:
+    if kw.get("levels"):
+        kw["levels"] = level_pes(kw["levels"], atoms, trafo)
+
     # This parallel mapping function puts every single point calculation in
     # its own subfolder
+    remote = kw.pop("remote", None)
+    retry = kw.pop("retry", None)
     if "pmap" not in kw:
         strat = Strategy(kw["cpu_architecture"], kw["pmin"], kw["pmax"])
-        kw["pmap"] = PMap3(strat=strat)
+        kw["pmap"] = parallel_map(strat, remote, retry)
 
     del kw["cpu_architecture"]
     del kw["pmin"]
@@ -572,7 +833,12 @@ def call_with_pes(method, args):
     kw["symbols"] = atoms.get_chemical_symbols()
 
     # this operates with PES in internal variables:
-    return method(pes, geometries, **kw)
+    result = method(pes, geometries, **kw)
+
+    if restart is not None:
+        print "Restarts of the calculations:", restart.summary()
+
+    return result
 
 def main(args):
     """
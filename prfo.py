@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Partitioned rational function optimization (P-RFO) for the search of
+transition states:
+
+    J. Baker, J. Comput. Chem. 7 (1986), 385
+    A. Banerjee, N. Adams, J. Simons, R. Shepard, J. Phys. Chem. 89 (1985), 52
+
+The step is  built in the eigenbasis of a  (model) hessian.  Along the
+mode(s) to be followed uphill the  energy is maximized, along all the
+others it is minimized,  each part with its own rational function (RFO)
+shift.
+
+A quadratic saddle, x is minimized, y maximized:
+
+    >>> from numpy import round
+
+    >>> B = diag([2., -4.])
+    >>> x = array([0.1, 0.1])
+    >>> g = dot(B, x)
+
+    >>> step = prfo_step(B, g)
+    >>> round(x + step, 4)
+    array([ 0.001,  0.001])
+
+The energy change predicted by the quadratic model:
+
+    >>> print round(model_change(B, g, step), 6)
+    0.009999
+
+A mode to follow can be given  explicitly, then the eigenvector of the
+hessian with the largest overlap to it is followed uphill. Following x
+instead of y  the step goes uphill in x  and downhill in y (and is far
+too long, see the trust radius below):
+
+    >>> step = prfo_step(B, g, mode = array([1., 0.]))
+    >>> step[0] > 0, step[1] > 0
+    (True, True)
+
+The  length of the  steps is controlled  by a trust radius.  It grows
+when the  quadratic model predicted  the energy change well  and shrinks
+otherwise:
+
+    >>> t = TrustRadius(0.1, max_radius = 0.3)
+    >>> t.update(-0.0101, -0.01, 0.1)
+    0.2
+    >>> t.update(0.02, -0.01, 0.05)
+    0.025
+"""
+
+__all__ = ["prfo_step", "model_change", "hessian_matrix", "TrustRadius"]
+
+from numpy import asarray, dot, zeros, eye, array, diag
+from numpy.linalg import eigh, eigvalsh
+
+def _rfo_shift(a, f, highest):
+    """
+    Highest or  lowest  eigenvalue of the augmented  hessian (diag(a) f;
+    f' 0) for eigenvalues a and gradient components f.
+    """
+    n = len(a)
+    aug = zeros((n + 1, n + 1))
+    aug[:n, :n] = diag(a)
+    aug[:n, n] = f
+    aug[n, :n] = f
+
+    lams = eigvalsh(aug)
+    if highest:
+        return lams[-1]
+    else:
+        return lams[0]
+
+def prfo_step(B, g, order = 1, mode = None):
+    """
+    P-RFO step for hessian B  and gradient g.  Maximizes along the |order|
+    lowest eigenmodes of B  or, if |mode| is given, along the eigenmode
+    with the largest overlap  to it.  Minimizes along all other modes.
+    The step is not restricted in length.
+    """
+    g = asarray(g)
+    shape = g.shape
+    g = g.flatten()
+    B = asarray(B).reshape(g.size, g.size)
+
+    a, V = eigh(B)
+
+    # gradient in the eigenbasis of the hessian:
+    f = dot(V.T, g)
+
+    if mode is None:
+        up = range(order)
+    else:
+        up = [abs(dot(V.T, asarray(mode).flatten())).argmax()]
+    down = [i for i in range(len(a)) if i not in up]
+
+    s = zeros(len(a))
+    for part, highest in ((up, True), (down, False)):
+        if len(part) == 0:
+            continue
+
+        lam = _rfo_shift(a[part], f[part], highest)
+
+        for i in part:
+            # modes without gradient component give no step (there also
+            # a[i] may coincide with lam):
+            if f[i] != 0.0:
+                s[i] = - f[i] / (a[i] - lam)
+
+    step = dot(V, s)
+    step.shape = shape
+    return step
+
+def model_change(B, g, step):
+    """
+    Energy change for step as predicted by the quadratic model with
+    gradient g and hessian B.
+    """
+    g = asarray(g).flatten()
+    step = asarray(step).flatten()
+    B = asarray(B).reshape(g.size, g.size)
+    return dot(g, step) + 0.5 * dot(step, dot(B, step))
+
+def hessian_matrix(hess, n):
+    """
+    Matrix of the hessian model  hess (as from bfgs.py) for n coordinates.
+    Uses the matrix the model keeps, if  any, otherwise applies the model
+    to the unit vectors.
+    """
+    B = getattr(hess, "B", None)
+    if B is None:
+        B = array([hess.app(e) for e in eye(n)])
+        # symmetrize, app may be an iterative approximation:
+        B = (B + B.T) / 2.
+    return B
+
+class TrustRadius:
+    """
+    Dynamic trust radius, ruled by  the ratio of actual to predicted energy
+    change of the last step.
+    """
+    def __init__(self, radius, min_radius = 1.0e-4, max_radius = None):
+        self.radius = radius
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+
+    def update(self, actual, predicted, step_len):
+        """
+        Adapts and returns the trust radius after a step of length step_len.
+        """
+        if predicted == 0.0:
+            return self.radius
+
+        ratio = actual / predicted
+
+        if 0.75 < ratio < 1.25 and step_len > 0.8 * self.radius:
+            # good model, which limited the step:
+            self.radius = 2. * self.radius
+            if self.max_radius is not None:
+                self.radius = min(self.radius, self.max_radius)
+        elif ratio < 0.25 or ratio > 1.75:
+            # bad model, be careful:
+            self.radius = max(0.5 * min(self.radius, step_len), self.min_radius)
+
+        return self.radius
+
+# python prfo.py [-v]:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
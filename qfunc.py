@@ -10,13 +10,13 @@ docstring.
     4
 """
 
-__all__ = ["QFunc"]
+__all__ = ["QFunc", "RestartStore"]
 
 from pts.func import Func
-from ase.calculators.lj import LennardJones
-from os import path, mkdir, chdir, getcwd, system
-from numpy import array, empty, shape, dot
+from os import path, mkdir, chdir, getcwd, listdir, remove, rename, symlink
+from numpy import array, empty, shape, dot, sqrt, savetxt, loadtxt
 from shutil import copy2 as cp
+from glob import glob
 
 VERBOSE = 0
 
@@ -66,7 +66,7 @@ class QFunc(Func):
                [-0.39685026,  0.39685026, -0.39685026]])
 
     """
-    def __init__(self, atoms, calc=LennardJones(), moving=None):
+    def __init__(self, atoms, calc=None, moving=None, restart=None):
 
         # We  are   going  to  repeatedly   set_positions()  for  this
         # instance,  So  we  make  a  copy to  avoid  effects  visible
@@ -75,41 +75,81 @@ class QFunc(Func):
 
         # FIXME: should we assume atoms were already associated with a
         #        calculator instead of using LJ as default?
+        if calc is None:
+            from ase.calculators.lj import LennardJones
+            calc = LennardJones()
         self.atoms.set_calculator(calc)
 
         # list  of moving  atoms whose  coordinates are  considered as
         # variables:
         self.moving = moving
 
-    # (f, fprime) methods inherited from abstract Func and use this by
-    # default:
-    def taylor(self, x):
-        "Energy and gradients"
+        # RestartStore  to  start  every  calculation  from the  nearest
+        # one done before:
+        self.restart = restart
 
+    def _set_positions(self, x):
+        """
+        Updates  the  positions  of  the (moving)  atoms,  returns  the
+        positions of all of them.
+        """
         # FIXME:  do  all  calculators  treat arrays  passed  to  them
         # read-only? In the case they  do not, construct one for their
         # exclusive use:
         x = array(x)
 
-        # aliases:
-        atoms = self.atoms
-        moving = self.moving
-
-        if moving is not None:
+        if self.moving is not None:
 
             # it is assumed that the initial positions are meaningful:
-            y = atoms.get_positions()
+            y = self.atoms.get_positions()
 
-            assert len(moving) <= len(y)
+            assert len(self.moving) <= len(y)
 
             # update positions of moving atoms:
-            y[moving] = x
+            y[self.moving] = x
 
             # rebind x:
             x = y
 
         # update positions:
-        atoms.set_positions(x)
+        self.atoms.set_positions(x)
+
+        return x
+
+    def f(self, x):
+        """
+        Energy only.  Calculators which can  do so skip  the gradients,
+        for a QM code it may be just the SCF.
+        """
+        x = self._set_positions(x)
+
+        # warm start from the nearest previous calculation, if any:
+        if self.restart is not None:
+            distance = self.restart.restore(x)
+
+        if VERBOSE:
+            print "QFunc: energy only ..."
+        e = self.atoms.get_potential_energy()
+
+        if self.restart is not None:
+            self.restart.store(x, distance)
+
+        return e
+
+    # fprime  method inherited from  abstract Func  and uses  this by
+    # default:
+    def taylor(self, x):
+        "Energy and gradients"
+
+        x = self._set_positions(x)
+
+        # aliases:
+        atoms = self.atoms
+        moving = self.moving
+
+        # warm start from the nearest previous calculation, if any:
+        if self.restart is not None:
+            distance = self.restart.restore(x)
 
         if VERBOSE:
             print "QFunc: compute forces ..."
@@ -132,6 +172,10 @@ class QFunc(Func):
 
         if VERBOSE:
             print "QFunc: ... done"
+
+        if self.restart is not None:
+            self.restart.store(x, distance)
+
         # return both:
         return e, g
 
@@ -196,7 +240,7 @@ class QCell (Func):
         raise NotImplementedError ("Use  NumDiff instead!")
 
 
-from pts.paramap import pmap
+from pts.paramap import pmap, no_failures
 
 class QMap(object):
     """
@@ -206,6 +250,7 @@ class QMap(object):
         format % i
 
     The default format leads to directory names: 00, 01, 02, ...
+    If some of the evaluations fail, JobError is raised, see paramap.py.
     """
     def __init__(self, pmap = pmap, format = "%02d"):
         self.pmap = pmap
@@ -227,7 +272,7 @@ class QMap(object):
 
            return fx
 
-       return self.pmap(_f, enumerate(xs))
+       return no_failures(self.pmap(_f, enumerate(xs)))
 
 qmap = QMap()
 
@@ -236,6 +281,207 @@ qmap = QMap()
 # modifications to ASE are necessary:
 RESTARTFILES = ["WAVECAR", "CHG", "CHGCAR" , "saved_scfstate.dat", "*.testme"]
 
+def vasp_scf_iterations(wd="."):
+    """
+    Number of electronic steps of the last VASP run in wd, read from
+    OSZICAR. None if there is none.
+    """
+    try:
+        f = open(path.join(wd, "OSZICAR"))
+    except IOError:
+        return None
+    try:
+        n = 0
+        for line in f:
+            if line[:4] in ("DAV:", "RMM:", "CG :"):
+                n += 1
+        return n
+    finally:
+        f.close()
+
+# count the SCF iterations of a calculation in a directory:
+SCF_ITERATIONS = {"vasp": vasp_scf_iterations}
+
+class RestartStore(object):
+    """
+    Restart data (see RESTARTFILES) of  all calculations done so far, each
+    with the geometry it belongs to.  Every new calculation starts from
+    the data of the geometrically nearest one, from whatever bead or
+    iteration it was. The data are kept in  a directory, thus calculations
+    in other processes contribute and benefit as well.
+
+        >>> from tempfile import mkdtemp
+        >>> from shutil import rmtree
+        >>> from numpy import zeros, ones
+        >>> tmp = mkdtemp()
+        >>> store = RestartStore(path.join(tmp, "restart.d"), files=["WAVECAR"])
+
+    Nothing to start from for the first calculation:
+
+        >>> wd = path.join(tmp, "job")
+        >>> mkdir(wd)
+        >>> print store.restore(zeros(3), wd)
+        None
+
+    Pretend two calculations have left their data:
+
+        >>> def write(name, text):
+        ...     f = open(name, "w")
+        ...     f.write(text)
+        ...     f.close()
+
+        >>> write(path.join(wd, "WAVECAR"), "zeros")
+        >>> store.store(zeros(3), None, wd)
+        >>> write(path.join(wd, "WAVECAR"), "ones")
+        >>> store.store(ones(3), 1.0, wd)
+
+    A calculation near the second geometry gets its data:
+
+        >>> round(store.restore(0.9 * ones(3), wd), 6)
+        0.173205
+        >>> open(path.join(wd, "WAVECAR")).read()
+        'ones'
+
+    Starts and, if known, SCF iterations so far:
+
+        >>> sorted(store.summary().items())
+        [('cold', 1), ('cold iterations', None), ('warm', 1), ('warm iterations', None)]
+
+        >>> rmtree(tmp)
+
+    Setting link  the files are  symbolically linked instead  of copied.
+    This  is only  safe  for programs  which  replace their  restart files
+    instead of writing into them. The function iterations(wd) (or one of
+    the names  in SCF_ITERATIONS) returns  the number  of SCF iterations
+    of the calculation in wd, to know the savings.
+    """
+    def __init__(self, dir="restart.d", files=RESTARTFILES, link=False, iterations=None):
+        # calculations run in other directories:
+        self.dir = path.abspath(dir)
+        self.files = files
+        self.link = link
+
+        if type(iterations) == str:
+            iterations = SCF_ITERATIONS[iterations]
+        self.iterations = iterations
+
+        if not path.exists(self.dir):
+            try:
+                mkdir(self.dir)
+            except OSError:
+                # someone else was faster:
+                pass
+
+    def _entries(self):
+        """
+        Completed entries, as (directory, geometry) pairs.
+        """
+        entries = []
+        for name in sorted(listdir(self.dir)):
+            entry = path.join(self.dir, name)
+            # the geometry is written last:
+            if path.exists(path.join(entry, "geometry")):
+                entries.append((entry, loadtxt(path.join(entry, "geometry"))))
+        return entries
+
+    def nearest(self, x):
+        """
+        Directory with the data of the calculation nearest to geometry x
+        and its distance, (None, None) if there was none.
+        """
+        x = array(x).flatten()
+
+        best, distance = None, None
+        for entry, y in self._entries():
+            if y.shape != x.shape:
+                continue
+            d = sqrt(dot(x - y, x - y))
+            if distance is None or d < distance:
+                best, distance = entry, d
+
+        return best, distance
+
+    def restore(self, x, wd="."):
+        """
+        Puts the restart data nearest  to geometry x into directory wd,
+        returns their distance to x or None if there were none.
+        """
+        entry, distance = self.nearest(x)
+        if entry is None:
+            return None
+
+        for name in listdir(entry):
+            if name in ("geometry", "info"):
+                continue
+
+            dst = path.join(wd, name)
+            if path.lexists(dst):
+                remove(dst)
+
+            if self.link:
+                symlink(path.join(entry, name), dst)
+            else:
+                cp(path.join(entry, name), dst)
+
+        if VERBOSE:
+            print "RestartStore: restart from", entry, "at distance", distance
+
+        return distance
+
+    def store(self, x, distance=None, wd="."):
+        """
+        Keeps the restart data in wd of the calculation at geometry x,
+        which was started from data at distance.
+        """
+        from tempfile import mkdtemp
+
+        # unique also among several processes:
+        entry = mkdtemp(dir=self.dir, prefix="")
+
+        for pattern in self.files:
+            for name in glob(path.join(wd, pattern)):
+                # follow links, they may point into this store:
+                cp(path.realpath(name), path.join(entry, path.basename(name)))
+
+        iterations = None
+        if self.iterations is not None:
+            iterations = self.iterations(wd)
+
+        f = open(path.join(entry, "info"), "w")
+        f.write(repr((distance, iterations)))
+        f.close()
+
+        # make the entry visible:
+        savetxt(path.join(entry, "geometry.tmp"), array(x).flatten())
+        rename(path.join(entry, "geometry.tmp"), path.join(entry, "geometry"))
+
+    def summary(self):
+        """
+        Number of calculations started cold and warm, and their average
+        numbers of SCF iterations (if known).
+        """
+        its = {"cold": [], "warm": []}
+        for entry, __ in self._entries():
+            f = open(path.join(entry, "info"))
+            distance, iterations = eval(f.read())
+            f.close()
+
+            if distance is None:
+                its["cold"].append(iterations)
+            else:
+                its["warm"].append(iterations)
+
+        result = {}
+        for start in its:
+            result[start] = len(its[start])
+            known = [n for n in its[start] if n is not None]
+            if len(known) > 0:
+                result[start + " iterations"] = float(sum(known)) / len(known)
+            else:
+                result[start + " iterations"] = None
+
+        return result
+
 def constraints2mask(atoms):
     """
     Given an atomic object (ase/ptf) there is
@@ -383,6 +629,7 @@ class QContext(object):
         ...     print getcwd()
         /tmp/666777888999000111
 
+        >>> from os import system
         >>> system("rmdir " + dir)
         0
     """
@@ -417,14 +664,17 @@ class QContext(object):
 
             # files being in self.restartdir are copied in the current
             # working directory
-            cmd = "echo cp " + self.restartdir + '/*  .'
-            system(cmd)
-            # FIXME: we should copy only RESTARTFILES
+            for pattern in RESTARTFILES:
+                for name in glob(path.join(self.restartdir, pattern)):
+                    cp(name, ".")
 
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # FIXME: do we ignore exceptions passed to us here?
+        # exceptions are passed on, but from the directory we came from,
+        # the next calculation should not start in this one:
         if exc_type is not None:
+            if self.wd is not None:
+                chdir(self.__cwd)
             return False
 
         # As a default the working directory is not changed:
@@ -448,11 +698,11 @@ class QContext(object):
 
                 # make  sure RESTARTFILES  lists  files essential  for
                 # restart:
-                for file in RESTARTFILES:
+                for pattern in RESTARTFILES:
                     # copy  the  interesting files  of  in to  working
                     # directory
-                    cmd = "echo cp " + file + " " + self.restartdir
-                    system(cmd)
+                    for name in glob(pattern):
+                        cp(name, self.restartdir)
         # it is safer to return  to the last working directory, so the
         # code does not affect too many things
         chdir(self.__cwd)
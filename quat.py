@@ -514,6 +514,177 @@ def cart2vec (x, y):
     """
     return quat2vec (cart2quat (x, y))
 
+def kabsch(ref, frames, weights=None, atoms=None):
+    """
+    Closed form (SVD) solution  of the  superposition problem for a whole
+    stack of frames at once:
+
+        W. Kabsch, Acta Cryst. A32 (1976), 922
+
+    Returns  rotation matrices R[k] and shifts  t[k] such that the frame
+    x[k]  moved as  dot(x[k], R[k].T) + t[k]  has the  smallest (weighted)
+    RMSD to ref.  Instead of a single reference, one for every frame may
+    be given.  Only the atoms with indices in atoms (default all) are
+    fitted, weights (e.g. masses) has one entry for each of them.
+
+    A (not centered) geometry and a rotated and translated copy of it:
+
+        >>> from numpy import max, abs, round, pi
+
+        >>> x = array([[0., 0., 0.], [0., 0., 1.], [0., 1., 0.], [1., 1., 1.]])
+        >>> y = dot(x, rotmat([0.3, -1.2, 2.5]).T) + [1., 2., 3.]
+
+        >>> R, t = kabsch(x, [y, x])
+        >>> R.shape, t.shape
+        ((2, 3, 3), (2, 3))
+
+        >>> max(abs(dot(y, R[0].T) + t[0] - x)) < 1e-12
+        True
+        >>> max(abs(R[1] - eye(3))) < 1e-12
+        True
+
+    Mirror  images are  not  reached by  rotations, the  result stays  a
+    proper rotation:
+
+        >>> R, t = kabsch(x, [-x])
+        >>> from numpy.linalg import det
+        >>> round(det(R[0]), 12)
+        1.0
+    """
+    from numpy import newaxis, ones, einsum
+    from numpy.linalg import svd, det
+
+    ref = asarray(ref, dtype=float)
+    frames = asarray(frames, dtype=float)
+
+    if atoms is not None:
+        ref = ref[..., atoms, :]
+        frames = frames[:, atoms, :]
+
+    if weights is None:
+        weights = ones(frames.shape[1])
+    w = asarray(weights, dtype=float) / sum(weights)
+
+    # the same reference for all frames:
+    if ref.ndim == 2:
+        ref = ref[newaxis]
+
+    # weighted centers:
+    cx = einsum("i,kia->ka", w, frames)
+    cy = einsum("i,kia->ka", w, ref)
+
+    x = frames - cx[:, newaxis, :]
+    y = ref - cy[:, newaxis, :]
+
+    # weighted covariance matrices H[k] = x[k].T W y[k]:
+    if len(y) == 1:
+        H = einsum("i,kia,ib->kab", w, x, y[0])
+    else:
+        H = einsum("i,kia,kib->kab", w, x, y)
+
+    U, s, Vt = svd(H)
+
+    # Vt.T U.T could be a reflection, then the last (smallest) singular
+    # direction is turned around:
+    D = ones((len(H), 3))
+    D[:, 2] = det(einsum("kab,kbc->kac", U, Vt))
+
+    R = einsum("kba,kb,kcb->kac", Vt, D, U)
+    t = cy - einsum("kab,kb->ka", R, cx)
+
+    return R, t
+
+def align(ref, frames, weights=None, atoms=None, sequential=False):
+    """
+    Moves  all  frames  (rigidly, all  atoms)  for the  best superposition
+    with ref,  see kabsch().  If  sequential is set,  every frame  is
+    aligned to the previous  (aligned) one instead, starting with the first
+    one aligned to ref (if ref is None it stays as it is), as is usually
+    wanted for trajectories and paths.  Returns the aligned frames and
+    their (weighted) RMSD to ref, or for sequential alignment to the
+    previous frame.
+
+    A trajectory of a rigid molecule, moved around:
+
+        >>> from numpy import max, abs, round
+
+        >>> x = array([[0., 0., 0.], [0., 0., 1.], [0., 1., 0.], [1., 1., 1.]])
+        >>> frames = [dot(x, rotmat([0.1 * k, 0.5, -0.2 * k]).T) + k for k in range(5)]
+
+        >>> ys, rmsd = align(x, frames)
+        >>> max(abs(ys - x)) < 1e-12
+        True
+        >>> max(rmsd) < 1e-12
+        True
+
+    Sequential alignment  keeps the  first frame and moves  all the others
+    onto it:
+
+        >>> ys, rmsd = align(None, frames, sequential=True)
+        >>> max(abs(ys - frames[0])) < 1e-12
+        True
+
+    Only some atoms might be used for the fit, the others go along:
+
+        >>> z = x.copy()
+        >>> z[3] = [2., 2., 2.]
+        >>> ys, rmsd = align(x, [z], atoms=[0, 1, 2])
+        >>> round(ys[0], 12) + 0.0
+        array([[ 0.,  0.,  0.],
+               [ 0.,  0.,  1.],
+               [ 0.,  1.,  0.],
+               [ 2.,  2.,  2.]])
+        >>> round(rmsd, 12) + 0.0
+        array([ 0.])
+    """
+    from numpy import newaxis, ones, einsum, concatenate
+
+    frames = asarray(frames, dtype=float)
+    n = len(frames)
+
+    if not sequential:
+        R, t = kabsch(ref, frames, weights, atoms)
+    else:
+        if ref is None:
+            R = eye(3)[newaxis]
+            t = zeros((1, 3))
+        else:
+            R, t = kabsch(ref, frames[:1], weights, atoms)
+
+        if n > 1:
+            #
+            # Every frame  aligned to the previous  one, in one batch. The
+            # moves are then chained, a  rigid move of both frames does not
+            # change their optimal RMSD:
+            #
+            dR, dt = kabsch(frames[:-1], frames[1:], weights, atoms)
+
+            R = concatenate((R, empty((n - 1, 3, 3))))
+            t = concatenate((t, empty((n - 1, 3))))
+            for k in range(1, n):
+                R[k] = dot(R[k-1], dR[k-1])
+                t[k] = dot(R[k-1], dt[k-1]) + t[k-1]
+
+    ys = einsum("kia,kba->kib", frames, R) + t[:, newaxis, :]
+
+    # references for the RMSD:
+    if not sequential:
+        refs = asarray(ref, dtype=float)
+    elif ref is None:
+        refs = concatenate((ys[:1], ys[:-1]))
+    else:
+        refs = concatenate((asarray(ref, dtype=float)[newaxis], ys[:-1]))
+
+    dev = ((ys - refs)**2).sum(axis=2)
+    if atoms is not None:
+        dev = dev[:, atoms]
+
+    if weights is None:
+        weights = ones(dev.shape[1])
+    w = asarray(weights, dtype=float) / sum(weights)
+
+    return ys, sqrt(dot(dev, w))
+
 def cart2veclin (v1, v2):
     """
     v1  and v2 are  two two  point-objects Here  a rotation  matrix is
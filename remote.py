@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""
+Parallel map over several nodes.
+
+PMap3 runs every job in a process of its own, forked on the node the
+master  runs on, the node number given  by the scheduler ends up only
+in  the environment  variables  of the  job.   RemoteMap  sends the
+jobs to agents, one per node,  which connect to it over a socket.  An
+agent runs every  job in a process of its own  with the CPUs of the
+node the scheduling strategy assigned to it, see f_schedwr() in
+paramap.py, and streams the results back as they come.
+
+The function and the arguments are sent pickled,  so (as for pool_map)
+the function has to be picklable, e.g. defined at module level.  As
+unpickling runs code, nothing is unpickled before master and agent
+have shown each other to know  the same secret key (an HMAC of the
+challenge of the other side), given as authkey or else taken from the
+environment variable PTS_REMOTE_KEY.
+
+The jobs run in the working directory of the master, the nodes need
+to see it under the same name (e.g. on a shared file system).
+
+Agents are started on every node  with the address of the master and
+the node number they are to serve:
+
+    PTS_REMOTE_KEY=... python -m pts.remote HOST PORT NODE
+
+For a test on a single machine they can be started locally:
+
+    >>> rmap = RemoteMap(Strategy([2, 2], 1, 1), host="localhost", beat=0.2, authkey="tEsT")
+    >>> agents = start_agents(rmap.address, [0, 1], authkey="tEsT")
+
+The jobs run on the nodes given by the scheduling strategy:
+
+    >>> rmap(test, range(6))
+    [(0, 0), (1, 0), (4, 1), (9, 1), (16, 0), (25, 0)]
+
+Agents send a heartbeat every beat seconds,  one which is silent for
+longer than timeout (default: ten beats) or  lost its connection is
+considered dead and the jobs it was running are given to the others.
+Here the agent for the second node dies while it is running jobs:
+
+    >>> from threading import Timer
+    >>> Timer(0.3, agents[1].terminate).start()
+    >>> [y for y, node in rmap(test, range(8))]
+    [0, 1, 4, 9, 16, 25, 36, 49]
+
+All of the later jobs run on the first node:
+
+    >>> rmap(test, range(4))
+    [(0, 0), (1, 0), (4, 0), (9, 0)]
+
+A job which fails gives a Failure, as with the other parallel maps in
+paramap.py:
+
+    >>> rmap(test, [2, "a"])
+    [(4, 0), Failure("TypeError: can't multiply sequence by non-int of type 'str'")]
+
+An agent with the wrong key is turned away before anything it sends
+is unpickled, and does not get any jobs either:
+
+    >>> intruder = start_agents(rmap.address, [1], authkey="guess")
+    >>> rmap(test, range(2))
+    [(0, 0), (1, 0)]
+    >>> intruder[0].join()
+
+At the end the agents are told to stop:
+
+    >>> rmap.close()
+    >>> agents[0].join()
+"""
+
+__all__ = ["RemoteMap", "RemoteError", "agent", "start_agents", "authenticate"]
+
+import sys
+import hmac
+from hashlib import sha256
+from socket import socket, create_connection, error as SocketError, \
+     AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from select import select
+from struct import pack, unpack
+from cPickle import dumps, loads, HIGHEST_PROTOCOL
+from multiprocessing import Process, Pipe
+from time import time, sleep
+from os import environ, getenv, getcwd, chdir, urandom
+from traceback import format_exc
+from pts.sched import Strategy
+from pts.paramap import Failure
+from pts.timing import timings
+
+class RemoteError(Exception):
+    pass
+
+# longest message accepted before the authentication:
+CHALLENGE = 32
+
+def send_bytes(sock, data):
+    """
+    Sends the string data, preceded by its length.
+    """
+    sock.sendall(pack("!I", len(data)) + data)
+
+def send(sock, obj):
+    """
+    Sends obj pickled, see send_bytes().
+    """
+    send_bytes(sock, dumps(obj, HIGHEST_PROTOCOL))
+
+def _read(sock, n):
+    data = ""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def recv_bytes(sock, limit=None):
+    """
+    Receives a string sent by send_bytes(), None if the connection is
+    closed or the string is longer than limit.
+    """
+    head = _read(sock, 4)
+    if head is None:
+        return None
+
+    n = unpack("!I", head)[0]
+    if limit is not None and n > limit:
+        return None
+
+    return _read(sock, n)
+
+def recv(sock):
+    """
+    Receives an object sent by send(), None if the connection is closed.
+    """
+    data = recv_bytes(sock)
+    if data is None:
+        return None
+
+    return loads(data)
+
+def _authkey(authkey):
+    if authkey is None:
+        authkey = getenv("PTS_REMOTE_KEY")
+    if not authkey:
+        raise RemoteError("no key for the agents, give authkey or set PTS_REMOTE_KEY")
+    return authkey
+
+def _digest(authkey, role, challenge):
+    return hmac.new(authkey, role + challenge, sha256).digest()
+
+def authenticate(sock, authkey, role):
+    """
+    True if the other side of sock knows authkey, and shows it to know
+    authkey too.  Each side sends a random challenge and answers that
+    of the other with its HMAC, role ("master" or "agent") is part of it
+    so that an answer cannot be sent back to where it came from.
+    """
+    other = {"master": "agent", "agent": "master"}[role]
+
+    mine = urandom(CHALLENGE)
+    send_bytes(sock, mine)
+    theirs = recv_bytes(sock, CHALLENGE)
+    if theirs is None:
+        return False
+
+    send_bytes(sock, _digest(authkey, role, theirs))
+    answer = recv_bytes(sock, CHALLENGE)
+    if answer is None:
+        return False
+
+    return hmac.compare_digest(answer, _digest(authkey, other, mine))
+
+def _run(conn, fdata, x, wd, node, cpus):
+    """
+    Runs one job in a process of its own,  in the directory wd and with
+    the scheduling information in the environment as f_schedwr() in
+    paramap.py does it.
+    """
+    environ["PTS_SCHED_JOB_HOST"] = "%s" % node
+    environ["PTS_SCHED_JOB_NPROCS"] = "%s" % len(cpus)
+    environ["PTS_SCHED_JOB_CPUS"] = ",".join(["%s" % c for c in cpus])
+
+    try:
+        chdir(wd)
+        f = loads(fdata)
+        result = (True, f(x))
+    except Exception:
+        result = (False, format_exc())
+
+    conn.send(result)
+    conn.close()
+
+def agent(address, node, beat=1.0, authkey=None):
+    """
+    Connects to  the RemoteMap at address, runs the jobs  it sends for
+    node and sends the results back.  Returns  when told to stop or if
+    the connection is lost.  See authenticate() for authkey.
+    """
+    authkey = _authkey(authkey)
+
+    sock = create_connection(address)
+    try:
+        ok = authenticate(sock, authkey, "agent")
+    except SocketError:
+        ok = False
+    if not ok:
+        sock.close()
+        print >> sys.stderr, "agent: not accepted by %s:%s, or the master has another key" % address
+        return
+
+    send(sock, ("hello", node))
+
+    # jid -> (process, end of the pipe for the result):
+    running = {}
+
+    last = time()
+    try:
+        while True:
+            pipes = dict((conn, jid) for jid, (p, conn) in running.iteritems())
+            ready, __, __ = select([sock] + pipes.keys(), [], [], beat)
+
+            for r in ready:
+                if r is sock:
+                    msg = recv(sock)
+                    if msg is None or msg[0] == "stop":
+                        return
+
+                    __, jid, fdata, x, wd, cpus = msg
+
+                    parent, child = Pipe(duplex=False)
+                    p = Process(target=_run, args=(child, fdata, x, wd, node, cpus))
+                    p.daemon = True
+                    p.start()
+                    child.close()
+
+                    running[jid] = (p, parent)
+                else:
+                    jid = pipes[r]
+                    p, conn = running.pop(jid)
+                    try:
+                        ok, value = conn.recv()
+                    except EOFError:
+                        ok, value = False, "job process died"
+                    conn.close()
+                    p.join()
+
+                    send(sock, ("result", jid, ok, value))
+
+            if time() - last >= beat:
+                send(sock, ("beat",))
+                last = time()
+    finally:
+        for p, conn in running.itervalues():
+            p.terminate()
+        sock.close()
+
+def start_agents(address, nodes, beat=1.0, authkey=None):
+    """
+    Starts an agent for every node in  nodes as process on this machine,
+    returns the processes.  They run jobs in processes of their own and
+    thus cannot be daemons, they stop with RemoteMap.close().
+    """
+    agents = []
+    for node in nodes:
+        p = Process(target=agent, args=(address, node, beat, authkey))
+        p.start()
+        agents.append(p)
+
+    return agents
+
+class _Agent(object):
+    """
+    What the master knows about an agent.
+    """
+    def __init__(self, sock, node):
+        self.sock = sock
+        self.node = node
+        self.seen = time()
+
+        # jid -> local CPUs of the jobs running there:
+        self.jobs = {}
+
+    def free(self, cpus):
+        for c in self.jobs.itervalues():
+            for cpu in cpus:
+                if cpu in c:
+                    return False
+        return True
+
+class RemoteMap(object):
+    """
+    Parallel map  sending the jobs to agents on the nodes given by the
+    scheduling strategy strat.  A  job waits until the CPUs it is to run
+    on are free.  Jobs for nodes whose agent died go to the agent with
+    the fewest jobs among the others.  Only agents knowing authkey (or
+    PTS_REMOTE_KEY from the environment) are accepted.
+    """
+    def __init__(self, strat=Strategy(), host="", port=0, beat=1.0, timeout=None, authkey=None):
+        self.authkey = _authkey(authkey)
+        self.strat = strat
+        self.beat = beat
+        if timeout is None:
+            timeout = 10 * beat
+        self.timeout = timeout
+
+        self.server = socket(AF_INET, SOCK_STREAM)
+        self.server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.address = self.server.getsockname()
+
+        # socket -> _Agent:
+        self.agents = {}
+
+        # nodes which lost their agent:
+        self.dead = set()
+
+        # jobs of different calls are told apart by the number of the call:
+        self.calls = 0
+
+    def _accept(self):
+        sock, peer = self.server.accept()
+
+        # a client which does not answer in time is given up:
+        sock.settimeout(self.timeout)
+        try:
+            ok = authenticate(sock, self.authkey, "master")
+        except SocketError:
+            ok = False
+        if not ok:
+            print >> sys.stderr, "RemoteMap: refused connection from %s:%s, wrong key" % peer
+            sock.close()
+            return
+        sock.settimeout(None)
+
+        msg = recv(sock)
+        if msg is None or msg[0] != "hello":
+            sock.close()
+            return
+
+        node = msg[1]
+        self.agents[sock] = _Agent(sock, node)
+        self.dead.discard(node)
+
+    def _lose(self, sock, pending):
+        """
+        Forgets about the agent at sock, its jobs are run elsewhere.
+        """
+        a = self.agents.pop(sock)
+        sock.close()
+
+        if not [b for b in self.agents.itervalues() if b.node == a.node]:
+            self.dead.add(a.node)
+
+        mine = [i for (call, i) in a.jobs if call == self.calls]
+        pending[:0] = sorted(mine)
+
+        print >> sys.stderr, "RemoteMap: lost agent for node %s, %d jobs run elsewhere" % (a.node, len(mine))
+
+    def _place(self, node, cpus):
+        """
+        Agent to run a job on node with cpus, None if there is none free.
+        """
+        agents = [a for a in self.agents.itervalues() if a.node == node]
+        if not agents and node in self.dead:
+            agents = sorted(self.agents.values(), key=lambda a: len(a.jobs))
+
+        for a in agents:
+            if a.free(cpus):
+                return a
+
+        return None
+
+    def __call__(self, f, xs):
+        # force evaluation of arguments, some callers may pass
+        # enumerate() or generator objects:
+        xs = [x for x in xs]
+
+        self.calls += 1
+        call = self.calls
+
+        sched = self.strat(len(xs))
+        fdata = dumps(f, HIGHEST_PROTOCOL)
+
+        # relative paths of the jobs (e.g. of Bead_call) are those here:
+        wd = getcwd()
+
+        fxs = [None for x in xs]
+        pending = range(len(xs))
+        done = 0
+        alone = time()
+
+        # when the jobs were queued and sent, for the timings:
+        queued = time()
+        sent = {}
+
+        while done < len(xs):
+            # send the jobs which can start now:
+            for i in pending[:]:
+                distr, node, cpus = sched[i]
+                a = self._place(node, cpus)
+                if a is None:
+                    continue
+
+                try:
+                    send(a.sock, ("job", (call, i), fdata, xs[i], wd, cpus))
+                except SocketError:
+                    continue
+
+                a.jobs[(call, i)] = cpus
+                pending.remove(i)
+                sent[i] = time()
+
+            if self.agents:
+                alone = time()
+            elif time() - alone > self.timeout:
+                raise RemoteError("no agent connected to %s:%s" % self.address)
+
+            ready, __, __ = select([self.server] + self.agents.keys(), [], [], self.beat)
+
+            for sock in ready:
+                if sock is self.server:
+                    self._accept()
+                    continue
+
+                try:
+                    msg = recv(sock)
+                except SocketError:
+                    msg = None
+
+                if msg is None:
+                    self._lose(sock, pending)
+                    continue
+
+                a = self.agents[sock]
+                a.seen = time()
+
+                if msg[0] == "result":
+                    __, jid, ok, value = msg
+                    del a.jobs[jid]
+
+                    # late results of an earlier call:
+                    if jid[0] != call:
+                        continue
+
+                    if not ok:
+                        print >> sys.stderr, "WARNING: job %d failed on node %s" % (jid[1], a.node)
+                        value = Failure(value)
+
+                    fxs[jid[1]] = value
+                    done += 1
+                    timings.job("remote", jid[1], queued, sent[jid[1]], time())
+
+            for sock, a in self.agents.items():
+                if time() - a.seen > self.timeout:
+                    self._lose(sock, pending)
+
+        return fxs
+
+    def close(self):
+        """
+        Tells all agents to stop.
+        """
+        for sock in self.agents.keys():
+            try:
+                send(sock, ("stop",))
+            except SocketError:
+                pass
+            sock.close()
+
+        self.agents = {}
+        self.server.close()
+
+def test(x):
+    """
+    Test job: x squared and the node it ran on.
+    """
+    sleep(0.2)
+    return x * x, int(getenv("PTS_SCHED_JOB_HOST"))
+
+# python remote.py HOST PORT NODE runs an agent, python remote.py [-v] the tests:
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "-v"]
+    if len(args) == 3:
+        agent((args[0], int(args[1])), int(args[2]))
+    else:
+        import doctest
+        doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
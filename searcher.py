@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+from __future__ import with_statement
 from sys import stderr, maxint, exit
 
 import logging
@@ -8,11 +9,12 @@ import pickle
 from os import path, mkdir, chdir, getcwd
 
 from numpy import array, asarray, ceil, abs, sqrt, dot
-from numpy import empty, zeros, linspace, arange
-from numpy import argmax
+from numpy import empty, zeros, linspace, arange, insert, shape
+from numpy import argmax, where, maximum, minimum, einsum, newaxis
 
 from path import Path, Arc, scatter1
-from pts.memoize import Elemental_memoize
+from pts.memoize import Elemental_memoize, MemStore
+from pts.timing import timings
 
 import pts.common as common
 import pts
@@ -96,6 +98,223 @@ def freeze_ends(bc):
     """
     return [0] + [1 for i in range(bc-2)] + [0]
 
+class BeadFreezer(object):
+    """
+    Decides which beads of a chain need new energies and gradients. A
+    bead  whose  (RMS)  perpendicular  force  and step  stay below ftol
+    and xtol  for  k iterations in  a row  is frozen:  it  is  neither
+    moved nor recalculated.  Its cached gradient is still projected on
+    the  current tangent in every iteration, the bead  is thawed  when
+    this force exceeds ftol, when one of its neighbours has moved  by
+    more than xtol since it was  frozen, or after revalidate iterations
+    to get it recalculated.  The highest bead is never frozen.  To avoid
+    flip-flopping  a frozen bead may have  a force of up to thaw * ftol,
+    convergence is tested with the forces of the frozen beads included.
+
+    Four beads, the two inner ones are quiet, the second is the highest
+    and thus stays active:
+
+        >>> f = BeadFreezer(ftol=0.1, xtol=0.01, k=2, revalidate=2)
+        >>> state = zeros((4, 2))
+        >>> perp = zeros((4, 2))
+        >>> step = zeros((4, 2))
+        >>> energies = array([0., 1., 2., 0.])
+
+        >>> f.update([0, 1, 1, 0], state, perp, step, energies)
+        [0, 1, 1, 0]
+        >>> f.update([0, 1, 1, 0], state, perp, step, energies)
+        [0, 0, 1, 0]
+
+    Every iteration a bead stays frozen saves one calculation:
+
+        >>> f.update([0, 0, 1, 0], state, perp, step, energies)
+        [0, 0, 1, 0]
+        >>> f.update([0, 0, 1, 0], state, perp, step, energies)
+        [0, 0, 1, 0]
+        >>> f.saved
+        2
+
+    Then it is thawed for revalidation:
+
+        >>> f.update([0, 0, 1, 0], state, perp, step, energies)
+        [0, 1, 1, 0]
+
+    As it is still quiet, it is frozen again after the next iteration:
+
+        >>> f.update([0, 1, 1, 0], state, perp, step, energies)
+        [0, 0, 1, 0]
+
+    If a neighbour moves, it is thawed:
+
+        >>> state[0, 0] = 0.1
+        >>> f.update([0, 0, 1, 0], state, perp, step, energies)
+        [0, 1, 1, 0]
+        >>> f.saved
+        2
+
+    A frozen bead is thawed as well when its perpendicular force for the
+    current tangent exceeds thaw * ftol.
+    """
+    def __init__(self, ftol=0.1, xtol=0.03, k=3, revalidate=10, thaw=2.0):
+        self.ftol = ftol
+        self.xtol = xtol
+        self.k = k
+        self.revalidate = revalidate
+        self.thaw = thaw
+
+        # number of bead calculations avoided:
+        self.saved = 0
+
+        self.reset(0)
+
+    def reset(self, beads_count):
+        """
+        Forget about all beads, e.g. after growing the string.
+        """
+        # number of quiet iterations in a row for each bead:
+        self.quiet = [0] * beads_count
+
+        # frozen bead -> (iterations frozen, positions of its neighbours):
+        self.frozen = {}
+
+    def update(self, mask, state, perp, step, energies, keep=None):
+        """
+        Returns  the bead update mask for the next iteration. The forces
+        perp and the  step  of the  last one are  per bead, beads with  a
+        mask  of 0 besides the frozen ones (like the  terminal beads) are
+        left alone, as is bead keep.
+        """
+        n = len(mask)
+        if len(self.quiet) != n:
+            self.reset(n)
+
+        mask = list(mask)
+
+        highest = 1 + asarray(energies[1:-1]).argmax()
+
+        for i in range(1, n - 1):
+            force = common.rms(perp[i])
+
+            if i in self.frozen:
+                its, neighbours = self.frozen[i]
+                moved = max(abs(state[i-1] - neighbours[0]).max(),
+                            abs(state[i+1] - neighbours[1]).max())
+
+                if force > self.thaw * self.ftol or moved > self.xtol or its >= self.revalidate \
+                    or i == highest or i == keep:
+                    # be ready to freeze again after the next quiet step:
+                    del self.frozen[i]
+                    self.quiet[i] = self.k - 1
+                    mask[i] = 1
+                else:
+                    self.frozen[i] = (its + 1, neighbours)
+                    self.saved += 1
+
+            elif mask[i] > 0:
+                if force < self.ftol and abs(step[i]).max() < self.xtol:
+                    self.quiet[i] += 1
+                else:
+                    self.quiet[i] = 0
+
+                if self.quiet[i] >= self.k and i != highest and i != keep:
+                    self.frozen[i] = (0, (state[i-1].copy(), state[i+1].copy()))
+                    mask[i] = 0
+
+        return mask
+
+class Speculator(object):
+    """
+    Speculative  calculation of the  next state  of a  chain.  If fewer
+    beads  are calculated  in a round than  the machine can  run at once
+    (slots), for example while beads are  frozen, the idle slots get beads
+    at their predicted  next positions.  When  the optimizer later steps
+    a bead to within tol of such a point (see step_to()), it is placed
+    there and gets the results from the cache.  The predictions are those of the optimizer,
+    if it gives any (see MultiOpt), otherwise the last step of every bead
+    is repeated.
+
+    Two beads, only the second is calculated, three slots:
+
+        >>> s = Speculator(slots=3, tol=0.01)
+        >>> state = array([[0., 0.], [1., 0.]])
+        >>> prev = array([[0., 0.], [0.9, 0.]])
+
+        >>> s.speculate(1, state, prev)
+        [array([ 1.1,  0. ])]
+
+    The next position of the bead is close to it:
+
+        >>> s.snap(array([1.105, 0.]))
+        array([ 1.1,  0. ])
+        >>> s.snap(array([1.2, 0.]))
+        array([ 1.2,  0. ])
+
+        >>> s.hits, s.evaluated, s.wasted
+        (1, 1, 0)
+
+    Points  not used  in the  next round are  dropped when  new ones are
+    calculated:
+
+        >>> s.speculate(1, array([[0., 0.], [1.2, 0.]]), state)
+        [array([ 1.4,  0. ])]
+        >>> s.speculate(2, array([[0., 0.], [1.3, 0.]]), state)
+        [array([ 1.6,  0. ])]
+        >>> s.hits, s.evaluated, s.wasted
+        (1, 3, 2)
+    """
+    def __init__(self, slots, tol):
+        self.slots = slots
+        self.tol = tol
+
+        # next state as predicted by the optimizer, if any:
+        self.predicted = None
+
+        # speculative points of the last round:
+        self.points = []
+
+        self.evaluated = 0
+        self.hits = 0
+
+    @property
+    def wasted(self):
+        return self.evaluated - self.hits
+
+    def speculate(self, n, state, prev):
+        """
+        Points to calculate  speculatively in a round  calculating n beads
+        of state, prev is the state of the round before (or None).
+        """
+        state = asarray(state)
+
+        if self.predicted is not None and shape(self.predicted) == state.shape:
+            guesses = asarray(self.predicted)
+        elif prev is not None and shape(prev) == state.shape:
+            guesses = 2 * state - prev
+        else:
+            guesses = state
+        self.predicted = None
+
+        self.points = []
+        for x, y in zip(state, guesses):
+            if len(self.points) >= self.slots - n:
+                break
+            if abs(y - x).max() > self.tol:
+                self.points.append(y.copy())
+
+        self.evaluated += len(self.points)
+        return list(self.points)
+
+    def snap(self, x):
+        """
+        The speculative point within tol of x, if any, otherwise x.
+        """
+        for k, y in enumerate(self.points):
+            if abs(x - y).max() <= self.tol:
+                del self.points[k]
+                self.hits += 1
+                return y.copy()
+        return x
+
 def new_bead_positions( weights, ci_len, ci_pos, ci_num):
     """
     gives a new abcissa, calculated from the original and the new values as followes:
@@ -184,6 +403,105 @@ def new_abscissa(state_vec, metric):
     new_abscissa /= new_abscissa[-1]
     return new_abscissa
 
+def upwind_tangents(state, energies, upwinding=True):
+    """
+    Unnormalized  tangents for all  beads of  a chain  at once.  With
+    upwinding the tangent of an inner bead points to the neighbour with
+    the higher energy, at extrema  both sides are weighted by the energy
+    differences. Otherwise the average of both sides is taken. Terminal
+    beads use their only neighbour.
+
+        >>> state = [[0., 0.], [1., 0.], [2., 1.], [3., 1.], [4., 0.]]
+
+    Rising energy, the step to the right bead is taken:
+
+        >>> upwind_tangents(state, [0., 1., 2., 3., 4.])
+        array([[ 1.,  0.],
+               [ 1.,  1.],
+               [ 1.,  0.],
+               [ 1., -1.],
+               [ 1., -1.]])
+
+    A maximum at the middle bead mixes both sides:
+
+        >>> upwind_tangents(state, [0., 1., 3., 2., 0.])[2]
+        array([ 3.,  1.])
+
+        >>> upwind_tangents(state, [0., 1., 3., 2., 0.], upwinding=False)[2]
+        array([ 1. ,  0.5])
+    """
+    state = asarray(state)
+    energies = asarray(energies)
+
+    # steps between neighbouring beads, d[i] = x[i+1] - x[i]:
+    d = state[1:] - state[:-1]
+
+    tangents = empty(state.shape)
+    tangents[0] = d[0]
+    tangents[-1] = d[-1]
+
+    plus = d[1:]
+    minus = d[:-1]
+
+    if not upwinding:
+        tangents[1:-1] = (plus + minus) / 2
+        return tangents
+
+    V_minus, V, V_plus = energies[:-2], energies[1:-1], energies[2:]
+
+    delta_V_plus = abs(V_plus - V)
+    delta_V_minus = abs(V - V_minus)
+
+    delta_V_max = maximum(delta_V_plus, delta_V_minus)
+    delta_V_min = minimum(delta_V_plus, delta_V_minus)
+
+    # weights at extrema of the energy:
+    w_plus = where(V_plus > V_minus, delta_V_max, delta_V_min)
+    w_minus = where(V_plus > V_minus, delta_V_min, delta_V_max)
+
+    # monotonous energy, take the uphill side only:
+    up = (V_plus > V) & (V > V_minus)
+    down = (V_plus < V) & (V < V_minus)
+    w_plus = where(up, 1., where(down, 0., w_plus))
+    w_minus = where(up, 0., where(down, 1., w_minus))
+
+    tangents[1:-1] = w_plus[:, newaxis] * plus + w_minus[:, newaxis] * minus
+
+    return tangents
+
+def project_gradients(gradients, tangents, lowered):
+    """
+    Splits the  gradients of all  beads into forces parallel  and
+    perpendicular to the  (contravariant) tangents. |lowered| are the
+    covariant  coordinates of the  tangents, as  given by  the metric.
+    Returns the parallel forces (one number per bead), the perpendicular
+    forces and the covariant unit tangents:
+
+        >>> g = array([[1., 2.], [3., -1.]])
+        >>> T = array([[2., 0.], [1., 1.]])
+
+        >>> para, perp, t = project_gradients(g, T, T)
+        >>> para
+        array([-1.        , -1.41421356])
+
+        >>> perp
+        array([[ 0., -2.],
+               [-2.,  2.]])
+
+        >>> t
+        array([[ 1.        ,  0.        ],
+               [ 0.70710678,  0.70710678]])
+    """
+    gradients = asarray(gradients)
+
+    norms = sqrt(einsum('ij,ij->i', tangents, lowered))
+    units = lowered / norms[:, newaxis]
+
+    para = - einsum('ij,ij->i', tangents, gradients) / norms
+    perp = - gradients - para[:, newaxis] * units
+
+    return para, perp, units
+
 class ReactionPathway(object):
     """Abstract object for chain-of-state reaction pathway."""
     dimension = -1
@@ -191,6 +509,9 @@ class ReactionPathway(object):
     eg_calls = 0
     bead_eg_calls = 0
 
+    # set while trial states are evaluated, see trial_grad():
+    _trial = False
+
     # incremented by callback function
     callbacks = 0
 
@@ -215,7 +536,9 @@ class ReactionPathway(object):
             output_path = ".",
             climb_image = False,
             start_climb = 5,
-            conv_mode='gradstep'):
+            conv_mode='gradstep',
+            freezer = None,
+            speculator = None):
         """
         convergence_beads:
             number of highest beads to consider when testing convergence
@@ -226,6 +549,12 @@ class ReactionPathway(object):
         freeze_beads:
             freeze some beads if they are not in the highest 3 or subject to low forces.
 
+        freezer:
+            BeadFreezer, to skip calculations of converged beads.
+
+        speculator:
+            Speculator, to calculate beads of the next state in idle slots.
+
         """
 
         self.parallel = parallel
@@ -244,7 +573,9 @@ class ReactionPathway(object):
 
         self.initialise()
 
-        self.history = History()
+        # only the last steps_cumm records are ever looked at, keep that
+        # many (and at least two for test_convergence_E):
+        self.history = History(maxlen=max(2, steps_cumm))
 
         # mask of gradients to update at each position
         self.bead_update_mask = freeze_ends(self.beads_count)
@@ -264,10 +595,59 @@ class ReactionPathway(object):
 
         self.allvals = Elemental_memoize(self.pes, pmap=pmap, cache = result_storage, workhere = workhere, format = "bead%02d")
 
+        # speculative points, see Speculator, share the results but not
+        # the directories (and restart files there) of the beads:
+        self.specvals = Elemental_memoize(self.pes, pmap=pmap, cache = self.allvals.cache, workhere = workhere, format = "spec%02d")
+
         self.climb_image = climb_image
         self.start_climb = start_climb
         self.ci_num = None
 
+        self.freezer = freezer
+        self.speculator = speculator
+
+    # not in  the checkpoints: the  PES, the files written to and the
+    # methods the constructor chose, all set up anew on a restart:
+    not_checkpointed = ("pes", "allvals", "specvals", "reporting", "arc_record",
+                        "grow_string", "growth_funcs", "get_final_bead_ix")
+
+    def checkpoint(self):
+        """
+        State of the chain to  continue from after a restart, see restore().
+        Results of the PES kept only in memory are part of it, those in a
+        persistent store are found there again.
+        """
+        state = dict((k, v) for k, v in self.__dict__.iteritems() \
+                     if k not in self.not_checkpointed)
+
+        # the beads keep their directories (and restart files there):
+        state["allvals.last_xs_is"] = self.allvals.last_xs_is
+        if type(self.allvals.cache) is MemStore:
+            state["allvals.cache"] = self.allvals.cache
+
+        return state
+
+    def restore(self, state):
+        """
+        Continues from a state  given by checkpoint(). The chain has to be
+        set up as the one of the checkpoint, the same PES, method, ...
+        """
+        state = dict(state)
+
+        self.allvals.last_xs_is = state.pop("allvals.last_xs_is")
+        if "allvals.cache" in state:
+            self.allvals.cache = state.pop("allvals.cache")
+            self.specvals.cache = self.allvals.cache
+
+        # the caller may keep references to these, update them in place:
+        for k in ("freezer", "speculator"):
+            new = state.pop(k, None)
+            old = getattr(self, k, None)
+            if new is not None and old is not None:
+                old.__dict__.update(new.__dict__)
+
+        self.__dict__.update(state)
+
     def initialise(self):
         beads_count = self.beads_count
 
@@ -287,6 +667,22 @@ class ReactionPathway(object):
         self.prev_energies = None
         self._step = zeros(shape)
 
+    def insert_beads(self, ixs):
+        """
+        Makes room in the per-bead arrays for new beads, to be inserted
+        before the  (old) beads of indices ixs.  The results of the old
+        beads are kept.
+        """
+        self.perp_bead_forces = insert(self.perp_bead_forces, ixs, 0.0, axis=0)
+        self.para_bead_forces = insert(self.para_bead_forces, ixs, 0.0, axis=0)
+        self.bead_pes_energies = insert(self.bead_pes_energies, ixs, 0.0, axis=0)
+        self.bead_pes_gradients = insert(self.bead_pes_gradients, ixs, 0.0, axis=0)
+        self._step = insert(self._step, ixs, 0.0, axis=0)
+
+        self.prev_perp_forces = None
+        self.prev_para_forces = None
+        self.prev_energies = None
+
     def lengths_disparate(self, metric):
         return False
 
@@ -484,8 +880,13 @@ class ReactionPathway(object):
 
         l = []
 
+        # frozen beads have forces for the current tangents as well:
+        frozen = {}
+        if self.freezer is not None:
+            frozen = self.freezer.frozen
+
         for i, mask in enumerate(self.bead_update_mask):
-            if mask > 0:
+            if mask > 0 or i in frozen:
                 l.append(i)
 
         assert len(l) > 0
@@ -518,8 +919,9 @@ class ReactionPathway(object):
 
     @property
     def state_summary(self):
-        s = common.vec_summarise(self.state_vec)
-        s_beads = [common.vec_summarise(b) for b in self.state_vec]
+        sv = self.state_view
+        s = common.vec_summarise(sv)
+        s_beads = [common.vec_summarise(b) for b in sv]
         return s, s_beads
 
     def __str__(self):
@@ -529,7 +931,7 @@ class ReactionPathway(object):
         maxf_beads = [abs(f).max() for f in self.bead_pes_gradients]
         path_pos  = self.pathpos()
 
-        if path_pos == None:
+        if path_pos is None:
             # set up dummy spline abscissa for non-spline methods
             path_pos = [0.0 for i in range(len(self.bead_pes_gradients))]
 
@@ -552,10 +954,11 @@ class ReactionPathway(object):
 
         format = lambda f, l: ' | '.join([f % i for i in l])
 
-        all_coordinates = ("%-24s : %s\n" % ("    Coordinate %3d " % 1 , format('%10.4f',(self.state_vec[:,0]))))
-        (coord_dim1, coord_dim2) = self.state_vec.shape
+        sv = self.state_view
+        all_coordinates = ("%-24s : %s\n" % ("    Coordinate %3d " % 1 , format('%10.4f',(sv[:,0]))))
+        (coord_dim1, coord_dim2) = sv.shape
         for i in range(1,coord_dim2 ):
-            all_coordinates += ("%-24s : %s\n" % ("    Coordinate %3d " % (i+1) , format('%10.4f',self.state_vec[:,i])))
+            all_coordinates += ("%-24s : %s\n" % ("    Coordinate %3d " % (i+1) , format('%10.4f',sv[:,i])))
 
         ts_ix = 0
         # max cummulative step over steps_cumm iterations
@@ -619,12 +1022,19 @@ class ReactionPathway(object):
              "%-24s : %s" % ("State Summary (beads)", format('%10s', beads_sum)),
              "%-24s : %10.4f | %10.4f " % ("Barriers (Fwd|Rev)", barrier_fwd, barrier_rev)]
 
+        if self.freezer is not None:
+            s += ["%-24s : %s" % ("Bead Update Mask", format('%10d', self.bead_update_mask)),
+                  "%-24s : %10d | %10d" % ("Bead Calcs (done|saved)", self.bead_eg_calls, self.freezer.saved)]
+
+        if self.speculator is not None:
+            s += ["%-24s : %10d | %10d" % ("Speculative (hits|waste)", self.speculator.hits, self.speculator.wasted)]
+
         if self.output_level > 2:
             s += ["Archive %s" % arc]
 
         if self.arc_record and self.output_level > 2:
             assert type(self.arc_record) == file, type(self.arc_record)
-            sv = self.state_vec.reshape(self.beads_count,-1)
+            sv = self.state_view.reshape(self.beads_count,-1)
             arc['state_vec'] = sv
             arc['energies']  = self.bead_pes_energies.reshape(-1)
             arc['gradients'] = self.bead_pes_gradients.reshape(self.beads_count, -1)
@@ -636,29 +1046,43 @@ class ReactionPathway(object):
         return '\n'.join(s)
 
     def post_obj_func(self, grad):
+        # trial states are not steps of the chain:
+        if self._trial:
+            return
+
         if self.reporting:
             if grad:
                 self.reporting.write("***Gradient call (E was %f)***\n" % self.bead_pes_energies.sum())
             else:
                 self.reporting.write("***Energy call   (E was %f)***\n" % self.bead_pes_energies.sum())
 
-        if self.prev_state == None:
+        state = self.state_view
+
+        if self.prev_state is None:
             # must be first iteration
             assert self.eg_calls == 0
-            self.prev_state = self.state_vec.copy()
+            self.prev_state = self.state_snapshot()
 
         # skip reporting if the state hasn't changed
-        elif (self.state_vec == self.prev_state).all() and self.beads_count == self.prev_beads_count:
+        elif (state == self.prev_state).all() and self.beads_count == self.prev_beads_count:
             #FIXME: this is needed for the growing methods. Here the first iteration after growing
             # will set prev_state = state_vec
             return
 
         self.eg_calls += 1
-        self._step = self.state_vec - self.prev_state
-        self.prev_state = self.state_vec.copy()
+        self._step = state - self.prev_state
+
+        # reuse the buffer of the previous state unless the string has grown:
+        if self.prev_state.shape == state.shape:
+            self.prev_state[...] = state
+        else:
+            self.prev_state = self.state_snapshot()
 
         self.record()
 
+        if self.freezer is not None:
+            self.update_freezing()
+
         if self.reporting:
             s = [str(self),
                  common.line()]
@@ -674,6 +1098,27 @@ class ReactionPathway(object):
         self.prev_beads_count = self.beads_count
 
 
+    def update_freezing(self):
+        """
+        Let the freezer decide which beads to calculate next.
+        """
+        if getattr(self, "growing", False) and not self.grown():
+            # the growing heads are handled by freeze_beads:
+            return
+
+        keep = None
+        if self.climb_image:
+            keep = self.ci_num
+
+        # only unfrozen beads and those frozen by the freezer are changed:
+        mask = self.freezer.update(self.bead_update_mask, self.state_view,
+                                   self.perp_bead_forces, self._step,
+                                   self.bead_pes_energies, keep=keep)
+
+        if mask != self.bead_update_mask:
+            lg.info("Bead Freezing MASK: " + str(mask))
+        self.bead_update_mask = mask
+
     def grow_string(self):
         return False
 
@@ -681,18 +1126,18 @@ class ReactionPathway(object):
     def angles(self):
         """Returns an array of angles between beed groups of 3 beads."""
 
+        sv = self.state_view
         angles = []
-        for i in range(len(self.state_vec))[2:]:
-            t0 = self.state_vec[i-1] - self.state_vec[i-2]
-            t1 = self.state_vec[i] - self.state_vec[i-1]
+        for i in range(len(sv))[2:]:
+            t0 = sv[i-1] - sv[i-2]
+            t1 = sv[i] - sv[i-1]
             angles.append(common.vector_angle(t1, t0))
         return array(angles)
 
     def update_bead_separations(self):
         """Updates internal vector of distances between beads."""
 
-        # FIXME: why copy?
-        v = self.state_vec.copy()
+        v = self.state_view
 
         # FIXME: using default cartesian norm here:
         seps = common.pythag_seps(v)
@@ -708,13 +1153,11 @@ class ReactionPathway(object):
         """Returns copy of state as flattened array."""
 
         #Do I really need this as well as the one below?
-        return deepcopy(self.state_vec).flatten()
+        return self._state_vec.flatten()
 
     def get_bead_coords(self):
         """Return copy of state_vec as 2D array."""
-        tmp = deepcopy(self.state_vec)
-        tmp.shape = (self.beads_count, self.dimension)
-        return tmp
+        return self.state_snapshot().reshape(self.beads_count, self.dimension)
 
     def get_maxit(self):
         return self._maxit
@@ -724,9 +1167,11 @@ class ReactionPathway(object):
     maxit = property(get_maxit, set_maxit)
 
     def get_state_vec(self):
-        return self._state_vec.copy()
+        # Callers are free to modify the result, e.g. "neb.state_vec += 0.1",
+        # thus this has to stay a copy. Use state_view for reading.
+        return self.state_snapshot()
     def set_state_vec(self, x):
-        if x != None:
+        if x is not None:
             tmp = array(x).reshape(self.beads_count, -1)
 
             for i in range(self.beads_count):
@@ -739,6 +1184,84 @@ class ReactionPathway(object):
 
     state_vec = property(get_state_vec, set_state_vec)
 
+    def step_to(self, x):
+        """
+        Sets the state to x as the step of an optimizer, other assignments
+        to state_vec  (e.g. trial states of a line search)  do not count.
+        Beads close to a speculative point are moved there and get the
+        result from the cache, see Speculator.
+        """
+        self.state_vec = x
+
+        if self.speculator is not None:
+            for i in range(self.beads_count):
+                if self.bead_update_mask[i] > 0:
+                    self._state_vec[i] = self.speculator.snap(self._state_vec[i])
+
+    @property
+    def state_view(self):
+        """
+        Read-only view of the  current state, nothing is copied. It follows
+        later changes of the  state, thus use state_snapshot() if the values
+        have to be kept.
+        """
+        v = self._state_vec.view()
+        v.flags.writeable = False
+        return v
+
+    def state_snapshot(self):
+        """Returns a copy of the current state owned by the caller."""
+        return self._state_vec.copy()
+
+    def _bead_taylor(self, beads, speculate=False):
+        """
+        Energies and gradients of the beads, from the cache or calculated
+        (at once, by pmap) in the output directory.  With speculate, idle
+        slots calculate the beads of the next state, see Speculator.
+        """
+        # count only beads not yet calculated, e.g. frozen ones are not:
+        missing = len([x for x in beads if not self.allvals.known(x)])
+        self.bead_eg_calls += missing
+
+        spare = None
+        if speculate and self.speculator is not None and missing > 0:
+            extra = self.speculator.speculate(missing, beads, self.prev_state)
+            spare = (self.specvals, extra)
+
+        return self._in_output_path(lambda xs: self.allvals.taylor(xs, spare), beads)
+
+    def _bead_energies(self, beads):
+        """
+        Energies alone of the beads, for many QM codes much cheaper than
+        with gradients. The cache keeps them for a later upgrade.
+        """
+        return self._in_output_path(self.allvals.f, beads)
+
+    def _in_output_path(self, fun, beads):
+        # calculation output should go to another place, thus change directory
+        wopl = getcwd()
+        if not path.exists(self.output_path):
+            mkdir(self.output_path)
+        chdir(self.output_path)
+
+        try:
+            return fun(beads)
+        finally:
+            # return to former directory
+            chdir(wopl)
+
+    def prefetch(self, states):
+        """
+        Calculates the beads of several states of the chain at once, as
+        the trial steps of a line search. Later calls for any of these
+        states get the results from the cache.
+        """
+        beads = []
+        for state in states:
+            # Elemental_memoize keeps references to the rows:
+            beads.extend(array(state).reshape(self.beads_count, -1))
+        self._bead_taylor(beads)
+
     def taylor(self, state):
        ## NOTE: this automatically skips if new_state_vec == None
        #self.state_vec = new_state_vec
@@ -758,75 +1281,74 @@ class ReactionPathway(object):
 #       print "Objective function call: Bead update mask:     ", self.bead_update_mask
 #       print self.state_vec
 
-        if self.bead_eg_calls == 0:
-            self.bead_eg_calls += self.beads_count
-        else:
-            self.bead_eg_calls += self.beads_count - 2
-
         # Note how these arrays are indexed below:
         assert len(self.bead_pes_energies) == self.beads_count
         assert len(self.bead_pes_gradients) == self.beads_count
 
-        # calculation output should go to another place, thus change directory
-        wopl = getcwd()
-        if not path.exists(self.output_path):
-            mkdir(self.output_path)
-        chdir(self.output_path)
-
-
         # get PES energy/gradients
-        es, gs = self.allvals.taylor( state)
-
-        # return to former directory
-        chdir(wopl)
+        es, gs = self._bead_taylor(state, speculate=True)
 
         # FIXME: does it need to be a a destructive update?
         self.bead_pes_energies[:] = es
         self.bead_pes_gradients[:] = gs
         return array(es), array(gs)
 
-    def obj_func(self):
-        es, __ = self.taylor(self.state_vec)
+    def obj_func(self, energy_only=False):
+        """
+        Bead energies of the current state.  The optimizers nearly always
+        ask for the gradients of the same state next, so by default they
+        are calculated together.  With energy_only the gradients are not
+        calculated and the chain does not count this as a step.
+        """
+        # Elemental_memoize keeps references to the rows, do not pass a view:
+        if energy_only:
+            return array(self._bead_energies(self.state_snapshot()))
+
+        es, __ = self.taylor(self.state_snapshot())
         self.post_obj_func(False)
         return es
 
     def obj_func_grad(self):
-        __, g_all = self.taylor(self.state_vec)
-        tangents = self.update_tangents()
-        #
-        # NOTE: update_tangents() is not implemented by this class!
-        #       Consult particular subclass.
-        #
-        #       Also note that at least in NEB the definition
-        #       of the tangent may depend on the relative bead energies.
-        #       Therefore update tangents only after self.bead_pes_energies
-        #       was updated first. Not sure about bead separations though.
-        #
-        self.update_bead_separations()
+        __, g_all = self.taylor(self.state_snapshot())
+        with timings("tangents"):
+            tangents = self.update_tangents()
+            #
+            # NOTE: update_tangents() is not implemented by this class!
+            #       Consult particular subclass.
+            #
+            #       Also note that at least in NEB the definition
+            #       of the tangent may depend on the relative bead energies.
+            #       Therefore update tangents only after self.bead_pes_energies
+            #       was updated first. Not sure about bead separations though.
+            #
+            self.update_bead_separations()
 
         # project gradients in para/perp components:
-        for i in range(self.beads_count):
-
-            # previously computed gradient:
-            g = g_all[i]
-
-            # contravariant tangent coordiantes:
-            T = tangents[i]
+        with timings("projection"):
+            lowered = mt.metric.lower_many(tangents, self._state_vec)
+            para, perp, self.bead_co_tangents = project_gradients(g_all, tangents, lowered)
 
-            # covariant tangent coordiantes:
-            t = mt.metric.lower(T, self._state_vec[i])
-
-            # components of force parallel and orthogonal to the tangent:
-            para_force = - dot(T, g) / sqrt(dot(T, t))
-            perp_force = - g - para_force * t / sqrt(dot(T, t))
-
-            self.para_bead_forces[i] = para_force
-            self.perp_bead_forces[i] = perp_force
+        self.para_bead_forces[:] = para
+        self.perp_bead_forces[:] = perp
 
         self.post_obj_func(True)
         return -self.para_bead_forces, -self.perp_bead_forces
 
 
+    def trial_grad(self, state):
+        """
+        obj_func_grad() of a trial state, e.g. of a line search. It is not
+        a step of the chain: not counted in eg_calls, not recorded and the
+        bead freezing does not see it.  The state stays at the trial state
+        until the optimizer sets the next one.
+        """
+        self.state_vec = state
+        self._trial = True
+        try:
+            return self.obj_func_grad()
+        finally:
+            self._trial = False
+
     def set_positions(self, x):
         """For compatibility with ASE, pretends that there are atoms with cartesian coordinates."""
 
@@ -835,7 +1357,7 @@ class ReactionPathway(object):
     def get_positions(self):
         """For compatibility with ASE, pretends that there are atoms with cartesian coordinates."""
 
-        return common.make_like_atoms(self.state_vec.copy())
+        return common.make_like_atoms(self.state_snapshot())
 
     positions = property(get_positions, set_positions)
 
@@ -848,11 +1370,12 @@ class ReactionPathway(object):
 
     def record(self):
         """Records snap-shot of chain."""
-        es = self.bead_pes_energies.copy()
+        # No copies here, History copies into its own (recycled) buffers:
+        es = self.bead_pes_energies
 
-        state = self.state_vec.copy()
-        perp_forces = self.perp_bead_forces.copy()
-        para_forces = self.para_bead_forces.copy()
+        state = self.state_view
+        perp_forces = self.perp_bead_forces
+        para_forces = self.para_bead_forces
 
         # FIXME: wrong place? Yes, do now only after last iteration
         #ts_estim = ts_estims(self.state_vec, self.bead_pes_energies, self.bead_pes_gradients)[-1]
@@ -864,7 +1387,9 @@ class ReactionPathway(object):
 def ts_estims(beads, energies, gradients, alsomodes = False, converter = None):
     """TODO: Maybe this whole function should be made external."""
 
-    pt = pts.tools.PathTools(beads, energies, gradients)
+    from pts.tools.pathtools import PathTools
+
+    pt = PathTools(beads, energies, gradients)
 
     estims = pt.ts_splcub()
    #f = open("tsplot.dat", "w")
@@ -987,12 +1512,13 @@ class NEB(ReactionPathway):
     growing = False
     def __init__(self, reagents, pes, base_spr_const, result_storage, beads_count=10, pmap = map,
         parallel=False, workhere = 1, reporting=None, output_level = 3, output_path = ".",
-        climb_image = False, start_climb = 5
+        climb_image = False, start_climb = 5, freezer = None, speculator = None
         ):
 
         ReactionPathway.__init__(self, reagents, beads_count, pes, parallel, result_storage, pmap = pmap,
             reporting=reporting, output_level = output_level, output_path = output_path, workhere = workhere,
-            climb_image = climb_image, start_climb = start_climb)
+            climb_image = climb_image, start_climb = start_climb, freezer = freezer,
+            speculator = speculator)
 
         self.base_spr_const = base_spr_const
 
@@ -1019,43 +1545,11 @@ class NEB(ReactionPathway):
         WARNING: uses self.bead_pes_energies to determine tangents
         """
         # terminal beads
-        tangents = zeros((self.beads_count,len(self._state_vec[0])))
-        tangents[0]  = self.state_vec[1] - self.state_vec[0]#zeros(self.dimension)
-        tangents[-1] = self.state_vec[-1] - self.state_vec[-2]#zeros(self.dimension)
-
-        for i in range(self.beads_count)[1:-1]:
-            if self.use_upwinding_tangent:
-                tang_plus = self.state_vec[i+1] - self.state_vec[i]
-                tang_minus = self.state_vec[i] - self.state_vec[i-1]
+        sv = self.state_view
+        tangents = upwind_tangents(sv, self.bead_pes_energies, self.use_upwinding_tangent)
 
-                Vi = self.bead_pes_energies[i]
-                Vi_minus_1 = self.bead_pes_energies[i-1]
-                Vi_plus_1 = self.bead_pes_energies[i+1]
-
-                delta_V_plus = abs(Vi_plus_1 - Vi)
-                delta_V_minus = abs(Vi - Vi_minus_1)
-
-                delta_V_max = max(delta_V_plus, delta_V_minus)
-                delta_V_min = min(delta_V_plus, delta_V_minus)
-
-                if Vi_plus_1 > Vi > Vi_minus_1:
-                    tangents[i] = tang_plus
-
-                elif Vi_plus_1 < Vi < Vi_minus_1:
-                    tangents[i] = tang_minus
-
-                elif Vi_plus_1 > Vi_minus_1:
-                    tangents[i] = tang_plus * delta_V_max + tang_minus * delta_V_min
-
-                elif Vi_plus_1 <= Vi_minus_1:
-                    tangents[i] = tang_plus * delta_V_min + tang_minus * delta_V_max
-                else:
-                    raise Exception("Should never happen")
-            else:
-                tangents[i] = ( (self.state_vec[i] - self.state_vec[i-1]) + (self.state_vec[i+1] - self.state_vec[i]) ) / 2
-
-        for i in range(self.beads_count):
-            tangents[i] /= mt.metric.norm_up(tangents[i], self.state_vec[i])
+        norms = sqrt(einsum('ij,ij->i', tangents, mt.metric.lower_many(tangents, sv)))
+        tangents /= norms[:, newaxis]
 
         return tangents
 
@@ -1082,39 +1576,31 @@ class NEB(ReactionPathway):
     def obj_func_grad(self):
         g_para, g_perp = ReactionPathway.obj_func_grad(self)
 
-        result_bead_gradients = zeros((self.beads_count, self.dimension))
-#        print "pbf", self.perp_bead_forces.reshape((-1,2))
-        tangents = self.update_tangents()
-        for i in range(self.beads_count):
-            # Update mask: 1 update, 0 stay fixed, 2 new bead
-            if not self.bead_update_mask[i] == 1:
-                continue
+        # covariant unit tangents, as used for the projection above:
+        t = self.bead_co_tangents
 
-            total = g_perp[i]
+        # no spring force for end beads:
+        spring_force_mag = zeros(self.beads_count)
+        spring_force_mag[1:-1] = self.base_spr_const * (self.bead_separations[1:] - self.bead_separations[:-1])
 
-            t = mt.metric.lower(tangents[i], self._state_vec[i])
-            # Climbing image is special case
-            if self.climb_image and i == self.ci_num:
-                total = total - g_para[i] * t / sqrt(dot(t, tangents[i]))
-            # no spring force for end beads
-            elif i > 0 and i < self.beads_count - 1:
-                dx1 = self.bead_separations[i]
-                dx0 = self.bead_separations[i-1]
-                spring_force_mag = self.base_spr_const * (dx1 - dx0)
+        total = g_perp - spring_force_mag[:, newaxis] * t
 
-                spring_force = spring_force_mag * t / sqrt(dot(t, tangents[i]))
-                total = total - spring_force
+        # Climbing image is special case
+        if self.climb_image and self.ci_num is not None:
+            i = self.ci_num
+            total[i] = g_perp[i] - g_para[i] * t[i]
 
-#            print "spring", spring_force
-
-            result_bead_gradients[i] = total
+        # Update mask: 1 update, 0 stay fixed, 2 new bead
+        result_bead_gradients = zeros((self.beads_count, self.dimension))
+        mask = asarray(self.bead_update_mask) == 1
+        result_bead_gradients[mask] = total[mask]
 
         g = result_bead_gradients.flatten()
         return g
 
-    def obj_func(self):
+    def obj_func(self, energy_only=False):
 
-        es = ReactionPathway.obj_func(self)
+        es = ReactionPathway.obj_func(self, energy_only=energy_only)
 
         return es.sum()
 
@@ -1282,6 +1768,50 @@ def get_new_bead_number_grad(Es, gradients, tangents, ps):
 
     return new_i
 
+def get_new_bead_numbers_grad(Es, gradients, tangents, ps, k=1):
+    """
+    Places for k new beads, every one is to be inserted just before the
+    (old) bead of this index.  The first is the one from
+    get_new_bead_number_grad(), the others go into the intervals with the
+    highest maximal energy,  at most one per interval.  Along an interval
+    the  energy is interpolated  cubically from the energies and slopes
+    at both ends.
+
+        >>> ps = array([0., 1., 2., 3., 4.])
+        >>> Es = array([0., 1., 3., 2., 0.])
+        >>> gs = array([[1.5], [1.5], [0.5], [-2.], [-2.]])
+        >>> ts = array([[1.], [1.], [1.], [1.], [1.]])
+
+        >>> get_new_bead_numbers_grad(Es, gs, ts, ps)
+        [3]
+        >>> get_new_bead_numbers_grad(Es, gs, ts, ps, 3)
+        [2, 3, 4]
+    """
+    new = [get_new_bead_number_grad(Es, gradients, tangents, ps)]
+
+    # slopes along the path:
+    ds = [dot(g, t) for g, t in zip(gradients, tangents)]
+
+    # Hermite basis on [0, 1]:
+    t = linspace(0.0, 1.0, 11)
+    h00 = 2 * t**3 - 3 * t**2 + 1
+    h10 = t**3 - 2 * t**2 + t
+    h01 = - 2 * t**3 + 3 * t**2
+    h11 = t**3 - t**2
+
+    tops = []
+    for i in range(1, len(ps)):
+        if i in new:
+            continue
+        h = ps[i] - ps[i-1]
+        es = h00 * Es[i-1] + h10 * h * ds[i-1] + h01 * Es[i] + h11 * h * ds[i]
+        tops.append((es.max(), i))
+
+    tops.sort(reverse=True)
+    new.extend([i for __, i in tops[:k-1]])
+
+    return sorted(new)
+
 
 class GrowingString(ReactionPathway):
     """Implements growing and non-growing strings.
@@ -1346,11 +1876,18 @@ class GrowingString(ReactionPathway):
     def __init__(self, reagents, pes, result_storage, beads_count = 10, pmap = map,
         weights = None, growing=True, parallel=False, head_size=None, output_level = 3,
         max_sep_ratio = 0.1, reporting=None, growth_mode='normal', freeze_beads=False,
-        output_path = ".", workhere = 1, climb_image = False, start_climb = 5
+        output_path = ".", workhere = 1, climb_image = False, start_climb = 5,
+        freezer = None, grow_batch = 1, speculator = None
         ):
 
         self.__final_beads_count = beads_count
 
+        # number of beads inserted at once by the searching string:
+        self.grow_batch = grow_batch
+
+        # indices of the beads added by the last growth:
+        self.new_beads = []
+
         self.growing = growing
         if growing:
             initial_beads_count = 4
@@ -1380,7 +1917,8 @@ class GrowingString(ReactionPathway):
 
         ReactionPathway.__init__(self, reagents, initial_beads_count, pes, parallel, result_storage,
                  reporting=reporting, output_level = output_level, climb_image = climb_image, start_climb = 5,
-                 pmap = pmap, output_path = output_path, workhere = workhere)
+                 pmap = pmap, output_path = output_path, workhere = workhere,
+                 freezer = freezer, speculator = speculator)
 
         # setup growth method
         self.growth_funcs = {
@@ -1500,61 +2038,68 @@ class GrowingString(ReactionPathway):
         return self.beads_count == self.__final_beads_count
 
     def grow_string_search(self, energy_only=False):
+        """
+        Inserts grow_batch  beads at  once (one if  energy_only).  The
+        beads already there stay where they are and keep their results,
+        thus only the new ones are calculated,  all of them together in
+        the next round.
+        """
         assert self.beads_count <= self.__final_beads_count
 
         if self.grown():
             return False
-        else:
-            self.beads_count += 1
 
+        k = min(self.grow_batch, self.__final_beads_count - self.beads_count)
+
+        # Path through the current beads, also for the new positions:
         pos =  new_abscissa(self._state_vec, mt.metric)
-        # Build piecewise bead density function
-        _, es = self.energies
-        path = Path(es, pos)
+        path_rep = PathRepresentation(self._state_vec, pos)
         if energy_only:
-            new_i = get_new_bead_number(path, pos)
-        else:
-            new_i = get_new_bead_number_grad(self.bead_pes_energies, self.bead_pes_gradients, self.update_tangents(), pos)
-
-        if new_i == self.beads_count - 2:
-            moving_beads = [new_i-2, new_i-1, new_i]
-        elif new_i == 1:
-            moving_beads = [new_i, new_i+1, new_i+2]
+            # Build piecewise bead  energy function, the gradients are not
+            # needed for it:
+            es = self.obj_func(individual=True, energy_only=True)
+            olds = [get_new_bead_number(Path(es, pos), pos)]
         else:
-            moving_beads = [new_i-1, new_i, new_i+1]
-
-        new_weight = (self.weights[new_i] + self.weights[new_i -1])/2.
-        old_weights = deepcopy(self.weights)
-        assert len(old_weights) == self.beads_count - 1
-        self.weights = zeros(self.beads_count)
-        self.weights[:new_i] = old_weights[:new_i]
-        self.weights[new_i] = new_weight
-        self.weights[new_i+1:] = old_weights[new_i:]
+            olds = get_new_bead_numbers_grad(self.bead_pes_energies, self.bead_pes_gradients, path_rep.path_tangents(), pos, k)
+
+        # indices of the new beads in the grown string, every one half way
+        # (by weight) between its neighbours:
+        new_ixs = [i + n for n, i in enumerate(olds)]
+        weights = list(self.weights)
+        for i, j in zip(new_ixs, olds):
+            weights.insert(i, (self.weights[j] + self.weights[j-1]) / 2.)
+        self.weights = array(weights)
+        self.beads_count += len(olds)
+
+        # the new beads and their neighbours, but not the terminal ones:
+        moving_beads = set()
+        for i in new_ixs:
+            first = max(1, min(i - 1, self.beads_count - 4))
+            moving_beads.update(range(first, first + 3))
 
         # The following block of code ensures that all beads other than the
-        # newly added one stay in exactly the same position. Otherwise,
+        # newly added ones stay in exactly the same position. Otherwise,
         # numerical inaccuraties cause them to move and additional beads
         # to have their energies calculated.
 
         mask = [0 for i in range(self.beads_count)]
-        mask[new_i] = 2
+        for i in new_ixs:
+            mask[i] = 2
 
-        dist =  new_abscissa(self._state_vec, mt.metric)
-        path_rep = PathRepresentation(self._state_vec, dist)
         pos = generate_normd_positions(path_rep, self.weights, mt.metric)
         # Mask tells which beads a new (2), stay fixed (0) or should be updated(1)
         places = path_rep.generate_beads( pos)
         self._state_vec = masked_assign(mask, self._state_vec, places)
 
-        self.initialise()
+        # results of the old beads are kept:
+        self.insert_beads(olds)
+        self.new_beads = new_ixs
 
         # ATTENTION: No, we do not want the state_vec from the last iteration here but
         # rather reinitalize it so that the next convergence test will be skipped
         # Therefore we want self.prev_state == self.state_vec
         self.prev_state = self.state_vec.copy()
 
-        self.bead_update_mask = freeze_ends(self.beads_count)
-
         # Mask of beads to freeze, includes only end beads at present
         # 0 for fix, 1 for updated (as number of beads now fixed, no 2 any more needed)
         self.bead_update_mask = [0 for i in range(self.beads_count)]
@@ -1616,6 +2161,7 @@ class GrowingString(ReactionPathway):
         self.bead_update_mask = freeze_ends(self.beads_count)
 
         self.initialise()
+        self.new_beads = list(new_ixs)
 
         # ATTENTION: No, we do not want the state_vec from the last iteration here but
         # rather reinitalize it so that the next convergence test will be skipped
@@ -1674,8 +2220,8 @@ class GrowingString(ReactionPathway):
         return diffs.max() > self.__max_sep_ratio
 
 
-    def obj_func(self, individual=False):
-        es = ReactionPathway.obj_func(self)
+    def obj_func(self, individual=False, energy_only=False):
+        es = ReactionPathway.obj_func(self, energy_only=energy_only)
 
         if individual:
             return es
@@ -1691,58 +2237,55 @@ class GrowingString(ReactionPathway):
         if raw:
             from_array = self.bead_pes_gradients
         else:
-            tangents = self.update_tangents()
-            self.update_bead_separations()
-
             from_array = g_minimize
 
             if self.climb_image and not self.ci_num == None:
                 assert self.bead_update_mask[self.ci_num] > 0
-                t = mt.metric.lower(tangents[self.ci_num], self._state_vec[self.ci_num])
-                from_array[self.ci_num] = from_array[self.ci_num] - g_para[self.ci_num] * t \
-                  / sqrt(dot(t, tangents[self.ci_num]))
+                # covariant unit tangent from the projection:
+                t = self.bead_co_tangents[self.ci_num]
+                from_array[self.ci_num] = from_array[self.ci_num] - g_para[self.ci_num] * t
 
-        for i in range(self.beads_count):
-            if self.bead_update_mask[i]  > 0:
-                result_bead_gradients[i] = from_array[i]
+        mask = asarray(self.bead_update_mask) > 0
+        result_bead_gradients[mask] = from_array[mask]
 
 #       print "result_bead_forces", result_bead_forces
         g = result_bead_gradients.flatten()
         return g
 
     def respace(self, metric, smart_abscissa=True):
-        if not self.lengths_disparate(mt.metric):
-            # Only do respace if it is necessary
-            # This test seems to be done separately for most optimizer but not at all
-            # for multiopt, this way it should work for all
-            return
+        with timings("respace"):
+            if not self.lengths_disparate(mt.metric):
+                # Only do respace if it is necessary
+                # This test seems to be done separately for most optimizer but not at all
+                # for multiopt, this way it should work for all
+                return
+
+            #print "Respacing beads"
+            # respace the beads along the path
+            dist =  new_abscissa(self._state_vec, mt.metric)
+            path_rep = PathRepresentation(self._state_vec, dist)
 
-        #print "Respacing beads"
-        # respace the beads along the path
-        dist =  new_abscissa(self._state_vec, mt.metric)
-        path_rep = PathRepresentation(self._state_vec, dist)
-
-        if self.climb_image and not self.ci_num == None:
-            # In this case we want different bead positions for the complete string
-            # As we want the CI to stay unchanged, and the other positions to be
-            # adapted accordingly
-            p_ci = path_rep.antiderivative( 0, dist[self.ci_num], mt.metric) / path_rep.antiderivative( 0., 1., mt.metric)
-            chang_weights = new_bead_positions(self.weights, p_ci, dist[self.ci_num], self.ci_num)
-            bd_pos = generate_normd_positions(path_rep, chang_weights, mt.metric)
-
-            # Leave CI as much as possible alone
-            bd_pos[self.ci_num] = dist[self.ci_num]
-        else:
-            bd_pos = generate_normd_positions(path_rep, self.weights, mt.metric)
+            if self.climb_image and not self.ci_num == None:
+                # In this case we want different bead positions for the complete string
+                # As we want the CI to stay unchanged, and the other positions to be
+                # adapted accordingly
+                p_ci = path_rep.antiderivative( 0, dist[self.ci_num], mt.metric) / path_rep.antiderivative( 0., 1., mt.metric)
+                chang_weights = new_bead_positions(self.weights, p_ci, dist[self.ci_num], self.ci_num)
+                bd_pos = generate_normd_positions(path_rep, chang_weights, mt.metric)
+
+                # Leave CI as much as possible alone
+                bd_pos[self.ci_num] = dist[self.ci_num]
+            else:
+                bd_pos = generate_normd_positions(path_rep, self.weights, mt.metric)
 
-        mask = deepcopy(self.bead_update_mask)
-        if self.climb_image and not self.ci_num == None:
-            mask[self.ci_num] = 0
-        # Mask tells which beads a new (2), stay fixed (0) or should be updated(1)
-        places = path_rep.generate_beads( bd_pos)
-        self._state_vec = masked_assign(mask, self._state_vec, places)
+            mask = deepcopy(self.bead_update_mask)
+            if self.climb_image and not self.ci_num == None:
+                mask[self.ci_num] = 0
+            # Mask tells which beads a new (2), stay fixed (0) or should be updated(1)
+            places = path_rep.generate_beads( bd_pos)
+            self._state_vec = masked_assign(mask, self._state_vec, places)
 
-        self.respaces += 1
+            self.respaces += 1
 
 # Testing the examples in __doc__strings, execute
 # "python gxmatrix.py", eventualy with "-v" option appended:
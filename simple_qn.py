@@ -1,7 +1,8 @@
 #!/usr/bin/python
 from numpy import dot, array, sqrt, arctan, sin, cos, pi, zeros
 from copy import deepcopy
-from pts.bfgs import LBFGS, BFGS, SR1
+from pts.bfgs import get_by_name
+from pts.prfo import prfo_step, model_change, hessian_matrix, TrustRadius
 from scipy.linalg import eigh
 from pts.func import NumDiff
 from pts.metric import Default, Metric_reduced, Metric
@@ -13,15 +14,24 @@ from pts.trajectories import empty_traj
 
 def qn(pes, start_geo, metric, max_iteration = 100000000, \
        converged = 0.00016, max_step = 0.1, \
-       update_method = "SR1", trajectory = empty_traj, logfile = None, **params):
+       update_method = "SR1", trajectory = empty_traj, logfile = None, \
+       step_method = "newton", initial_hessian = None, **params):
     """ A simple quasi Newton method
     pes :  potential surface to calculate on, needs f and fprime function
     start_geo : one geometry on pes, as start for search
     start_mode : first mdoe_vector suggestion
     metric     : might affect everything, as defines distances and angles, from pts.metric module
+    step_method : "newton" for the plain quasi Newton step - hess^-1 * grad
+                  restricted to max_step, "prfo" for a partitioned rational
+                  function step (uphill along the lowest mode of the hessian)
+                  inside a dynamic trust radius starting at max_step
+    initial_hessian : None for the default start hessian of the update method,
+                  "numerical" to start with a hessian from finite differences
+                  of the gradients
     """
-    hess = eval(update_method)
-    hess = hess()
+    assert step_method in ("newton", "prfo")
+
+    hess = get_by_name(update_method)()
 
     # do not change them
     geo = deepcopy(start_geo) # of dimer middle point
@@ -40,6 +50,25 @@ def qn(pes, start_geo, metric, max_iteration = 100000000, \
     conv = False
     res = {}
 
+    extra_grads = 0
+    if initial_hessian == "numerical":
+        from pts.vib import derivatef
+        from numpy.linalg import inv
+        assert hasattr(hess, "B"), "numerical start hessian needs a matrix update method"
+
+        B = derivatef(pes.fprime, geo)
+        B = (B + B.T) / 2.
+        hess.B = B
+        if hasattr(hess, "H"):
+            hess.H = inv(B)
+        extra_grads = 2 * len(geo)
+    else:
+        assert initial_hessian in (None, "None")
+
+    if step_method == "prfo":
+        trust = TrustRadius(max_step, max_radius = max_step)
+        old_energy = None
+
     i = 0
     # main loop:
     while i < max_iteration:
@@ -56,18 +85,32 @@ def qn(pes, start_geo, metric, max_iteration = 100000000, \
               (error, converged))
              break
 
-         if not old_grad == None:
+         if old_grad is not None:
              dg = grad - old_grad
              hess.update(step, dg)
 
-         # calculate one step of the qausi_newton, also update dimer direction
-         step = - hess.inv(grad)
+         if step_method == "prfo":
+             if old_energy is not None:
+                 trust.update(energy - old_energy, predicted, step_len)
+             radius = trust.radius
+
+             B = hessian_matrix(hess, len(grad.flatten()))
+             step = prfo_step(B, grad)
+         else:
+             radius = max_step
+
+             # calculate one step of the qausi_newton, also update dimer direction
+             step = - hess.inv(grad)
 
          step_len = metric.norm_up(step, start_geo)
-         if step_len > max_step:
+         if step_len > radius:
              assert step_len > 0
-             step *= max_step / step_len
-             step_len = max_step
+             step *= radius / step_len
+             step_len = radius
+
+         if step_method == "prfo":
+             predicted = model_change(B, grad, step)
+             old_energy = energy
 
 
          # Give some report during dimer optimization
@@ -91,6 +134,7 @@ def qn(pes, start_geo, metric, max_iteration = 100000000, \
     res["convergence"] = conv
     res["abs_force"] = abs_force
     res["steps"] = i
+    res["extra_gradients"] = extra_grads
     res["conv_criteria"] = error
 
     return geo, res
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Gaussian process  regression (GPR) surrogate of a  PES, fitted to both
+energies and gradients, and a chain-of-states search accelerated by it:
+
+    O.-P. Koistinen, F. B. Dagbjartsdottir, V. Asgeirsson, A. Vehtari,
+    H. Jonsson, J. Chem. Phys. 147 (2017), 152720
+
+The chain is relaxed on the (cheap) surrogate, the true PES is only
+evaluated at  the relaxed beads.  The new data  refine the surrogate
+and the cycle is repeated until the true forces converge.
+
+This saves true  calculations only for a loose convergence criterion
+(ftol), with a tight one the surrogate needs many data points to be as
+good and the cycles may well need more of them than the plain search.
+Therefore the plain  search takes over as soon as  the cycles stop to
+improve the surrogate, see surrogate_path().
+
+A quadratic function with its gradient:
+
+    >>> from numpy import array, round, sqrt
+    >>> f = Func(lambda x: x[0]**2 + 2. * x[1]**2,
+    ...          lambda x: array([2. * x[0], 4. * x[1]]))
+
+    >>> xs = [array([0., 0.]), array([1., 0.]), array([0., 1.])]
+    >>> gp = GPR(xs, [f(x) for x in xs], [f.fprime(x) for x in xs], length=1.0)
+
+The surrogate reproduces the data:
+
+    >>> e, g = gp.taylor(array([1., 0.]))
+    >>> round(e, 3), round(g[0], 2), round(abs(g[1]), 2)
+    (1.0, 2.0, 0.0)
+
+It is certain at the data points and uncertain far away from them:
+
+    >>> sqrt(gp.variance(array([0., 1.]))) < 1.0e-2
+    True
+    >>> sqrt(gp.variance(array([5., 5.]))) > 0.9 * gp.sigma
+    True
+
+Far away from the data the surrogate goes to the highest energy seen so
+far, so that a chain relaxed on it does not wander off:
+
+    >>> round(gp(array([50., 50.])), 6)
+    2.0
+
+More data can be added later:
+
+    >>> gp.add(array([1., 1.]), f(array([1., 1.])), f.fprime(array([1., 1.])))
+    >>> len(gp.xs)
+    4
+    >>> round(gp(array([1., 1.])), 3)
+    3.0
+
+Points already known are not added  twice, they would make the kernel
+matrix singular:
+
+    >>> gp.add(array([1., 1.]), 3., array([2., 4.]))
+    >>> len(gp.xs)
+    4
+"""
+
+__all__ = ["GPR", "surrogate_path"]
+
+from warnings import warn
+from numpy import asarray, array, zeros, exp, eye, dot, sqrt, amax, absolute
+from pts.func import Func
+
+# print a line for every cycle of surrogate_path():
+VERBOSE = 0
+
+class GPR(Func):
+    """
+    Gradient enhanced  GPR with a squared exponential kernel
+
+        k(x, x') = sigma^2 exp(- |x - x'|^2 / (2 length^2))
+
+    and the highest energy  of the data as  prior mean.  If sigma is not
+    given the range of the energies is used.
+    """
+    def __init__(self, xs, es, gs, length=0.5, sigma=None, noise=1.0e-5):
+        self.length = length
+        self._sigma = sigma
+        self.noise = noise
+
+        self.xs = []
+        self.es = []
+        self.gs = []
+        for x, e, g in zip(xs, es, gs):
+            self._append(x, e, g)
+
+        self._fit()
+
+    def _append(self, x, e, g):
+        x = asarray(x, dtype=float)
+        for y in self.xs:
+            if amax(absolute(x - y)) < 1.0e-8:
+                return False
+
+        self.xs.append(x.copy())
+        self.es.append(float(e))
+        self.gs.append(asarray(g, dtype=float).copy())
+        return True
+
+    def add(self, x, e, g):
+        """
+        Adds one (geometry, energy, gradient) point and refits.
+        """
+        if self._append(x, e, g):
+            self._fit()
+
+    def _kernel(self, X, Y):
+        """
+        Covariances  between (energy, gradient)  of every point in  X and
+        every  point in  Y, as  array of shape (len(X), 1 + dim, len(Y), 1
+        + dim).
+        """
+        l2 = self.length**2
+
+        # R[a, b] = X[a] - Y[b]:
+        R = X[:, None, :] - Y[None, :, :]
+        K = self.sigma**2 * exp(-(R**2).sum(axis=2) / (2. * l2))
+
+        n, m, d = R.shape
+        C = zeros((n, 1 + d, m, 1 + d))
+
+        # cov(E(x), E(y)):
+        C[:, 0, :, 0] = K
+
+        # cov(E(x), dE(y)/dy_j) and cov(dE(x)/dx_i, E(y)):
+        C[:, 0, :, 1:] = K[:, :, None] * R / l2
+        C[:, 1:, :, 0] = (- K[:, :, None] * R / l2).transpose(0, 2, 1)
+
+        # cov(dE(x)/dx_i, dE(y)/dy_j):
+        GG = K[:, :, None, None] * (eye(d)[None, None, :, :] / l2
+                                    - R[:, :, :, None] * R[:, :, None, :] / l2**2)
+        C[:, 1:, :, 1:] = GG.transpose(0, 2, 1, 3)
+
+        return C
+
+    def _fit(self):
+        from scipy.linalg import cho_factor, cho_solve
+
+        X = array(self.xs)
+        n, d = X.shape
+
+        es = array(self.es)
+        self.mean = es.max()
+
+        if self._sigma is None:
+            self.sigma = es.max() - es.min()
+            if self.sigma == 0.0:
+                self.sigma = 1.0
+        else:
+            self.sigma = self._sigma
+
+        K = self._kernel(X, X).reshape(n * (1 + d), n * (1 + d))
+
+        # noise (or  rather regularization) relative to the  size of
+        # the energies and gradients:
+        reg = zeros((n, 1 + d))
+        reg[:, 0] = (self.noise * self.sigma)**2
+        reg[:, 1:] = (self.noise * self.sigma / self.length)**2
+        K += eye(n * (1 + d)) * reg.flatten()
+
+        y = zeros((n, 1 + d))
+        y[:, 0] = es - self.mean
+        y[:, 1:] = array(self.gs)
+
+        self._X = X
+        self._chol = cho_factor(K)
+        self._alpha = cho_solve(self._chol, y.flatten())
+
+    def taylor(self, x):
+        x = asarray(x, dtype=float)
+        n, d = self._X.shape
+
+        C = self._kernel(x.reshape(1, -1), self._X).reshape(1 + d, n * (1 + d))
+        y = dot(C, self._alpha)
+
+        return self.mean + y[0], y[1:].reshape(x.shape)
+
+    def variance(self, x):
+        """
+        Variance of the energy predicted at x.
+        """
+        from scipy.linalg import cho_solve
+
+        x = asarray(x, dtype=float)
+        n, d = self._X.shape
+
+        c = self._kernel(x.reshape(1, -1), self._X)[0, 0].flatten()
+
+        return self.sigma**2 - dot(c, cho_solve(self._chol, c))
+
+def surrogate_path(pes, init_path, beads_count=None, name="find-path",
+                   method="string", ftol=0.1, maxit=35, pmap=map, workhere=1,
+                   length=0.5, sigma=None, noise=1.0e-5, uncertainty=None, **kwargs):
+    """
+    Chain-of-states search on a  GPR surrogate of pes, for all methods of
+    find_path(), kwargs are passed  to it. The chain is relaxed on the
+    surrogate, then pes is evaluated (in parallel, using pmap) only at
+    the  inner beads where the standard deviation  of the surrogate  is
+    larger than uncertainty.  If there are no such beads, pes is
+    evaluated at all of them and the search stops as soon as the
+    surrogate forces there deviate from the true ones by less than
+    ftol (and the chain on the surrogate converged). maxit limits the
+    number of these cycles.
+
+    The default  for uncertainty, ftol  * length, is  the error  in the
+    energy made by a force of the size of ftol over the length scale of
+    the surrogate.
+
+    A cycle  which needs pes at all inner beads costs as much as a step
+    of the plain search. If  it does not bring the surrogate forces any
+    closer to the true ones than the previous such cycle, the surrogate
+    is given  up (with a warning) and find_path() on pes continues from
+    the path of this cycle.
+
+    Returns the same as find_path().
+    """
+    from pts.path_searcher import find_path
+    from pts.memoize import Elemental_memoize
+
+    if uncertainty is None:
+        uncertainty = ftol * length
+
+    if beads_count is None:
+        beads_count = len(init_path)
+
+    # true PES, every bead in its own directory, as in the searcher:
+    true = Elemental_memoize(pes, pmap=pmap, workhere=workhere, format="bead%02d")
+
+    # for the plain search, if it has to take over:
+    plain = dict(kwargs)
+    plain.update(name=name, ftol=ftol, maxit=maxit, pmap=pmap, workhere=workhere)
+
+    path = asarray(init_path)
+    es, gs = true.taylor(path)
+    gp = GPR(path, es, gs, length=length, sigma=sigma, noise=noise)
+
+    #
+    # The chain is relaxed on the surrogate, which is cheap and needs
+    # neither parallelism nor separate directories, nor output:
+    #
+    kwargs.update(name=name + ".surrogate", ftol=ftol, pmap=map, workhere=0,
+                  output_level=0, cache=None)
+
+    # multiopt continues with the hessians of the last cycle:
+    if kwargs.get("hessians") is None:
+        kwargs["hessians"] = []
+
+    # force error of the last cycle where the surrogate was certain:
+    last = None
+
+    converged = False
+    for it in range(maxit):
+        relaxed, (geometries, abscissa, energies, gradients) = \
+            find_path(gp, path, beads_count=beads_count, method=method, **kwargs)
+
+        geometries = array(geometries).reshape(beads_count, -1)
+        gradients = array(gradients).reshape(beads_count, -1)
+
+        # the terminal beads are fixed and known:
+        inner = range(1, beads_count - 1)
+
+        sample = [i for i in inner if sqrt(max([gp.variance(geometries[i]), 0.0])) > uncertainty]
+        certain = (len(sample) == 0)
+        if certain:
+            sample = inner
+
+        es, gs = true.taylor([geometries[i] for i in sample])
+
+        # deviation of the surrogate forces from the true ones:
+        error = max([amax(absolute(g - gradients[i])) for i, g in zip(sample, gs)])
+
+        for i, e, g in zip(sample, es, gs):
+            gp.add(geometries[i], e, g)
+
+        if VERBOSE:
+            print "surrogate_path: cycle %d, %d true evaluations, max. force error %f" % (it + 1, len(sample), error)
+
+        path = geometries
+
+        # growing strings are grown once, on the surrogate:
+        method = method.lower().replace("growingstring", "string").replace("searchingstring", "string")
+
+        if abscissa is not None and method.endswith("string"):
+            abscissa = asarray(abscissa)
+            kwargs["weights"] = ((abscissa - abscissa[0]) / (abscissa[-1] - abscissa[0])).tolist()
+
+        #
+        # If the path is converged on  the surrogate and the surrogate
+        # forces at all beads are as good as the convergence criterion,
+        # so is the path on the true PES:
+        #
+        if relaxed and certain and error < ftol:
+            converged = True
+            break
+
+        #
+        # The surrogate is certain at all beads, but  the refit did not
+        # bring the  forces closer to the true ones. The next cycles are
+        # as expensive as steps of the plain search:
+        #
+        if certain and last is not None and error >= last:
+            warn("WARNING: surrogate does not save calculations for ftol = %g, continued without it" % ftol)
+
+            plain.update(hessians=kwargs["hessians"], weights=kwargs.get("weights"))
+            return find_path(pes, path, beads_count=beads_count, method=method, **plain)
+
+        if certain:
+            last = error
+
+    # true results for the last path, all of them known if converged:
+    energies, gradients = true.taylor(geometries)
+    energies = array(energies)
+    gradients = array(gradients).reshape(beads_count, -1)
+
+    return converged, (geometries, abscissa, energies, gradients)
+
+# python surrogate.py [-v]:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
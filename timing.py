@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+Where the time of a calculation goes: named timers and counters.
+
+A timer is used as context, timers within timers are named by the path
+of the outer ones.  For the tests the clock is one which only moves when
+told so:
+
+    >>> class Clock(object):
+    ...     now = 0.0
+    ...     def __call__(self):
+    ...         return self.now
+    >>> clock = Clock()
+
+    >>> t = Timings(clock=clock)
+    >>> for i in range(3):
+    ...     with t("iteration"):
+    ...         with t("pes"):
+    ...             clock.now += 2.0 + i
+    ...         with t("respace"):
+    ...             clock.now += 0.5
+    ...     t.count("beads", 5)
+
+    >>> t.calls("iteration/pes"), t.total("iteration/pes"), t.total("iteration")
+    (3, 9.0, 10.5)
+    >>> t.counters["beads"]
+    15
+
+Every  use of a  timer is an event on the timeline,  with its start and
+duration relative to the creation (or reset) of the Timings:
+
+    >>> t.events[:3]
+    [('iteration/pes', 0.0, 2.0), ('iteration/respace', 2.0, 0.5), ('iteration', 0.0, 2.5)]
+
+Jobs of the parallel maps report when they were queued, started  and
+finished,  the time between the first two is the time they waited for
+a free CPU (or agent):
+
+    >>> t.job("pmap", 0, 10.5, 10.5, 14.0)
+    >>> t.job("pmap", 1, 10.5, 11.0, 13.0)
+
+The summary  has  the  timers indented by nesting,  the counters and
+statistics of the jobs:
+
+    >>> print t.summary()
+    Timings (s):                calls      total       mean        max
+      iteration                     3     10.500      3.500      4.500
+        pes                         3      9.000      3.000      4.000
+        respace                     3      1.500      0.500      0.500
+    Counters:
+      beads                        15
+    Jobs (s):                   count   mean wait   max wait   mean run    max run
+      pmap                          2      0.250      0.500      2.750      3.500
+
+The timeline may be written to JSON or CSV files for other tools:
+
+    >>> t.save("/tmp/tEmP")
+    >>> from json import load
+    >>> sorted(load(open("/tmp/tEmP.timing.json")).keys())
+    [u'counters', u'events', u'jobs', u'totals']
+    >>> print open("/tmp/tEmP.timing.csv").read().split()[-1]
+    run,pmap.1,11.000000,2.000000
+
+    >>> import os
+    >>> os.unlink("/tmp/tEmP.timing.json"); os.unlink("/tmp/tEmP.timing.csv")
+
+A disabled Timings records nothing, its timers do nothing at all:
+
+    >>> t.reset()
+    >>> t.disable()
+    >>> with t("pes"):
+    ...     clock.now += 1.0
+    >>> t.count("beads")
+    >>> t.totals, t.counters, t.events
+    ({}, {}, [])
+
+The module holds one of them,  disabled unless find_path() or dimer()
+are asked for the timings, which the other modules of the package
+report to:
+
+    >>> timings.enabled
+    False
+"""
+
+from __future__ import with_statement
+
+__all__ = ["Timings", "timings"]
+
+import sys
+from time import time
+from threading import local, Lock
+from json import dump
+
+class _Nothing(object):
+    """
+    Timer of a disabled Timings.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+_NOTHING = _Nothing()
+
+class _Timer(object):
+    """
+    Adds the time spent in the context to the Timings.
+    """
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.stack = self.timings._stack()
+        self.stack.append(self.name)
+        self.start = self.timings.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = self.timings.clock() - self.start
+        path = "/".join(self.stack)
+        self.stack.pop()
+        self.timings._add(path, self.start, duration)
+        return False
+
+class Timings(object):
+    """
+    Total time, number of calls and longest call of every timer, values
+    of the counters, the timeline of all timer calls and of the jobs of
+    the parallel maps.  Timers nest separately in every thread.
+    """
+    def __init__(self, enabled=True, clock=time):
+        self.enabled = enabled
+        self.clock = clock
+        self._local = local()
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        # path -> [calls, total, longest]:
+        self.totals = {}
+        self.counters = {}
+
+        # (path, start, duration):
+        self.events = []
+
+        # (kind, jid, queued, started, finished):
+        self.jobs = []
+
+        self.origin = self.clock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def __call__(self, name):
+        """
+        Timer for name, to be used in a with statement.
+        """
+        if not self.enabled:
+            return _NOTHING
+
+        return _Timer(self, name)
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _add(self, path, start, duration):
+        with self._lock:
+            entry = self.totals.setdefault(path, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+            self.events.append((path, start - self.origin, duration))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def job(self, kind, jid, queued, started, finished):
+        """
+        Records a job of a parallel map, by the times (as given by the
+        clock) it was queued, started and finished.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.jobs.append((kind, jid, queued - self.origin,
+                              started - self.origin, finished - self.origin))
+
+    def calls(self, path):
+        return self.totals.get(path, [0, 0.0, 0.0])[0]
+
+    def total(self, path):
+        return self.totals.get(path, [0, 0.0, 0.0])[1]
+
+    def summary(self):
+        lines = ["Timings (s):                calls      total       mean        max"]
+
+        # parents before their children:
+        for path in sorted(self.totals, key=lambda p: p.split("/")):
+            calls, total, longest = self.totals[path]
+            names = path.split("/")
+            name = "  " * len(names) + names[-1]
+            lines.append("%-24s %8d %10.3f %10.3f %10.3f" % (name, calls, total, total / calls, longest))
+
+        if self.counters:
+            lines.append("Counters:")
+            for name in sorted(self.counters):
+                lines.append("  %-22s %8d" % (name, self.counters[name]))
+
+        if self.jobs:
+            lines.append("Jobs (s):                   count   mean wait   max wait   mean run    max run")
+            kinds = {}
+            for kind, jid, queued, started, finished in self.jobs:
+                kinds.setdefault(kind, []).append((started - queued, finished - started))
+
+            for kind in sorted(kinds):
+                waits = [w for w, r in kinds[kind]]
+                runs = [r for w, r in kinds[kind]]
+                n = len(waits)
+                lines.append("  %-22s %8d %10.3f %10.3f %10.3f %10.3f" % \
+                             (kind, n, sum(waits) / n, max(waits), sum(runs) / n, max(runs)))
+
+        return "\n".join(lines)
+
+    def save_json(self, filename):
+        data = dict(totals=dict((path, dict(calls=c, total=t, max=m))
+                                for path, (c, t, m) in self.totals.iteritems()),
+                    counters=self.counters,
+                    events=[dict(name=path, start=s, duration=d) for path, s, d in self.events],
+                    jobs=[dict(kind=k, jid=j, queued=q, started=s, finished=f)
+                          for k, j, q, s, f in self.jobs])
+        f = open(filename, "w")
+        dump(data, f, indent=1)
+        f.close()
+
+    def save_csv(self, filename):
+        """
+        The timeline, one line per timer call and two per job (waiting
+        and running), sorted by start.
+        """
+        rows = [("timer", path, s, d) for path, s, d in self.events]
+        for kind, jid, queued, started, finished in self.jobs:
+            rows.append(("wait", "%s.%s" % (kind, jid), queued, started - queued))
+            rows.append(("run", "%s.%s" % (kind, jid), started, finished - started))
+        rows.sort(key=lambda row: row[2])
+
+        f = open(filename, "w")
+        f.write("kind,name,start,duration\n")
+        for row in rows:
+            f.write("%s,%s,%f,%f\n" % row)
+        f.close()
+
+    def save(self, prefix):
+        """
+        Writes <prefix>.timing.json and <prefix>.timing.csv.
+        """
+        self.save_json(prefix + ".timing.json")
+        self.save_csv(prefix + ".timing.csv")
+
+    def report(self, prefix=None, out=sys.stdout):
+        """
+        Stops recording, prints the summary and, if prefix is given, saves
+        the timeline.
+        """
+        self.disable()
+        print >> out, self.summary()
+        if prefix:
+            self.save(prefix)
+
+timings = Timings(enabled=False)
+
+# python timing.py [-v]:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
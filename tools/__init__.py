@@ -1,2 +1,7 @@
-from pathtools import PathTools, gnuplot_path, gnuplot_path3D
+"""
+Command line tools of  paratools, see bin/paratools.  The submodules are
+not imported here,  many of them need  ASE or SciPy and the tools are
+called often from scripts. Import the ones needed, e.g.:
 
+    from pts.tools.pathtools import PathTools
+"""
@@ -28,6 +28,7 @@ import numpy as np
 
 import pts
 import pts.tools.rotate as rot
+from pts.tools.pathtools import PathTools, gnuplot_path3D
 from pts.common import file2str, rms
 
 all_estim_methods = ['SplCubic', 'High', 'Spl', 'SplAvg', 'Bell']
@@ -216,7 +217,7 @@ def main(argv=None):
                 i, state, es, gs, ss = path
 
                 print "Analysing path %d of %d beads..." % (i, len(es))
-                pt = pts.tools.PathTools(state, es, gs, ss)
+                pt = PathTools(state, es, gs, ss)
 
                 methods = {'SplCubic': pt.ts_splcub,
                            'High': pt.ts_highest,
@@ -259,7 +260,7 @@ def main(argv=None):
                         print "%s: (E_est - E_corr) = %.3f ;Geom err = %.3f ;bracket = %.1f-%.1f" % (name.ljust(20), energy_err, error, s0, s1)
 
         if gnuplot_out:
-            pts.tools.gnuplot_path3D(path_list, ts_list, fn_pickle)
+            gnuplot_path3D(path_list, ts_list, fn_pickle)
 
     except Usage, err:
         print >>sys.stderr, err
@@ -16,8 +16,17 @@ recognised easily by ASE. This is done by adding the parameter
 <input format> can be any of the ones available for ASE. This option has to be given
 before the geometry files but in any order with --zmatrix.
 
+Overall rotations and translations are removed from the Cartesian geometries
+(before comparing them) by
+  --align
+all of them are superimposed onto the reference geometry in one go.  With
+  --masses
+the superposition is weighted by the atomic masses. These options have also to be
+given before the geometry files.
+
  paratools compare_geos --help gives this helptext.
 """
+import sys
 from ase.io import read
 from pts.metric import Default
 from pts.cfunc import Cartesian
@@ -43,6 +52,8 @@ def compare(g1, g2, syms, fun):
 def main(argv):
     format = None
     zmat = None
+    align = False
+    masses = False
 
     while argv[0].startswith("--"):
         if argv[0] == '--format':
@@ -51,6 +62,12 @@ def main(argv):
         elif argv[0] == '--zmatrix':
             __, zmat, v_name, __, __, __,__ = read_zmt_from_file(argv[1])
             argv = argv[2:]
+        elif argv[0] == '--align':
+            align = True
+            argv = argv[1:]
+        elif argv[0] == '--masses':
+            masses = True
+            argv = argv[1:]
         elif argv[0] == '--help':
             print __doc__
             return
@@ -70,7 +87,23 @@ def main(argv):
 
     for geo in geos:
         assert geo.get_chemical_symbols() == symbols
-        compare(geo1.get_positions(), geo.get_positions(), symbols, fun)
+
+    ref = geo1.get_positions()
+    xs = [geo.get_positions() for geo in geos]
+
+    if align:
+        from pts.quat import align as superimpose
+
+        if masses:
+            weights = geo1.get_masses()
+        else:
+            weights = None
+
+        xs, rmsd = superimpose(ref, xs, weights=weights)
+        print "RMSD after superposition", rmsd
+
+    for x in xs:
+        compare(ref, x, symbols, fun)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
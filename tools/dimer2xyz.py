@@ -5,9 +5,18 @@ def read_from_pickle_log(filename ):
     from log.pickle file.
     always extract center curvature and lowest mode, addtional
     points can be specified
+
+    Binary logs as written by trajectories.progress_log are read as well.
     """
     from pickle import load
     from numpy.linalg import norm
+    from pts.trajectories import MAGIC
+
+    f = open(filename, "rb")
+    binary = (f.read(len(MAGIC)) == MAGIC)
+    f.close()
+    if binary:
+        return read_from_binary_log(filename)
 
     geos = []
     modes = []
@@ -48,6 +57,29 @@ def read_from_pickle_log(filename ):
 
     return object, geos, modes, curvatures, energy, gradients
 
+def read_from_binary_log(filename):
+    """
+    Same as read_from_pickle_log  for the binary logs.  Values missing
+    in a record (NaN) are skipped, as they would be missing in the pickle.
+    """
+    from numpy import isnan
+    from numpy.linalg import norm
+    from pts.trajectories import ProgressFile
+
+    log = ProgressFile(filename)
+
+    def present(vs):
+        # a row is there if not all of it is NaN:
+        return [v for v in vs if not isnan(v).all()]
+
+    geos = present(log.column("Center"))
+    modes = [m / norm(m) for m in present(log.column("Mode"))]
+    curvatures = present(log.curvatures())
+    energy = present(log.energies())
+    gradients = present(log.column("Gradients"))
+
+    return (log.symbols, log.funcart), geos, modes, curvatures, energy, gradients
+
 def main(argv):
      """
      Takes the geometries from the pickle file and prints them in
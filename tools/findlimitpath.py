@@ -1,18 +1,23 @@
 #!/usr/bin/env python
 from sys import exit, argv as sargv
 import re
-from pydoc import help
+from pts.tools.logindex import log_index
 
 class storedata:
     """
     Class for storing the data, which will be used some times
     """
-    def __init__(self, file, argv):
+    def __init__(self, file, argv, index=None):
         # argv = "which variable" limit  specialopt
         if len(argv) < 3:
             print "ERROR: there are 4 values needed\n"
             exit()
         self.file = file
+        # the log is read only once, all variables are then taken
+        # from the index:
+        if index is None:
+            index = log_index(file)
+        self.index = index
         self.argument = argv[0]
         self.inval = float(argv[1])
         # there are several specialopts possible
@@ -69,23 +74,7 @@ class storedata:
         finds the number of the bead for each iteration
         which holds the maximum energy
         """
-        filein = open(self.file, "r")
-        for line in filein:
-             # Data is stored in file as:
-             # which variable : num1 | num2 | ...
-             # the lengt of "which variable" has to be omitted(self.uninteresting)
-             # then every second value is wanted
-             if line.startswith('%s' % "Bead Energies"):
-                 fields = line.split()
-                 datapoints = (len(fields) - 2) / 2
-                 max_e = float(fields[3])
-                 numin = 0
-                 for i in range(datapoints-1):
-                    curen = float(fields[2 + 3 + 2 * i])
-                    if max_e < curen:
-                         max_e = curen
-                         numin = i + 1
-                 self.maxbead.append(numin)
+        self.maxbead = self.index.maxbead("Bead Energies").tolist()
         #print self.maxbead
 
     def createlist(self):
@@ -95,35 +84,29 @@ class storedata:
         them if wanted
         stores data in self.data
         """
-        filein = open(self.file, "r")
         self.data = []
         self.lengthconstant = True
         storeline = []
-        for line in filein:
-             # Data is stored in file as:
-             # which variable : num1 | num2 | ...
-             # the lengt of "which variable" has to be omitted(self.uninteresting)
-             # then every second value is wanted
-             if line.startswith('%s' % self.argument):
-                 fields = line.split()
-                 dataline = []
-                 datapoints = (len(fields) - self.uninteresting) / 2
-                 for i in range(datapoints):
-                       dataline.append(float(fields[self.uninteresting + 1 +2 * i]))
-                 if not self.numberofbeads == None:
-                      if not (self.numberofbeads == datapoints):
-                          # Here the growing string method has produced the results
-                          # lengthconstant says now there are lines with different lengt
-                          # We hold the first line of the bigger length (we assume that
-                          # the lengt increases all the time), we will fill up the smaller
-                          # lines with the data from this line
-                          # (as values should go down all the time tis way the first lines
-                          # with the big values should give no hit for the limit
-                          #FIXME: can we tread growing string case better?
-                          self.lengthconstant = False
-                          storeline = dataline
-                 self.numberofbeads = datapoints
-                 self.data.append(dataline)
+        # Data is stored in file as:
+        # which variable : num1 | num2 | ...
+        # the index holds the num's for every occurrence of the variable
+        for dataline in self.index.rows(self.argument.strip()):
+             dataline = dataline.tolist()
+             datapoints = len(dataline)
+             if not self.numberofbeads == None:
+                  if not (self.numberofbeads == datapoints):
+                      # Here the growing string method has produced the results
+                      # lengthconstant says now there are lines with different lengt
+                      # We hold the first line of the bigger length (we assume that
+                      # the lengt increases all the time), we will fill up the smaller
+                      # lines with the data from this line
+                      # (as values should go down all the time tis way the first lines
+                      # with the big values should give no hit for the limit
+                      #FIXME: can we tread growing string case better?
+                      self.lengthconstant = False
+                      storeline = dataline
+             self.numberofbeads = datapoints
+             self.data.append(dataline)
         if self.difference:
             # Here not the original data is wanted but the difference between the two
             # succeding lines, starts with a zero line (line1 - line1)
@@ -266,6 +249,8 @@ class interpretvalues():
         assert( len(args) > 2)
         # The first one should be the filename, in which we search
         self.file = args[0]
+        # one pass over the log for all the variables:
+        index = log_index(self.file)
         if len(args) < 4:
             # in this case there are 3 or 4 arguments all together
             # (one for the file) and 2 to 3 for the rest
@@ -279,7 +264,7 @@ class interpretvalues():
                 arg2.append('-n')
             # create one storedataobject, extract wanted data from file
             # and produce the limits
-            self.st1 = storedata(self.file, arg2)
+            self.st1 = storedata(self.file, arg2, index)
             self.st1.createlist()
             if self.st1.emaxbead():
                 self.st1.findmaxbead()
@@ -304,7 +289,7 @@ class interpretvalues():
             # create a storedataobject for each of them
             for k in range(self.vals):
                 argm = arg[k*3:k*3+3]
-                self.stn[k] = storedata(self.file, argm)
+                self.stn[k] = storedata(self.file, argm, index)
                 self.stn[k].createlist()
                 if self.stn[k].emaxbead():
                     self.stn[k].findmaxbead()
@@ -579,6 +564,7 @@ not fallen above afterwards
 
 if __name__ == "__main__":
     if sargv[1] == '--help':
+        from pydoc import help
         help(main)
     else:
         main(sargv[1:])
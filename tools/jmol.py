@@ -19,6 +19,12 @@ will visualize the path in 3D with jmol with
 an extra image (approximated by a path through
 the origional images) will be shown
 
+With --align the images are superimposed onto each
+other (each onto the previous one) before, so that
+overall rotations and translations do not show up:
+
+    $ paratools jmol --align 1.xyz 1.xyz ... n.xyz
+
 Alternatively
 
 1)
@@ -48,6 +54,19 @@ Very simple ascii 3D-viewer:
        X    0.00000000   0.00000000   0.00000000
        X    1.00000000   0.00000000   0.00000000
 
+The same  path, with the second image rotated  onto the first one
+(only the bond direction is compared):
+
+    >>> jmol_view_path(geoms, viewer=ascii, align=True)
+    2
+    frame 0.000000
+       X    0.00000000   0.00000000   0.00000000
+       X    0.00000000   0.00000000   1.00000000
+    2
+    frame 1.000000
+       X    0.00000000   0.00000000   0.00000000
+       X    0.00000000   0.00000000   1.00000000
+
 This was a doctest. Normally you will use the default
 viewer (jmol) like here:
 
@@ -61,6 +80,7 @@ from tempfile import mkstemp
 
 import ase
 from pts.path import Path
+from pts.quat import align as superimpose
 from numpy import linspace
 
 def jmol_view_file(file):
@@ -82,7 +102,11 @@ def jmol_view_atoms(atoms, viewer=jmol_view_file):
 
     os.unlink(fname)
 
-def jmol_view_path(geoms, syms=None, refine=1, viewer=jmol_view_file):
+def jmol_view_path(geoms, syms=None, refine=1, viewer=jmol_view_file, align=False):
+
+    if align:
+        # every image superimposed onto the previous one:
+        geoms, __ = superimpose(None, geoms, sequential=True)
 
     path = Path(geoms)
 
@@ -111,12 +135,17 @@ def jmol_write(xyz, syms=None, comment="", file=sys.stdout):
 
 def main(argv):
     refinenum = 1
-    if argv[0] == '--refine':
-        refinenum = int(argv[1])
-        argv = argv[2:]
-    elif argv[0] == '--help':
-        print __doc__
-        return
+    align = False
+    while len(argv) > 0 and argv[0].startswith("--"):
+        if argv[0] == '--refine':
+            refinenum = int(argv[1])
+            argv = argv[2:]
+        elif argv[0] == '--align':
+            align = True
+            argv = argv[1:]
+        else:
+            print __doc__
+            return
 
     if len(argv) < 2:
         # print usage and return:
@@ -129,7 +158,7 @@ def main(argv):
 
     syms = images[0].get_chemical_symbols()
 
-    jmol_view_path(geoms, syms, refine=refinenum)
+    jmol_view_path(geoms, syms, refine=refinenum, align=align)
 
 if __name__ == "__main__":
     import doctest
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+One-pass index  of the text  log written by the  chain-of-states code,
+see ReactionPathway.__str__ in searcher.py.
+
+Every  "Chain of  States Summary"  block  in the  log contains  per-bead
+lines like
+
+    Bead Energies            :   -61.4932 |   -61.1503 |   -60.2848
+
+The tools  find-limit-path and min-iter as well  as read_line_from_log
+in path2tab used to rescan the whole  file once for every quantity they
+were interested in.  Here the file is  read once, all numeric per-bead
+lines are stored  as NaN-padded tables (occurrences x  beads) and later
+queries are answered by NumPy operations on these tables:
+
+    >>> log = '''
+    ... Chain of States Summary for 1 gradient/energy calculations
+    ... VALUES FOR SINGLE BEADS
+    ... Bead Energies            :    -1.0000 |     2.0000 |    -1.5000
+    ... RMS Perp Forces          :  0.000e+00 |  5.000e-01 |  0.000e+00
+    ... Raw State Vector         :
+    ... Chain of States Summary for 6 gradient/energy calculations
+    ... VALUES FOR SINGLE BEADS
+    ... Bead Energies            :    -1.0000 |     1.0000 |     3.0000 |    -1.5000
+    ... RMS Perp Forces          :  0.000e+00 |  1.000e-01 |  2.000e-01 |  0.000e+00
+    ... State Summary (beads)    :       None |       None |       None |       None
+    ... '''
+    >>> idx = LogIndex.from_lines(log.split("\\n"))
+
+    >>> idx.labels()
+    ['Bead Energies', 'RMS Perp Forces']
+
+    >>> idx.calls
+    array([1, 6])
+
+    >>> idx.counts("Bead Energies")
+    array([3, 4])
+
+    >>> idx.table("RMS Perp Forces")
+    array([[ 0. ,  0.5,  0. ,  nan],
+           [ 0. ,  0.1,  0.2,  0. ]])
+
+    >>> idx.rows("Bead Energies")[1]
+    array([-1. ,  1. ,  3. , -1.5])
+
+    >>> idx.line("Bead Energies", 1)
+    [-1.0, 2.0, -1.5]
+
+The bead with the highest energy of every summary:
+
+    >>> idx.maxbead()
+    array([1, 2])
+
+Lines which  do not hold  numbers for every  bead (like  "State Summary
+(beads)" above) are not indexed.
+
+The index  is, by default, pickled into  a file next to  the log (with
+extension .idx) and reused as long as size and modification time of the
+log do not change.
+"""
+
+import os
+import pickle
+import numpy as np
+
+__all__ = ["LogIndex", "log_index"]
+
+# Bump this if the layout of the pickled index changes:
+VERSION = 1
+
+SUMMARY = "Chain of States Summary"
+
+class LogIndex(object):
+    """
+    Per-bead  numerical  data   of  a  chain-of-states  log.   For  every
+    indexed  label there  is one  row  per occurrence  of that  label in
+    the  log. The  row knows  to which  summary block  (and thus  to which
+    number of gradient/energy calculations) it belongs.
+    """
+    def __init__(self, calls, data):
+        # number of gradient/energy calculations  as given in the header
+        # of each summary block:
+        self.calls = np.asarray(calls, dtype=int)
+
+        # label -> (table, counts, blocks):
+        self.data = data
+
+    @staticmethod
+    def from_lines(lines):
+        """
+        Builds the index in one pass over the lines of a log.
+        """
+        calls = []
+        raw = {}
+
+        for line in lines:
+            if line.startswith(SUMMARY):
+                fields = line.split()
+                calls.append(int(fields[5]))
+                continue
+
+            if ":" not in line:
+                continue
+
+            label, values = line.split(":", 1)
+            label = label.strip()
+
+            # Per-bead data are separated by "|", some lines (like "Bead
+            # Angles") have leading or trailing ones:
+            values = [v for v in values.split("|") if v.strip() != ""]
+            if len(values) == 0:
+                continue
+
+            try:
+                values = map(float, values)
+            except ValueError:
+                continue
+
+            rows, blocks = raw.setdefault(label, ([], []))
+            rows.append(values)
+            blocks.append(len(calls) - 1)
+
+        data = {}
+        for label, (rows, blocks) in raw.iteritems():
+            counts = np.array([len(row) for row in rows])
+            table = np.empty((len(rows), counts.max()))
+            table[...] = np.nan
+            for i, row in enumerate(rows):
+                table[i, :len(row)] = row
+            data[label] = (table, counts, np.array(blocks))
+
+        return LogIndex(calls, data)
+
+    def labels(self):
+        return sorted(self.data.keys())
+
+    def table(self, label):
+        """
+        NaN-padded (occurrences x beads) array  of all values of label.
+        Growing  string  runs  have  rows  of  different  length,  see
+        counts().
+        """
+        return self.data[label][0]
+
+    def counts(self, label):
+        """
+        Number of beads in each of the rows of table(label).
+        """
+        return self.data[label][1]
+
+    def blocks(self, label):
+        """
+        Index of the summary block each row of table(label) belongs to.
+        """
+        return self.data[label][2]
+
+    def rows(self, label):
+        """
+        List of arrays, one for every occurrence of label, without the
+        padding.
+        """
+        table, counts, __ = self.data[label]
+        return [row[:n] for row, n in zip(table, counts)]
+
+    def line(self, label, num):
+        """
+        Values of  label in the (last) summary  block for num gradient/energy
+        calculations.
+        """
+        table, counts, blocks = self.data[label]
+        hits = np.nonzero(self.calls[blocks] == num)[0]
+        if len(hits) == 0:
+            raise KeyError("no %s for %d gradient/energy calculations in log" % (label, num))
+        i = hits[-1]
+        return table[i, :counts[i]].tolist()
+
+    def maxbead(self, label="Bead Energies"):
+        """
+        For  every occurrence of label the  number of the bead with the
+        maximal value.
+        """
+        table = self.table(label)
+        return np.where(np.isnan(table), -np.inf, table).argmax(axis=1)
+
+def log_index(filename, cache=True):
+    """
+    Returns  the LogIndex of the log filename.  If cache is set the index
+    is stored in (or taken from) filename + ".idx".
+    """
+    stat = os.stat(filename)
+    stamp = (VERSION, stat.st_size, stat.st_mtime)
+    idxfile = filename + ".idx"
+
+    if cache and os.path.exists(idxfile):
+        try:
+            f = open(idxfile, "rb")
+            try:
+                key, calls, data = pickle.load(f)
+            finally:
+                f.close()
+            if key == stamp:
+                return LogIndex(calls, data)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            # Broken or incompatible cache, just create a new one:
+            pass
+
+    f = open(filename, "r")
+    try:
+        idx = LogIndex.from_lines(f)
+    finally:
+        f.close()
+
+    if cache:
+        try:
+            f = open(idxfile, "wb")
+            try:
+                pickle.dump((stamp, idx.calls, idx.data), f, protocol=2)
+            finally:
+                f.close()
+        except IOError:
+            # Read-only directories are fine, only the cache is lost:
+            pass
+
+    return idx
+
+# python logindex.py [-v]:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
@@ -92,8 +92,7 @@ from sys import stderr
 from sys import argv as sargv
 from pts.tools.path2xyz import read_in_path
 from pts.tools.pathtools import read_path_coords
-from pts.tools.xyz2tabint import returnall, expandlist, writeall
-from pts.ui.read_COS import read_geos_from_file_more
+from pts.tools.xyz2tabint import returnmany, expandarray, writeall
 import numpy as np
 from sys import stdout
 
@@ -105,7 +104,6 @@ def path_to_int(x, y, cs, num, allval, cell, tomove, howmove, withs):
     the path
     """
     path1 = Path(y, x)
-    path = []
 
     __, trafo = cs
     # to decide how long x is, namely what
@@ -118,24 +116,13 @@ def path_to_int(x, y, cs, num, allval, cell, tomove, howmove, withs):
     else:
         endx = float(x[-1])
 
-    for i in range(num):
-         # this is one of the frames,
-         # the internal coordinates are converted
-         # to Cartesian by the cs fake-Atoms object
-         coord = path1((endx / (num -1) * i))
-         cart =  trafo(coord)
-         if cell != None:
-             cart2 = list(cart)
-             expandlist(cart2, cell, tomove, howmove)
-             cart = np.array(cart2)
-
-         new_val = returnall(allval, cart, True, i)
-         if withs:
-             path.append( [new_val[0]] + [endx / (num - 1) * i] + new_val[1:])
-         else:
-             path.append(new_val)
+    ss = [endx / (num -1) * i for i in range(num)]
+
+    # these are the frames, the internal coordinates are converted
+    # to Cartesian by the cs fake-Atoms object
+    carts = [trafo(path1(s)) for s in ss]
 
-    return path
+    return carts_to_int(carts, ss, allval, cell, tomove, howmove, withs)
 
 def ts_estimates_in_int(x, y, cs, en_and_grad, estimates, allval, cell, tomove, howmove, withs, see_all):
     """
@@ -148,24 +135,16 @@ def ts_estimates_in_int(x, y, cs, en_and_grad, estimates, allval, cell, tomove,
     __, trafo = cs
     ts_all, __ = esttsandmd(y,  en, gr, cs, see_all, estimates)
 
-    ts_estims = []
+    carts = []
     ts_places = []
-    for i, ts_one in enumerate(ts_all):
+    for ts_one in ts_all:
          __, est, __, __, __ = ts_one
          __, coords, __, __,s_ts,  __, __ = est
-         cart = trafo(coords)
-         if cell != None:
-             cart2 = list(cart)
-             expandlist(cart2, cell, tomove, howmove)
-             cart = np.array(cart2)
-
-         new_val = returnall(allval, cart, True, i)
-         if withs:
-             ts_estims.append([new_val[0]] + [s_ts] + new_val[1:])
-         else:
-             ts_estims.append(new_val)
+         carts.append(trafo(coords))
          ts_places.append(s_ts)
 
+    ts_estims = carts_to_int(carts, ts_places, allval, cell, tomove, howmove, withs)
+
     return ts_estims, ts_places
 
 
@@ -392,19 +371,22 @@ def carts_to_int(ys, xs, allval, cell, tomove, howmove, withs):
     exactly the beads which are used to create
     the frames
     """
-    beads = []
+    if len(ys) == 0:
+        return []
+
+    # all the frames at once:
+    carts = np.array(ys)
+    if cell is not None:
+        carts = expandarray(carts, cell, tomove, howmove)
 
-    for i,cart in enumerate(ys):
-         if cell != None:
-             cart2 = list(cart)
-             expandlist(cart2, cell, tomove, howmove)
-             cart = np.array(cart2)
+    values = returnmany(allval, carts, True)
 
-         new_val = returnall(allval, cart, True, i)
+    beads = []
+    for i, new_val in enumerate(values.tolist()):
          if withs:
-             beads.append([new_val[0]] + [xs[i]] + new_val[1:])
+             beads.append([i] + [xs[i]] + new_val)
          else:
-             beads.append(new_val)
+             beads.append([i] + new_val)
 
     return beads
 
@@ -435,6 +417,8 @@ def extract_data(filename, data_ase, other_input, values, ts_estimates, num, ite
     e_a_gr = None
     if ase:
         # Geos are in ASE readable files.
+        # needs ASE, import it only if it is really used:
+        from pts.ui.read_COS import read_geos_from_file_more
         atoms, y = read_geos_from_file_more([filename], format=format)
         obj =  atoms.get_chemical_symbols(), Pass_through()
         x = linspace(1, len(y))
@@ -649,24 +633,9 @@ def read_line_from_log(filename, whichline, num):
     calculations) and extracts a dataline of the coordinates whichline
     in the num's iteration
     """
-    file = open(filename, "r")
-    uninteresting = len(whichline.split())
-    rightnum = False
-    for line in file:
-        if line.startswith('Chain of States Summary'):
-            fields = line.split()
-            if str(num) in fields:
-                rightnum = True
-            else:
-                rightnum = False
-        if rightnum:
-              if line.startswith(whichline):
-                  fields = line.split()
-                  dataline = []
-                  datapoints = (len(fields) - uninteresting) / 2
-                  for i in range(datapoints):
-                      dataline.append(float(fields[uninteresting +1 +2 * i]))
-    return dataline
+    from pts.tools.logindex import log_index
+
+    return log_index(filename).line(whichline.strip(), num)
 
 
 if __name__ == "__main__":
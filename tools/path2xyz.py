@@ -56,6 +56,12 @@ Further options:
 
         abscissa data  can be  gotten from here.  String calcualations
         provide this data.
+
+    --align
+
+        superimposes every  frame onto  the previous one  (after the
+        transformation into Cartesians), thus overall  rotations and
+        translations of the molecule do not show up in the movie.
 """
 
 from pts.path import Path
@@ -122,16 +128,13 @@ def path_geos(x, y, cs, num):
 
     return path, xvals
 
-def print_xyz(x, y, cs, num):
+def print_xyz(x, y, cs, num, align=False):
     """
     prints num xyz -frames (jmol format) which are equally distributed
     on the x values of the path.   If num is not set, there will be as
     many frames as there have been geometries in y (but need not be at
     the same geometries)
     """
-    from pts.ui.write_COS import print_xyz_with_direction
-    from sys import stdout
-
     if num is None:
        num = len(y)
 
@@ -147,15 +150,18 @@ def print_xyz(x, y, cs, num):
     else:
         endx = float(x[-1])
 
+    coords = []
+    texts = []
     for i in range(num):
          # this is one of the frames,
          # the internal coordinates are converted
          # to Cartesian by the cs fake-Atoms object
-         text = "This is the %i'th frame" % (i+1)
-         coord = path1((endx / (num -1) * i))
-         print_xyz_with_direction(stdout.write, coord, cs, text = text)
+         texts.append("This is the %i'th frame" % (i+1))
+         coords.append(path1((endx / (num -1) * i)))
+
+    print_frames(coords, cs, texts, align)
 
-def print_beads(ys, cs):
+def print_beads(ys, cs, align=False):
     """
     Prints the xyz-  geoemtry in jmol format of  the beads.  This does
     exactly  the same  as above,  but without  the calculation  of the
@@ -163,13 +169,31 @@ def print_beads(ys, cs):
     positions is taken but also  that it's exactly the beads which are
     used to create the frames
     """
+    texts = ["This is the %i'th bead" % (i+1) for i in range(len(ys))]
+
+    print_frames(ys, cs, texts, align)
+
+def print_frames(coords, cs, texts, align=False):
+    """
+    Prints  the  geometries coords  (in  internal coordinates)  in jmol
+    format, if align is set  superimposed in Cartesians, each onto the
+    previous one.
+    """
     from pts.ui.write_COS import print_xyz_with_direction
     from sys import stdout
 
-    for i,y in enumerate(ys):
-         text = "This is the %i'th bead" % (i+1)
-         print_xyz_with_direction(stdout.write, y, cs, text = text)
+    symbols, trafo = cs
 
+    if align:
+        from pts.quat import align as superimpose
+
+        coords, __ = superimpose(None, map(trafo, coords), sequential=True)
+
+        # the frames are Cartesian already:
+        cs = (symbols, lambda c: c)
+
+    for text, coord in zip(texts, coords):
+         print_xyz_with_direction(stdout.write, coord, cs, text = text)
 
 def main(argv):
     """
@@ -211,9 +235,9 @@ def main(argv):
         mask, maskgeo )
 
     if beads:
-        print_beads(y, obj)
+        print_beads(y, obj, opts.align)
     else:
-        print_xyz(x, y, obj, num)
+        print_xyz(x, y, obj, num, opts.align)
 
 
 if __name__ == "__main__":
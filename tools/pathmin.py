@@ -22,9 +22,10 @@ give the arguments --method max to get the iteration with the lowest
 Can process several logfiles at once
 """
 from sys import argv, exit
-from pydoc import help
 from copy import copy
+from numpy import arange, newaxis, where, inf, nonzero, array
 from pts.ui.cmdline import get_options
+from pts.tools.logindex import log_index
 
 def main(argv):
     barrier = 10000000000000000.0
@@ -63,43 +64,38 @@ def searchmin(file, bar, arg, meth, out):
     where vi refers to the value of arg vor the i'th bead. as v1 and v-1 should
     be not changing, they are not considered
     """
-    fields = arg.split()
-    len_start = len(fields)
-    mini = -1
-    min_line = None
-    min_value = None
-    j = 1
-
-    # Make it a function
-    fun = eval(meth)
-
-    filein = open(file, "r")
-    # Filter the lines in the file
-    for line in filein:
-        if line.startswith('%s' % arg):
-            fields = line.split()
-            dataline = []
-            # Line holds first len_start strings with parts of arg
-            # Then followes :, then the values and separators are
-            # following alternately
-            datapoints = (len(fields) - len_start) / 2
-            for i in range(datapoints):
-                dataline.append(float(fields[len_start + 1 +2 * i]))
-
-            dataline = dataline[1:-1] # Do not use termination beads
-
-            if max(dataline) < bar:
-                if min_value == None:
-                    # First iteration is always minimal
-                    mini = j
-                    min_line = dataline
-                    min_value = fun(dataline)
-                else:
-                    if min_value > fun(dataline):
-                        mini = j
-                        min_line = dataline
-                        min_value = fun(dataline)
-            j += 1
+    # One row for every iteration:
+    index = log_index(file)
+    table = index.table(arg.strip())
+    counts = index.counts(arg.strip())
+
+    # Do not use termination beads. For the growing string the lines have
+    # different length, the padding NaNs (and the last bead in front of them)
+    # have to be masked out:
+    cols = arange(table.shape[1])
+    inner = (cols >= 1) & (cols < counts[:, newaxis] - 1)
+
+    maxs = where(inner, table, -inf).max(axis=1)
+    if meth == "sum":
+        values = where(inner, table, 0.0).sum(axis=1)
+    elif meth == "max":
+        values = maxs
+    else:
+        # Make it a function
+        fun = eval(meth)
+        values = array([fun(row[1:n-1].tolist()) for row, n in zip(table, counts)])
+
+    # First iteration with minimal value where all beads are below barrier:
+    ok = nonzero(maxs < bar)[0]
+    if len(ok) > 0:
+        i = ok[values[ok].argmin()]
+        mini = i + 1
+        min_line = table[i, 1:counts[i]-1].tolist()
+        min_value = values[i]
+    else:
+        mini = -1
+        min_line = None
+        min_value = None
 
     if out == "quick":
         print  mini, min_value, max(min_line), sum(min_line)
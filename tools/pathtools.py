@@ -20,11 +20,7 @@ import logging
 from pts.path import Path, Arc
 import numpy as np
 from pts.common import vector_angle
-import pts.func as func
-import scipy as sp
 from pts.threepointmin import ts_3p_gr
-from pts.ui.read_inputs import get_transformation
-from pts.ui.cmdline import get_mask
 from pts.cfunc import Cartesian, Masked
 from numpy import loadtxt
 
@@ -123,7 +119,7 @@ class PathTools:
         self.state = np.array(state).reshape(self.n, -1)
         self.energies = np.array(energies)
 
-        if gradients != None:
+        if gradients is not None:
             self.gradients = np.array(gradients).reshape(self.n, -1)
             assert self.state.shape == self.gradients.shape
 
@@ -138,7 +134,7 @@ class PathTools:
             x_ = self.state[i-1]
             self.cart_lengths[i] = np.linalg.norm(x -x_) + self.cart_lengths[i-1]
 
-        if steps == None:
+        if steps is None:
             self.steps = self.cart_lengths.copy()
         else:
             assert len(steps) == self.n
@@ -164,22 +160,10 @@ class PathTools:
         # coordinates as a function of a path parameter s
         self.xs = Path(self.state, self.steps)
 
-        # Check to see whether spline path length is comparable to Pythagorean one.
-        # TODO: ideally, self.steps should be updated so that it's self 
-        # consistent with the steps generated by the Path object, but at 
-        # present, calculation of string length is too slow, so it's only done 
-        # once and a simple comaprison is made.
-        diff = lambda a,b:np.abs(a-b)
-
-        # arc(t) computes the length of the path xs(t) from t=0:
-        arc = Arc(self.xs)
-        self.lengths = np.array([arc(x) for x in self.steps])
-#        print "self.lengths", self.lengths
-#        print "self.cart_lengths", self.cart_lengths
-        self.s.append("Path length: %s" % self.lengths[-1])
-        err = self.lengths - self.steps
-        err = [diff(err[i], err[i-1]) for i in range(1, len(err))] # why have I redefined err like this?
-        self.s.append("Difference between Pythag v.s. spline positions: %s" % np.array(err).round(4))
+        # The spline path  length is only needed for the  output and for
+        # plotting,  integrating  it  is  by  far  the  most  expensive
+        # part here. It is done on first use, see lengths below.
+        self._lengths = None
 
         # There have been some problems with the calculation of the slope along the path
         # This calculates it via an alternate method
@@ -199,8 +183,39 @@ class PathTools:
                 self.para_forces_fd.append(tmp)
                 self.dEds_all[i] = tmp
 
+    @property
+    def lengths(self):
+        """
+        Length of the spline path xs(t) from t=0 to each of the beads.
+        """
+        if self._lengths is None:
+            # arc(t) computes the length of the path xs(t) from t=0:
+            arc = Arc(self.xs)
+            self._lengths = np.array([arc(x) for x in self.steps])
+        return self._lengths
+
     def __str__(self):
-        return '\n'.join(self.s)
+        # Check to see whether spline path length is comparable to Pythagorean one.
+        # TODO: ideally, self.steps should be updated so that it's self 
+        # consistent with the steps generated by the Path object, but at 
+        # present, calculation of string length is too slow, so it's only done 
+        # once and a simple comaprison is made.
+        diff = lambda a,b:np.abs(a-b)
+
+        lengths = self.lengths
+        err = lengths - self.steps
+        err = [diff(err[i], err[i-1]) for i in range(1, len(err))] # why have I redefined err like this?
+        s = self.s[:1] + ["Path length: %s" % lengths[-1],
+                          "Difference between Pythag v.s. spline positions: %s" % np.array(err).round(4)] + self.s[1:]
+        return '\n'.join(s)
+
+    def path_slopes(self):
+        """
+        Energy derivatives  dE/ds along the (spline) path at  all the beads,
+        from the gradients and the path tangents.
+        """
+        dxds = np.array([self.xs.fprime(s) for s in self.steps])
+        return path_slopes(self.gradients, dxds)
 
     def projections(self):
 
@@ -287,7 +302,8 @@ class PathTools:
                 #print "ts_spl: TS in %f %f" % (s0,s1)
                 f = lambda x: np.atleast_1d(E.fprime(x)**2)[0]
                 assert s0 < s1, "%f %f" % (s0, s1)
-                s_ts, fval, ierr, numfunc = sp.optimize.fminbound(f, s0, s1, full_output=1)
+                from scipy.optimize import fminbound
+                s_ts, fval, ierr, numfunc = fminbound(f, s0, s1, full_output=1)
 
                 # FIXME: a bit dodgy
                 assert fval < 0.001
@@ -317,40 +333,20 @@ class PathTools:
         for s, e in zip(ss, Es):
             self.plot_str += "%f\t%f\n" % (s, e)
 
-       
-        ts_list = []
-
-        for i in range(self.n)[1:]:#-1]:
-            # For each pair of points along the path, find the minimum
-            # energy and check that the gradient is also zero.
-            E_0 = Es[i-1]
-            E_1 = Es[i]
-
-            s0 = ss[i-1]
-            s1 = ss[i]
-            
-            dEdx_0 = self.gradients[i-1]
-            dEdx_1 = self.gradients[i]
-            dxds_0 = self.xs.fprime(ss[i-1])
-            dxds_1 = self.xs.fprime(ss[i])
-
-            #energy gradient at "left/right" bead along path
-            dEds_0 = np.dot(dEdx_0, dxds_0)
-            dEds_1 = np.dot(dEdx_1, dxds_1)
 
-            if self.use_energy_based_dEds_calc:
-                dEds_0 = self.dEds_all[i-1]
-                dEds_1 = self.dEds_all[i]
+        # energy gradient at all the beads along path
+        if self.use_energy_based_dEds_calc:
+            dEdss = self.dEds_all
+        else:
+            dEdss = self.path_slopes()
 
-            dEdss = np.array([dEds_0, dEds_1])
+        self.s.append("Es_1 %s" % Es[1:])
 
-            self.s.append("E_1 %s" % E_1)
-            if (E_1 >= E_0 and dEds_1 <= 0) or (E_1 <= E_0 and dEds_0 > 0):
-                #print "ts_splcub_avg: TS in %f %f" % (ss[i-1],ss[i])
+        found, E_ts, s_ts = ts_average(ss, Es, dEdss)
 
-                E_ts = (E_1 + E_0) / 2
-                s_ts = (s1 + s0) / 2
-                ts_list.append((E_ts, self.xs(s_ts), s0, s1, s_ts, i-1, i))
+        ts_list = []
+        for i in np.nonzero(found)[0] + 1:
+            ts_list.append((E_ts[i-1], self.xs(s_ts[i-1]), ss[i-1], ss[i], s_ts[i-1], i-1, i))
 
         ts_list.sort()
         return ts_list
@@ -409,72 +405,34 @@ class PathTools:
         # coordinates as a function of a path parameter s
 
         
-        ts_list = []
+        # energy gradient at all the beads along path
+        dEdss = self.path_slopes()
+
+        # debugging
+        dEdss_ = np.array([np.dot(g, t) for g, t in zip(self.gradients, self.non_spl_grads)])
+
+        self.para_forces = list(dEdss[1:])
+
+        if self.use_energy_based_dEds_calc:
+            dEdss = self.dEds_all
+
+        lg.debug("dEdss = %s" % (dEdss,))
+
+        self.s.append("Es_1 %s" % Es[1:])
+        self.s.append("Checking: dEdss = %s" % dEdss)
+        self.s.append("Non-spline dEdss = %s" % dEdss_)
+
+        # The  maxima  of   the  cubic  polynomials  defined  by  the
+        # value/slope  of the energy  for pairs  of points  along the
+        # path, all the intervals at once:
+        found, E_ts, s_ts = ts_cubic(ss, Es, dEdss)
 
-        self.para_forces = []
-
-              
-        for i in range(self.n)[1:]:#-1]:
-            # For each pair of points along the path, find the minimum
-            # energy and check that the gradient is also zero.
-            E_0 = Es[i-1]
-            E_1 = Es[i]
-            dEdx_0 = self.gradients[i-1]
-            dEdx_1 = self.gradients[i]
-            dxds_0 = self.xs.fprime(ss[i-1])
-            dxds_1 = self.xs.fprime(ss[i])
-
-            # energy gradient at "left/right" bead along path
-            dEds_0 = np.dot(dEdx_0, dxds_0)
-            dEds_1 = np.dot(dEdx_1, dxds_1)
-            
-            # debugging
-            dEds_0_ = np.dot(dEdx_0, self.non_spl_grads[i-1])
-            dEds_1_ = np.dot(dEdx_1, self.non_spl_grads[i])
-
-            self.para_forces.append(dEds_1)
-
-            if self.use_energy_based_dEds_calc:
-                dEds_0 = self.dEds_all[i-1]
-                dEds_1 = self.dEds_all[i]
-            dEdss = np.array([dEds_0, dEds_1])
-
-            lg.debug("dEdss(%d) = %s" % (i, dEdss))
-
-            self.s.append("E_1 %s" % E_1)
-            self.s.append("Checking: i = %d E_1 = %f E_0 = %f dEds_1 = %f dEds_0 = %f" % (i, E_1, E_0, dEds_1, dEds_0))
-            self.s.append("Non-spline dEds_1 = %f dEds_0 = %f" % (dEds_1_, dEds_0_))
-
-            if (E_1 >= E_0 and dEds_1 <= 0) or (E_1 <= E_0 and dEds_0 > 0):
-                #print "ts_splcub: TS in %f %f" % (ss[i-1],ss[i])
-                self.s.append("Found")
-
-                cub = func.CubicFunc(ss[i-1:i+1], Es[i-1:i+1], dEdss)
-#                print ss[i-2:i+1], Es[i-2:i+1]
-#                print ss, Es
-#                print i
-#                if i < 2:
-#                    continue
-#                cub = func.QuadFunc(ss[i-2:i+1], Es[i-2:i+1])
-#                print ss[i], cub(ss[i]), Es[i]
-                self.s.append("ss[i-1:i+1]: %s" % ss[i-1:i+1])
-
-                self.s.append("cub: %s" % cub)
-
-                # find the stationary points of the cubic
-                statpts = cub.stat_points()
-                self.s.append("statpts: %s" % statpts)
-                assert statpts != []
-                found = 0
-                for p in statpts:
-                    # test curvature
-                    if cub.fprimeprime(p) < 0:
-                        ts_list.append((cub(p), self.xs(p), ss[i-1], ss[i], p, i-1, i))
-                        found += 1
-
-#                assert found == 1, "Must be exactly 1 stationary points in cubic path segment but there were %d" % found
-
-                self.plot_str += "\n\n%f\t%f\n" % (p, cub(p))
+        ts_list = []
+        for i in np.nonzero(found)[0] + 1:
+            self.s.append("Found: ss[i-1:i+1]: %s" % ss[i-1:i+1])
+            p = s_ts[i-1]
+            ts_list.append((E_ts[i-1], self.xs(p), ss[i-1], ss[i], p, i-1, i))
+            self.plot_str += "\n\n%f\t%f\n" % (p, E_ts[i-1])
 
         ts_list.sort()
         return ts_list
@@ -517,6 +475,143 @@ class PathTools:
 
         return ts_list
 
+def path_slopes(gradients, tangents):
+    """
+    Energy derivatives along the path  for stacks of (..., beads, dim)
+    gradients and path tangents:
+
+    >>> path_slopes([[[1., 0.], [0., 1.]]], [[[2., 0.], [1., 1.]]])
+    array([[ 2.,  1.]])
+    """
+    gradients = np.asarray(gradients)
+    return np.einsum('...i,...i->...', gradients, np.asarray(tangents).reshape(gradients.shape))
+
+def _brackets_ts(Es, dEdss):
+    """
+    The  intervals  between   neighbouring  beads  which  may  hold  a
+    transition state: energy goes up  and comes down at the right end,
+    or it goes down but started upwards at the left end.
+    """
+    E_0, E_1 = Es[..., :-1], Es[..., 1:]
+    dEds_0, dEds_1 = dEdss[..., :-1], dEdss[..., 1:]
+    return ((E_1 >= E_0) & (dEds_1 <= 0)) | ((E_1 <= E_0) & (dEds_0 > 0))
+
+def ts_average(ss, Es, dEdss):
+    """
+    Batched version  of PathTools.ts_splavg: all  arguments are arrays of
+    shape  (..., beads), e.g.   (iterations, beads) for a  whole history.
+    Returns a mask of the  intervals holding a TS estimate, the energies
+    and the abscissas of the estimates, each of shape (..., beads - 1):
+
+    >>> found, E, s = ts_average([0., 1., 2.], [0., 2., 1.], [1., 1., -1.])
+    >>> found
+    array([False,  True], dtype=bool)
+    >>> E[found], s[found]
+    (array([ 1.5]), array([ 1.5]))
+    """
+    ss, Es, dEdss = map(np.asarray, (ss, Es, dEdss))
+
+    found = _brackets_ts(Es, dEdss)
+    E_ts = (Es[..., 1:] + Es[..., :-1]) / 2
+    s_ts = (ss[..., 1:] + ss[..., :-1]) / 2
+
+    return found, E_ts, s_ts
+
+def ts_cubic(ss, Es, dEdss):
+    """
+    Batched version  of PathTools.ts_splcub: all  arguments are arrays of
+    shape  (..., beads), e.g.   (iterations,  beads) for  a whole
+    history.  For every interval  between neighbouring beads the cubic
+    polynomial  with the  energies and  slopes of  the two  beads  at its
+    ends is  built and its  maximum (if any)  is taken as TS estimate.
+    Returns a mask of the intervals holding a TS estimate, the energies
+    and the abscissas of the estimates, each of shape (..., beads - 1).
+
+    This is the same as func.CubicFunc would give:
+
+    >>> import pts.func as func
+    >>> c = func.CubicFunc([1., 2.], [1., 3.], [3., -2.])
+    >>> [(p, c(p)) for p in c.stat_points() if c.fprimeprime(p) < 0]
+    [(1.8408627069811137, 3.1530921419566269)]
+
+    >>> found, E, s = ts_cubic([[1., 2.]], [[1., 3.]], [[3., -2.]])
+    >>> found
+    array([[ True]], dtype=bool)
+    >>> s, E
+    (array([[ 1.84086271]]), array([[ 3.15309214]]))
+
+    Stacks of several paths (here two "iterations") are done at once:
+
+    >>> ss = [[0., 1., 2., 3.], [0., 1., 2., 3.]]
+    >>> Es = [[0., 1., 2., 0.], [0., 2., 1., 0.]]
+    >>> dEdss = [[1., 1., 0., -1.], [1., 1., -1., -1.]]
+    >>> found, E, s = ts_cubic(ss, Es, dEdss)
+    >>> found
+    array([[False,  True, False],
+           [False,  True, False]], dtype=bool)
+    >>> np.round(s[found], 4)
+    array([ 2.    ,  1.1396])
+    """
+    ss, Es, dEdss = map(np.asarray, (ss, Es, dEdss))
+
+    s_0 = ss[..., :-1]
+    E_0 = Es[..., :-1]
+    dEds_0 = dEdss[..., :-1]
+    h = ss[..., 1:] - s_0
+    dE = Es[..., 1:] - E_0
+    dEds_1 = dEdss[..., 1:]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # E(s_0 + t) = E_0 + dEds_0 * t + c2 * t**2 + c3 * t**3
+        c2 = (3 * dE / h - 2 * dEds_0 - dEds_1) / h
+        c3 = (dEds_0 + dEds_1 - 2 * dE / h) / h**2
+
+        # The derivative dEds_0 + 2 * c2 * t + 3 * c3 * t**2 has real roots
+        # for  q**2 >= 0, the  second derivative  at the  roots is +/- 2 q,
+        # thus the maximum needs q > 0. Which of the two forms of the root
+        # is  used decides the sign  of c2, this  avoids precision loss as
+        # well as division by zero in the (nearly) quadratic case:
+        q2 = c2**2 - 3 * c3 * dEds_0
+        q = np.sqrt(np.where(q2 > 0, q2, 0.))
+        t = np.where(c2 <= 0, dEds_0 / (q - c2), -(c2 + q) / (3 * c3))
+        E_ts = E_0 + t * (dEds_0 + t * (c2 + t * c3))
+
+    found = _brackets_ts(Es, dEdss) & (q2 > 0) & np.isfinite(t) & np.isfinite(E_ts)
+
+    return found, E_ts, s_0 + t
+
+def ts_estims(pts, kernel=ts_cubic):
+    """
+    TS estimates of kernel (ts_cubic or ts_average) for a sequence of
+    PathTools with the same  number of beads,  e.g.  all iterations of
+    an  optimisation  history, in a single call  of the kernel.  Gives
+    for every path the list PathTools.ts_splcub (or ts_splavg) gives:
+
+    >>> xs = (np.arange(6) - 2.6) / 2.0
+    >>> pt1 = PathTools(xs, -xs**2, -2 * xs)
+    >>> pt2 = PathTools(xs, -xs**2 + xs**3, -2 * xs + 3 * xs**2)
+    >>> cubic = ts_estims([pt1, pt2])
+    >>> cubic == [pt1.ts_splcub(), pt2.ts_splcub()]
+    True
+    >>> ts_estims([pt1, pt2], ts_average) == [pt1.ts_splavg(), pt2.ts_splavg()]
+    True
+    """
+    ss = np.array([pt.steps for pt in pts])
+    Es = np.array([pt.energies for pt in pts])
+    dEdss = np.array([pt.dEds_all if pt.use_energy_based_dEds_calc else pt.path_slopes()
+                      for pt in pts])
+
+    found, E_ts, s_ts = kernel(ss, Es, dEdss)
+
+    estims = []
+    for pt, found_1, E_1, s_1 in zip(pts, found, E_ts, s_ts):
+        ts_list = [(E_1[i-1], pt.xs(s_1[i-1]), pt.steps[i-1], pt.steps[i], s_1[i-1], i-1, i)
+                   for i in np.nonzero(found_1)[0] + 1]
+        ts_list.sort()
+        estims.append(ts_list)
+
+    return estims
+
 from copy import deepcopy, copy
 from pickle import load, dump
 
@@ -594,6 +689,10 @@ def read_path_fix(symbfile, zmatifiles = None, maskfile = None, maskedgeo = None
     f.close()
     symbols = sr.split()
 
+    # These  need  ASE, reading  pickled  paths  does not,  thus import
+    # them only here:
+    from pts.ui.read_inputs import get_transformation
+    from pts.ui.cmdline import get_mask
 
     if len(zmatifiles)==0:
         trafo = Cartesian()
@@ -10,12 +10,12 @@ error between various estimates of the transition state and the real transition
 
 import sys
 import getopt
-from pts.tools.pathtools import unpickle_path
+from pts.tools.pathtools import unpickle_path, PathTools, gnuplot_path
+from pts.tools.pathtools import ts_estims, ts_cubic, ts_average
 
 import numpy as np
 from ase.io import read
 
-import pts
 import pts.tools.rotate as rot
 from pts.common import file2str, rms
 
@@ -98,26 +98,34 @@ def main(argv):
             s = '\n'.join(['%.2f' % e for e in es])
             print s
 
-        pt = pts.tools.PathTools(state, es, gradients=gs)
+        pt = PathTools(state, es, gradients=gs)
 
         if gnuplot_out:
-            pts.tools.gnuplot_path(pt, fn_pickle)
+            gnuplot_path(pt, fn_pickle)
 
-        methods = {'Spling and cubic': pt.ts_splcub,
+        if forces:
+            disp_forces(pt)
+
+        # the  estimates from  the interval  cubics and averages  for both
+        # parametrisations of the path at once:
+        paths = [pt]
+        if ss is not None:
+            paths.append(PathTools(state, es, gs, ss))
+        cubic = ts_estims(paths, ts_cubic)
+        average = ts_estims(paths, ts_average)
+
+        methods = {'Spling and cubic': lambda: cubic[0],
                    'Highest': pt.ts_highest,
                    'Spline only': pt.ts_spl,
-                   'Spline and average': pt.ts_splavg,
+                   'Spline and average': lambda: average[0],
                    'Bell Method': pt.ts_bell
                   }
 
-        if forces:
-            disp_forces(pt)
-
-        if ss != None:
-            pt2 = pts.tools.PathTools(state, es, gs, ss)
+        if ss is not None:
+            pt2 = paths[1]
             methods2 = {'Spline only (with abscissa)': pt2.ts_spl,
-                        'Spline and average (with abscissa)': pt2.ts_splavg,
-                        'Spline and cubic (with abscissa)': pt2.ts_splcub
+                        'Spline and average (with abscissa)': lambda: average[1],
+                        'Spline and cubic (with abscissa)': lambda: cubic[1]
                        }
             methods.update(methods2)
 
@@ -44,12 +44,11 @@ from textwrap import fill
 
 from numpy import cos, sin, array, hstack, dot, sqrt, zeros
 from numpy.linalg import norm
-import scipy.optimize as opt
 import numpy as np
 
 import ase
 
-from pts.quat import rotmat
+from pts.quat import rotmat, rot2quat, quat2vec, kabsch, align
 
 # for testing
 big_xyz = array([ 0.0367588 ,  0.00844124,  0.03564942,  1.0701481 ,  0.57181922,
@@ -220,17 +219,7 @@ class Rotate:
         shift = v[:3] # displacement
         imq   = v[3:] # imag_quaternion
 
-        mat = rotmat(imq)
-
-        g_moved = []
-        for g in geom:
-            g_ = dot(mat, g)
-            g_ += shift
-            g_moved.append(g_)
-
-        g_moved = array(g_moved)
-
-        return g_moved
+        return dot(geom, rotmat(imq).T) + shift
 
     def diff(self, x):
         """Calculates the summed squared differences between geometries g1 
@@ -239,40 +228,24 @@ class Rotate:
         g2_rot = self.trans(self.g2, x)
         diff = (self.g1 - g2_rot)**2
 
-        diff.shape = (-1, 3)
-        diff = array([d.sum()**(0.5) for d in diff])
-
-        s = sum(diff.flatten()) / diff.size
-        return s
+        return sqrt(diff.sum(axis=1)).mean()
 
     def align(self, x0 = None):
-        
-        if x0 == None:
-            x0 = array([0., 0, 0, 0, 0, 0.001])
-
-#        prev = self.g2.copy()
-#        its = 0
-#        while True:
-#            its += 1
-        x, fopt, gopt, Hopt, func_calls, grad_calls, warnflag = \
-            opt.fmin_bfgs(self.diff, 
-                x0, 
-                gtol=1e-4, 
-                full_output=1, 
-                disp=0) 
-
-#        print "gopt",gopt
-        aligned = self.trans(self.g2, x)
-#            if abs(prev - aligned).max() < 1e-4 or its > 4:
-#                break
-#            prev = aligned.copy()
+        """Closed form (Kabsch) superposition of g2 onto g1, x0 is not
+        needed any more but kept for compatibility. There is nothing to
+        converge, the flag returned is always 0."""
+
+        R, t = kabsch(self.g1, [self.g2])
+        x = hstack((t[0], quat2vec(rot2quat(R[0]))))
 
-        assert (self.diff(x) == fopt).all()
-        return x, self.diff(x), aligned, warnflag
+        aligned = self.trans(self.g2, x)
+        return x, self.diff(x), aligned, 0
 
 def cart_diff(c0, c1):
     """Returns the average difference in atom positions for two sets of
-    cartesian coordinates.
+    cartesian coordinates after the  best superposition, and the maximal
+    displacement of an atom of c1 needed for it. c1 may also be a stack
+    of geometries, then both are arrays.
 
     No transformation at all:
 
@@ -304,25 +277,29 @@ def cart_diff(c0, c1):
     >>> errors.sum()
     0.0
 
+    A whole stack of geometries is compared in one go:
+
+    >>> errors, changes = cart_diff(g1, altered)
+    >>> errors.shape
+    (10,)
+    >>> errors.max() < 1e-10
+    True
+    """
+    c0 = array(c0, dtype=float).reshape(-1, 3)
+    c1 = array(c1, dtype=float)
 
+    single = (c1.ndim < 3)
+    c1 = c1.reshape(-1, len(c0), 3)
 
+    new, __ = align(c0, c1)
 
-    """
-    # Loop: for some reason complete allignment is not achieved
-    # after only a single optimisation run.
-    its = 0
-    changes = []
-    while True:
-        r = Rotate(c0, c1)
-        vars, err, new, warn = r.align()
-        its += 1
-        change = abs(c1-new).max()
-        changes.append(changes)
-        if warn == 0 or its > 10 or change < 1e-3:
-            break
-        c1 = new.copy()
+    err = sqrt(((c0 - new)**2).sum(axis=2)).mean(axis=1)
+    changes = abs(c1 - new).max(axis=2).max(axis=1)
+
+    if single:
+        return err[0], [changes[0]]
     return err, changes
-    
+
 
 # Testing the examples in __doc__strings, execute
 # "python gxmatrix.py", eventualy with "-v" option appended:
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Start up time of the paratools subcommands.
+
+Tools like "paratools table" or "paratools xyz" are called many times
+from analysis scripts, for them the time  to import the modules can be
+larger than the time for the actual work.  ASE and SciPy are the most
+expensive imports,  the  modules behind these lightweight  subcommands
+should not need them at import time:
+
+    >>> heavy_imports("pts.tools.path2tab")
+    []
+    >>> heavy_imports("pts.tools.dimer2xyz")
+    []
+    >>> heavy_imports("pts.tools.findlimitpath")
+    []
+
+The package itself is cheap to import as well:
+
+    >>> heavy_imports("pts")
+    []
+
+Usage:
+
+    python startup.py [--repeat N] [MODULE ...]
+
+prints for every MODULE (default: the modules of all the subcommands
+in bin/paratools) the  minimal wall time of  N (default 5) fresh
+interpreters importing it and the heavy packages it pulls in.  The
+first line is the time of the interpreter doing nothing, for reference.
+"""
+
+import sys
+from subprocess import Popen, PIPE
+from time import time
+
+__all__ = ["heavy_imports", "import_time"]
+
+# Packages which are expensive to import:
+HEAVY = ("ase", "scipy", "matplotlib", "pylab", "Gnuplot")
+
+# Modules behind the subcommands of bin/paratools:
+SUBCOMMANDS = [
+    "pts.tools.path2tab",
+    "pts.tools.path2xyz",
+    "pts.tools.dimer2xyz",
+    "pts.tools.findlimitpath",
+    "pts.tools.pathmin",
+    "pts.tools.tsestandmods",
+    "pts.tools.path2plot",
+    "pts.tools.dimer2plot",
+    "pts.tools.compare_geos",
+    "pts.tools.makepath",
+    "pts.path_searcher",
+    "pts.dimer",
+    "pts.simple_qn",
+    "pts.vib",
+    ]
+
+SCRIPT = """
+import sys
+import %s
+print sorted(set(k.split(".")[0] for k, v in sys.modules.items() if v is not None))
+"""
+
+def _run(module):
+    """
+    Imports module in a fresh interpreter, returns the wall time and the
+    top level packages loaded afterwards.
+    """
+    if module is None:
+        script = SCRIPT % "sys"
+    else:
+        script = SCRIPT % module
+
+    start = time()
+    proc = Popen([sys.executable, "-c", script], stdout=PIPE)
+    out, __ = proc.communicate()
+    end = time()
+
+    assert proc.returncode == 0, "importing %s failed" % module
+
+    return end - start, eval(out)
+
+def heavy_imports(module):
+    """
+    Expensive packages loaded by importing module.
+    """
+    __, packages = _run(module)
+    return [p for p in packages if p in HEAVY]
+
+def import_time(module, repeat=5):
+    """
+    Minimal wall time of repeat fresh interpreters importing module.
+    """
+    return min(_run(module)[0] for i in range(repeat))
+
+def main(argv):
+    repeat = 5
+    if len(argv) > 1 and argv[0] == "--repeat":
+        repeat = int(argv[1])
+        argv = argv[2:]
+
+    if "--help" in argv:
+        print __doc__
+        sys.exit()
+
+    modules = argv or SUBCOMMANDS
+
+    print "%-30s %8.3f s" % ("(python)", import_time(None, repeat))
+    for module in modules:
+        print "%-30s %8.3f s  %s" % (module, import_time(module, repeat), " ".join(heavy_imports(module)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
@@ -5,11 +5,11 @@ from numpy.linalg import norm
 
 from pts.tools.pathtools import PathTools, unpickle_path
 from pts.tools.pathtools import read_path_fix, read_path_coords
+from pts.tools.pathtools import ts_estims, ts_cubic, ts_average
 from pts.searcher import new_abscissa
 from pts.path import Path
 from pts.common import make_like_atoms
 import numpy as np
-from pydoc import help
 from os import path, mkdir, chdir, getcwd, system
 import pts.metric as mt
 
@@ -206,14 +206,14 @@ def estfrompathfirst(pt, cs, addtoname, which, see_all):
         elif len(ts_int) > 0:
             ts_est.append(('Spline only',ts_int[-1]))
     if 3 in which:
-        ts_int = pt.ts_splavg()
+        ts_int, = ts_estims([pt], ts_average)
         if see_all:
             for ts_int_1 in ts_int:
                 ts_est.append(('Spline and average', ts_int_1))
         elif len(ts_int) > 0:
              ts_est.append(('Spline and average', ts_int[-1]))
     if 4 in which:
-        ts_int = pt.ts_splcub()
+        ts_int, = ts_estims([pt], ts_cubic)
         if see_all:
             for ts_int_1 in ts_int:
                 ts_est.append(('Spling and cubic', ts_int_1))
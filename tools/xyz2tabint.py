@@ -168,16 +168,13 @@ def main(argv):
         write("\n")
         __, geom = read_geos_from_file_more([filename], None)
 
-        for geo in geom:
-           positionslist = list(geo)
-           # expand number of atoms if some of different cells are wanted
-           if (expand): expandlist(positionslist, cell, tomove, howmove)
-           # make an array of the positions
-           positions = np.array(positionslist)
-           #print positions
-           # the actual writing of the programm
-           results = returnall(allval, positions, deg, loop)
-           writeall(write, results, loop)
+        # all the geometries of the file are handled at once:
+        positions = np.array(geom)
+        # expand number of atoms if some of different cells are wanted
+        if (expand): positions = expandarray(positions, cell, tomove, howmove)
+        # the actual writing of the programm
+        for results in returnmany(allval, positions, deg):
+           writeall(write, [loop] + results.tolist(), loop)
            loop += 1
 
 def writeall(write, results, loop):
@@ -188,25 +185,54 @@ def writeall(write, results, loop):
 
 def returnall(allval, positions, deg, loop):
       results = [loop]
-      for value in allval:
-           order, partners = value
-           # loop over all wanted values, order of them says how to calculate
-           if order == 2:
-               results.append( radii(positions, partners))
-           elif order == 3 or order == 4 :
-               results.append( angle(positions, partners, deg))
-           elif order == 5 :
-               results.append( dihedral(positions, partners, deg))
-           elif order == 6 :
-               results.append( distancetoplane(positions, partners))
-           elif order == 7 :
-               results.append( distancetoline(positions, partners))
-           elif order == 8 :
-               a, b = projected_positions_on_plane(positions, partners)
-               results.append(a)
-               results.append(b)
+      results.extend(returnmany(allval, positions, deg).tolist())
       return results
 
+def returnmany(allval, positions, deg):
+    """
+    Computes all  the values of  allval for positions in  one go.  The
+    positions may be either a  single geometry (atoms, 3) or a stack of
+    them (frames, atoms,  3), the result has then shape  (values,) or
+    (frames, values) respectively:
+
+    >>> pos = np.array([[[0., 0., 0.], [1., 0., 0.], [1., 1., 0.], [1., 1., 1.]],
+    ...                 [[0., 0., 0.], [2., 0., 0.], [2., 2., 0.], [2., 2., -2.]]])
+    >>> allval = [(2, [1, 2]), (3, [1, 2, 3]), (5, [1, 2, 3, 4]), (6, [4, 1, 2, 3])]
+    >>> returnmany(allval, pos, True)
+    array([[  1.,  90., -90.,   1.],
+           [  2.,  90.,  90.,  -2.]])
+
+    >>> returnmany(allval, pos[1], True)
+    array([  2.,  90.,  90.,  -2.])
+
+    Each frame gives the same as a single geometry would:
+
+    >>> all(returnmany(allval, pos, False)[0] == returnmany(allval, pos[0], False))
+    True
+    """
+    positions = np.asarray(positions)
+    results = []
+    for value in allval:
+         order, partners = value
+         # loop over all wanted values, order of them says how to calculate
+         if order == 2:
+             results.append( radii(positions, partners))
+         elif order == 3 or order == 4 :
+             results.append( angle(positions, partners, deg))
+         elif order == 5 :
+             results.append( dihedral(positions, partners, deg))
+         elif order == 6 :
+             results.append( distancetoplane(positions, partners))
+         elif order == 7 :
+             results.append( distancetoline(positions, partners))
+         elif order == 8 :
+             a, b = projected_positions_on_plane(positions, partners)
+             results.append(a)
+             results.append(b)
+    if results == []:
+        return np.zeros(positions.shape[:-2] + (0,))
+    # values are always the last axis:
+    return np.array(results).T
 
 def expandlist(positionslist, cell, tomove, howmove):
       # expand list of atoms with atom[num] from cell howmove with given cell is 0
@@ -217,19 +243,48 @@ def expandlist(positionslist, cell, tomove, howmove):
            #print positionslist[new-1] , pos
            positionslist.append(pos)
 
+def expandarray(positions, cell, tomove, howmove):
+    """
+    Same as  expandlist but for arrays  of shape (atoms, 3)  or (frames,
+    atoms, 3), the shifted atoms of all frames are added at once:
+
+    >>> cell = np.eye(3) * 10.
+    >>> pos = np.zeros((2, 2, 3))
+    >>> expandarray(pos, cell, [2], [[1., 0., -1.]])[:, 2]
+    array([[ 10.,   0., -10.],
+           [ 10.,   0., -10.]])
+    """
+    positions = np.asarray(positions)
+    tomove = np.asarray(tomove, dtype=int) - 1
+    shifts = np.dot(howmove, cell)
+    return np.concatenate((positions, positions[..., tomove, :] + shifts), axis=-2)
+
+# The functions below work on single geometries (atoms, 3) as well as on
+# stacks of them (frames, atoms, 3), vectors are always in the last axis.
+
+def _dot(a, b):
+    return (a * b).sum(axis=-1)
+
+def _clip(x):
+    # Rounding errors may bring the cosine slightly out of [-1, 1]:
+    x = np.where((x > 1.0) & (x < 1.0 + SMALL), 1.0, x)
+    x = np.where((x < -1.0) & (x > -1.0 - SMALL), -1.0, x)
+    return x
 
 def radii (positions, iconns):
     # distance between two atoms
+    positions = np.asarray(positions)
     a = iconns[0] - 1
     b = iconns[1] - 1
-    diff = positions[a]-positions[b]
-    rad = np.sqrt(np.vdot(diff,diff))
+    diff = positions[..., a, :] - positions[..., b, :]
+    rad = np.sqrt(_dot(diff, diff))
     return rad
 
 def angle (positions, iconns, deg):
     # angle between two (difference) vectors
     # if the middle atom is the same, case else
     # takes care of it
+    positions = np.asarray(positions)
     if len(iconns) == 4:
          a = iconns[0] - 1
          b = iconns[1] - 1
@@ -240,37 +295,33 @@ def angle (positions, iconns, deg):
          b = iconns[1] - 1
          c = iconns[1] - 1
          f = iconns[2] - 1
-    d1 = positions[a] - positions[b]
-    d2 = positions[f] - positions[c]
-    db1  = math.sqrt( np.vdot(d1, d1) )
-    db2  = math.sqrt( np.vdot(d2, d2) )
-    x =  np.vdot(d1, d2) / (db1 * db2)
-    if  x > 1.0 and x < 1.0 + SMALL : x = 1.0
-    if  x < -1.0 and x > -1.0 - SMALL :  x = -1.0
+    d1 = positions[..., a, :] - positions[..., b, :]
+    d2 = positions[..., f, :] - positions[..., c, :]
+    db1  = np.sqrt( _dot(d1, d1) )
+    db2  = np.sqrt( _dot(d2, d2) )
+    x = _clip(_dot(d1, d2) / (db1 * db2))
     alpha = np.arccos(x)
     if deg: alpha *= 180 / math.pi
     return alpha
 
 def dihedral (positions, iconns, deg ):
     # dihedral angle
+    positions = np.asarray(positions)
     a = iconns[0] - 1
     b = iconns[1] - 1
     c = iconns[2] - 1
     f = iconns[3] - 1
-    d1 = positions[b] - positions[a]
-    d2 = positions[c] - positions[b]
-    d3 = positions[f] - positions[c]
+    d1 = positions[..., b, :] - positions[..., a, :]
+    d2 = positions[..., c, :] - positions[..., b, :]
+    d3 = positions[..., f, :] - positions[..., c, :]
     e1 = np.cross(d1, d2)
     e2 = np.cross(d2, d3)
-    eb1 = math.sqrt(np.vdot(e1, e1))
-    eb2 = math.sqrt(np.vdot(e2, e2))
-    e1 /= eb1
-    e2 /= eb2
-    x = np.vdot (e1, e2)
-    if  x > 1.0 and x < 1.0 + SMALL : x = 1.0
-    if  x < -1.0 and x > -1.0 - SMALL :  x = -1.0
-    vor = 1.0
-    if ( np.vdot( np.cross(d1, d3), d2) < 0): vor = -1.0
+    eb1 = np.sqrt(_dot(e1, e1))
+    eb2 = np.sqrt(_dot(e2, e2))
+    e1 = e1 / eb1[..., np.newaxis]
+    e2 = e2 / eb2[..., np.newaxis]
+    x = _clip(_dot(e1, e2))
+    vor = np.where(_dot(np.cross(d1, d3), d2) < 0, -1.0, 1.0)
     # cos(gamma) = ((b-a) x (c-b)) * ((c-b) x (d-c)) in unit vectors
     gamma = vor * np.arccos(x)
     if deg : gamma *= 180 / math.pi
@@ -279,52 +330,50 @@ def dihedral (positions, iconns, deg ):
 def distancetoplane(positions, iconns):
     # f is single point, a, b,c defining plane
     # they should not be in a line
+    positions = np.asarray(positions)
     a = iconns[1] - 1
     b = iconns[2] - 1
     c = iconns[3] - 1
     f = iconns[0] - 1
-    d1 = positions[b] - positions[a]
-    d2 = positions[c] - positions[b]
+    d1 = positions[..., b, :] - positions[..., a, :]
+    d2 = positions[..., c, :] - positions[..., b, :]
     n = np.cross(d1,d2)
-    n /= np.sqrt(np.vdot(n,n))
-    dis = np.dot(n, positions[f] - positions[a])
+    n = n / np.sqrt(_dot(n,n))[..., np.newaxis]
+    dis = _dot(n, positions[..., f, :] - positions[..., a, :])
     return dis
 
 def distancetoline(positions, iconns):
     # f is single point, a, b defining line
+    positions = np.asarray(positions)
     a = iconns[1] - 1
     b = iconns[2] - 1
     f = iconns[0] - 1
-    df = positions[f]
-    d1 = positions[b] - positions[a]
-    ddf = df - np.dot(df, d1) * d1
-    dis = np.sqrt(np.dot(ddf, ddf))
+    df = positions[..., f, :]
+    d1 = positions[..., b, :] - positions[..., a, :]
+    ddf = df - _dot(df, d1)[..., np.newaxis] * d1
+    dis = np.sqrt(_dot(ddf, ddf))
     return dis
 
 def projected_positions_on_plane(positions, iconns):
-    from numpy import cross, dot, sqrt
+    positions = np.asarray(positions)
     a = iconns[1] - 1
     b = iconns[2] - 1
     c = iconns[3] - 1
     p = iconns[0] - 1
-    dir1 =  positions[b] - positions[a]
-    dir2 =  positions[c] - positions[a]
-#   ortho = cross(dir1, dir2)
-#   ortho = ortho / sqrt(dot(ortho, ortho))
-    pos = positions[p] - positions[a]
-#   pos2 = positions[p] - dot(positions[p], ortho) * ortho
-    b1 = dot(pos, dir1)
-    b2 = dot(pos, dir2)
-    s = dot(dir1, dir2)
-    d1 = dot(dir1, dir1)
-    d2 = dot(dir2, dir2)
-    if abs(s) < 1e-10:
-        alpha = b1 / d1
-        beta = b2 / d2
-    else:
-        beta = (b1 * s - b2 * d1) / (s**2 - d1 * d2)
-        alpha = (b2 - beta * d2 ) / s
-        res = positions[a] + alpha * dir1 + beta * dir2
+    dir1 =  positions[..., b, :] - positions[..., a, :]
+    dir2 =  positions[..., c, :] - positions[..., a, :]
+    pos = positions[..., p, :] - positions[..., a, :]
+    b1 = _dot(pos, dir1)
+    b2 = _dot(pos, dir2)
+    s = _dot(dir1, dir2)
+    d1 = _dot(dir1, dir1)
+    d2 = _dot(dir2, dir2)
+    # both branches are computed for all frames, the unused one
+    # may divide by zero:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ortho = abs(s) < 1e-10
+        beta = np.where(ortho, b2 / d2, (b1 * s - b2 * d1) / (s**2 - d1 * d2))
+        alpha = np.where(ortho, b1 / d1, (b2 - beta * d2 ) / s)
     return alpha, beta
 
 def helpfun():
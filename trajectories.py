@@ -1,15 +1,24 @@
 from __future__ import with_statement
 
-# FIXME: this module is imported even if its functionality, and that of ASE, is
-# not used. E.g. in doctests of pes/mueller_brown.py.
-try:
-    from ase.io import write
-except:
-    def write(path, atoms, format = "?"):
-        pass
+def write(path, atoms, format = "?"):
+    """
+    ase.io.write(),  imported  on  first  use:  this  module  is  imported
+    even if its functionality, and that of ASE, is not used.  E.g. in
+    doctests of pes/mueller_brown.py.
+    """
+    try:
+        from ase.io import write as ase_write
+    except ImportError:
+        return
+    ase_write(path, atoms, format = format)
 
-from numpy import savetxt
-from pickle import dump
+from numpy import savetxt, empty, zeros, nan, asarray, memmap
+from pickle import dump, dumps, loads
+from cStringIO import StringIO
+from threading import Thread
+from Queue import Queue, Empty
+import os
+import atexit
 
 def empty_traj(geo, iter, adds, adds2):
     """
@@ -25,7 +34,7 @@ class traj_every:
     def __init__(self, atoms, funcart):
         self.atoms = atoms
         self.fun = funcart
-        self.logger = dimer_log(self.atoms.get_chemical_symbols(), funcart)
+        self.logger = progress_log(self.atoms.get_chemical_symbols(), funcart)
 
     def __call__(self, geo, iter, adds_files, adds_only_pickle):
         self.atoms.set_positions(self.fun(geo))
@@ -46,7 +55,7 @@ class traj_last:
     def __init__(self, atoms, funcart):
         self.atoms = atoms
         self.fun = funcart
-        self.logger = dimer_log(self.atoms.get_chemical_symbols(), funcart)
+        self.logger = progress_log(self.atoms.get_chemical_symbols(), funcart)
 
     def __call__(self, geo, iter, adds_files, adds_only_pickle):
         self.atoms.set_positions(self.fun(geo))
@@ -68,7 +77,7 @@ class traj_long:
         from os import remove
         self.atoms = atoms
         self.fun = funcart
-        self.logger = dimer_log(self.atoms.get_chemical_symbols(), funcart)
+        self.logger = progress_log(self.atoms.get_chemical_symbols(), funcart)
         try:
             remove("all_geos")
         except OSError:
@@ -82,20 +91,26 @@ class traj_long:
 
     def __call__(self, geo, iter, adds_files, adds_only_pickle):
         self.atoms.set_positions(self.fun(geo))
-        write("actual_geo", self.atoms, format = "xyz")
 
-        with open("actual_geo", "r") as f_in:
-            gs = f_in.read()
+        # format once, write the same text to both files:
+        buf = StringIO()
+        write(buf, self.atoms, format = "xyz")
+        gs = buf.getvalue()
+
+        with open("actual_geo", "w") as f_out:
+            f_out.write(gs)
 
         with open("all_geos", "a") as f_out:
             f_out.write(gs)
 
         for item in adds_files:
             val, name, text = item
-            savetxt("actual_" + name, val)
+            buf = StringIO()
+            savetxt(buf, val)
+            gs = buf.getvalue()
 
-            with open("actual_" + name, "r") as f_in:
-                gs = f_in.read()
+            with open("actual_" + name, "w") as f_out:
+                f_out.write(gs)
 
             with open("all_" + name, "a") as f_out:
                 line = text + " of iteration " + str(iter) + "\n"
@@ -128,3 +143,241 @@ def dimer_log(symbols, funcart, filename = "progress.pickle"):
             dump(content, logfile)
 
     return callback
+
+#
+# Binary progress log.  The file starts with MAGIC, a line with the
+# length of the pickled  header and the header itself.  Then follows one
+# record  of float64 numbers per  call: energy, curvature  and geometry,
+# mode and gradients with "size" entries each. Missing values are NaN.
+# As all records have the same  size the n-th of them is found without
+# reading the others.
+#
+MAGIC = "PTS-PROGRESS-1\n"
+
+# names of the items in the content handed over by the optimizers:
+SCALARS = ("Energy", "Curvature")
+VECTORS = ("Center", "Mode", "Gradients")
+
+class progress_log:
+    """
+    Callback with  the interface of  dimer_log, which appends  the state
+    of an  iteration as fixed  size record to  a binary file.  With
+    background = True the writing  is done by a separate thread, thus the
+    optimizer does not wait for  the disk. Overwrites the file, if that
+    exists.
+
+        >>> from tempfile import mktemp
+        >>> name = mktemp()
+
+        >>> log = progress_log(["H", "H"], None, name)
+        >>> for i in range(3):
+        ...     log([([0., 1. * i], None, "Center"), ([1., 0.], "modes", "Mode"),
+        ...          ([0.5, 0.5], "grads", "Gradients"), ([-1. - i], None, "Energy"),
+        ...          (-0.5, None, "Curvature")])
+        >>> log.close()
+
+    Read it back, any iteration can be accessed directly:
+
+        >>> p = ProgressFile(name)
+        >>> len(p), p.symbols, p.size
+        (3, ['H', 'H'], 2)
+
+        >>> p[2]["Center"]
+        array([ 0.,  2.])
+
+        >>> p.energies()
+        array([-1., -2., -3.])
+
+    Values not given (like the mode for quasi Newton) are NaN:
+
+        >>> log = progress_log(["H", "H"], None, name, background = False)
+        >>> log([([0., 1.], None, "Center"), ([-1.], None, "Energy")])
+        >>> log.close()
+
+        >>> ProgressFile(name)[0]["Mode"]
+        array([ nan,  nan])
+
+        >>> os.remove(name)
+    """
+    def __init__(self, symbols, funcart, filename = "progress.bin", background = True):
+        self.head = {"symbols" : symbols, "funcart" : funcart}
+        self.size = None
+
+        # start with an empty file:
+        open(filename, "wb").close()
+
+        if background:
+            self.writer = _Writer(filename)
+            self.writer.start()
+            atexit.register(self.close)
+        else:
+            self.writer = _Direct(filename)
+
+    def __call__(self, content):
+        values = dict((name, value) for value, __, name in content)
+
+        center = asarray(values["Center"], dtype=float)
+        if self.size is None:
+            # header is written with the first record, as only now the
+            # size of the geometries is known:
+            self.size = center.size
+            self.head["size"] = self.size
+            head = dumps(self.head, protocol=2)
+            self.writer.put(MAGIC + "%d\n" % len(head) + head)
+
+        record = empty(len(SCALARS) + len(VECTORS) * self.size)
+        record[:] = nan
+
+        for i, name in enumerate(SCALARS):
+            if name in values:
+                # energy is given as list of one element:
+                record[i] = asarray(values[name], dtype=float).flatten()[0]
+
+        for i, name in enumerate(VECTORS):
+            if name in values:
+                start = len(SCALARS) + i * self.size
+                record[start:start + self.size] = asarray(values[name], dtype=float).flatten()
+
+        self.writer.put(record.astype("<f8").tostring())
+
+    def flush(self):
+        """
+        Waits until all records handed over so far are in the file.
+        """
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+class _Direct:
+    """
+    Writes at once, for progress_log(..., background = False).
+    """
+    def __init__(self, filename):
+        self.file = open(filename, "ab")
+
+    def put(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class _Writer(Thread):
+    """
+    Writes the data put into its queue in the background. All data
+    waiting in the queue is written at once.
+    """
+    def __init__(self, filename):
+        Thread.__init__(self)
+        self.daemon = True
+        self.queue = Queue()
+        self.file = open(filename, "ab")
+
+    def put(self, data):
+        self.queue.put(data)
+
+    def run(self):
+        done = False
+        while not done:
+            chunks = [self.queue.get()]
+            while True:
+                try:
+                    chunks.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            # None means close, flush requests are events to be set:
+            data = []
+            events = []
+            for chunk in chunks:
+                if chunk is None:
+                    done = True
+                elif isinstance(chunk, str):
+                    data.append(chunk)
+                else:
+                    events.append(chunk)
+
+            self.file.write("".join(data))
+            self.file.flush()
+
+            for event in events:
+                event.set()
+
+        self.file.close()
+
+    def flush(self):
+        from threading import Event
+        if self.is_alive():
+            event = Event()
+            self.queue.put(event)
+            event.wait()
+
+    def close(self):
+        if self.is_alive():
+            self.queue.put(None)
+            self.join()
+
+class ProgressFile(object):
+    """
+    Read  access to the  file written  by progress_log.  The  records are
+    mapped  into  memory, thus  opening  does  not  read the  whole  file.
+    progress[i] is the dictionary of all values of the i-th record. A
+    last record, which is written only partly, is ignored.
+    """
+    def __init__(self, filename):
+        f = open(filename, "rb")
+        try:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("%s is not a binary progress log" % filename)
+            length = int(f.readline())
+            head = loads(f.read(length))
+            offset = f.tell()
+        finally:
+            f.close()
+
+        self.symbols = head["symbols"]
+        self.funcart = head["funcart"]
+        self.size = head["size"]
+
+        width = len(SCALARS) + len(VECTORS) * self.size
+        count = (os.path.getsize(filename) - offset) // (8 * width)
+
+        if count > 0:
+            self.data = memmap(filename, dtype="<f8", mode="r", offset=offset, shape=(count, width))
+        else:
+            self.data = zeros((0, width))
+
+    def __len__(self):
+        return len(self.data)
+
+    def column(self, name):
+        """
+        The values of one of SCALARS or VECTORS for all records.
+        """
+        if name in SCALARS:
+            return asarray(self.data[:, SCALARS.index(name)])
+        start = len(SCALARS) + VECTORS.index(name) * self.size
+        return asarray(self.data[:, start:start + self.size])
+
+    def __getitem__(self, i):
+        return dict((name, self.column(name)[i]) for name in SCALARS + VECTORS)
+
+    def energies(self):
+        return self.column("Energy")
+
+    def curvatures(self):
+        return self.column("Curvature")
+
+# Testing the examples in __doc__strings, execute
+# "python trajectories.py", eventualy with "-v" option appended:
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
+# Default options for vim:sw=4:expandtab:smarttab:autoindent:syntax
@@ -5,11 +5,8 @@ Shared code for parsing command line here
 
 import getopt
 
-# for get calculator
-from ase.calculators import *
-from pts.gaussian import Gaussian
 from pts.common import file2str
-from pts.defaults import ps_default_params, default_calcs, default_lj, default_vasp
+from pts.defaults import ps_default_params, default_calcs, default_calculator
 
 LONG_OPTIONS = ["calculator="]
 
@@ -27,15 +24,21 @@ def get_defaults():
 
 def get_calculator(file_name):
 
-    calculator = None
     if file_name in default_calcs:
-        calculator = eval("%s" % (file_name))
-    else:
-        str1 = file2str(file_name) # file file_name has to
-        # contain line calculator = ...
-        exec(str1)
+        return default_calculator(file_name)
+
+    # File file_name has to contain line calculator = ...  It may use
+    # any calculator of ASE or our  own ones without importing them.
+    # They are imported only here as this takes some time:
+    namespace = {}
+    exec "from ase.calculators import *" in namespace
+    from pts.gaussian import Gaussian
+    namespace["Gaussian"] = Gaussian
+
+    str1 = file2str(file_name)
+    exec str1 in namespace
 
-    return calculator
+    return namespace.get("calculator")
 
 def get_mask(strmask):
     tr = ["True", "T", "t", "true"]
@@ -118,7 +121,7 @@ def get_options_to_xyz(input, argv, num_old):
     For path it can be a path.pickle file or alternative input, see
     Options below.
 
-    For progress it needs to be a progress.pickle file.
+    For progress it needs to be a progress.bin (or older progress.pickle) file.
 
     The tool creates a string of xyz geometries to the geometries extracted from
     input. Additional options can change the output.
@@ -141,6 +144,10 @@ def get_options_to_xyz(input, argv, num_old):
                       help = "Use the exact bead positions (no respace).",
                       action = "store_true", default = False )
 
+    group.add_option( "--align", dest = "align",
+                      help = "Superimpose every geometry onto the previous one, removing overall rotations and translations.",
+                      action = "store_true", default = False )
+
     if input == "path":
         parser.add_option_group(group)
 
@@ -404,7 +411,8 @@ def visualize_input( input, output, argv, num_old):
 
     INPUT can be one of the following:
     path     : FILE(s) are results of a path calculation.
-    progress : FILE(s) are pickle files of dimer/lanczos or quasi-newton calculation
+    progress : FILE(s) are progress logs (progress.bin or progress.pickle) of dimer/lanczos
+               or quasi-newton calculation
     xyz      : FILE(s) contain a string of xyz files.
     """
     from pts.tools.xyz2tabint import interestingvalue
@@ -215,7 +215,7 @@ def read_dimer_input(rest, name):
     from pts.common import file2str
     from pts.func import compose
     from pts.qfunc import QFunc
-    from pts.memoize import Memoize, FileStore
+    from pts.memoize import Memoize, FileStore, LRUStore
     from pts.defaults import di_default_params, qn_default_params, ln_default_params
     from pts.trajectories import dimer_log
     from pts.defaults import di_default_params, qn_default_params, di_default_params_rot
@@ -293,7 +293,7 @@ def read_dimer_input(rest, name):
                 # suppose that the rest are setting parameters
                 # we do not have a complete list of them
                 if not accept_all:
-                    assert o in default_params or o == "rot_method", "Parameter %s" % (o)
+                    assert o in default_params or o in ("rot_method", "workhere"), "Parameter %s" % (o)
 
                 if o in are_strings:
                     add_param[o] = a
@@ -337,11 +337,11 @@ def read_dimer_input(rest, name):
 
     if "cache" in params_dict:
           if params_dict["cache"] == None:
-                pes = Memoize(pes, FileStore("%s.ResultDict.pickle" % (name)))
+                pes = Memoize(pes, LRUStore(FileStore("%s.ResultDict.pickle" % (name))))
           else:
-                pes = Memoize(pes, FileStore(params_dict["cache"]))
+                pes = Memoize(pes, LRUStore(FileStore(params_dict["cache"])))
     else:
-         pes = Memoize(pes, FileStore("%s.ResultDict.pickle" % (name)))
+         pes = Memoize(pes, LRUStore(FileStore("%s.ResultDict.pickle" % (name))))
 
     #Attention inital mode need not be normed (and cannot as metric is not yet known)
     return pes, start_geo, init_mode, params_dict, atoms, funcart
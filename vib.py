@@ -152,7 +152,7 @@ from scipy.linalg import eigh
 from numpy import repeat
 import ase.atoms
 import ase.units as units
-from paramap import pmap3
+from paramap import pmap3, no_failures
 import sys
 from pts.func import compose
 from pts.qfunc import QFunc
@@ -253,6 +253,7 @@ def derivatef( g0, x0, delta = 0.01, pmap = pmap3, direction = 'central' ):
     nabla gi/ nabla x0j
 
     The gradient/derivative given back can also be an array
+    If some of the calculations fail JobError is raised, see paramap.py
     '''
     assert direction in ['central', 'forward', 'backward']
 
@@ -291,7 +292,7 @@ def derivatef( g0, x0, delta = 0.01, pmap = pmap3, direction = 'central' ):
 
     # calculation of the functionvalues for all the geometries
     # at the same time
-    g1 = pmap(g0, xs)
+    g1 = no_failures(pmap(g0, xs))
     g1 = asarray(g1)
     # now it is possible to find out, how big g1 is
     # g1 may be an array (then we want the total length
@@ -363,7 +364,7 @@ def vibmodes(atoms, startdir=None, mask=None, workhere=False, save=None, give_ou
     The hessian is calculated by derivatef
     qfunc.fwrapper is used as a wrapper to calulate the gradients
     """
-    from pts.memoize import Memoize, DirStore
+    from pts.memoize import Memoize, DirStore, LRUStore
     coord = atoms.get_positions()
 
     if mask == None:
@@ -378,7 +379,7 @@ def vibmodes(atoms, startdir=None, mask=None, workhere=False, save=None, give_ou
 
     myfunc = QFunc(atoms, atoms.get_calculator())
 
-    myfunc = Memoize(myfunc, DirStore("cache.d"))
+    myfunc = Memoize(myfunc, LRUStore(DirStore("cache.d")))
 
     myfunc = compose( myfunc, fun)
 